@@ -0,0 +1,27 @@
+{% macro incremental_window(source_column, this_column=none) %}
+  {#- Incremental predicate: rows newer than the table's high-water mark, plus
+      any rows dated inside the invalidated window passed as
+      --vars '{invalidate_start: YYYY-MM-DD, invalidate_end: YYYY-MM-DD}'
+      (see loader.clear_old_data). Reprocessing the window is safe because the
+      models merge on their unique keys. -#}
+  {%- set start = var('invalidate_start', none) -%}
+  {%- set end = var('invalidate_end', none) or start -%}
+  ({{ source_column }} > (select max({{ this_column or source_column }}) from {{ this }})
+  {%- if start is not none %}
+   or ({{ source_column }})::date between '{{ start }}'::date and '{{ end }}'::date
+  {%- endif %})
+{% endmacro %}
+
+{% macro delete_invalidated(start_column, end_column=none) %}
+  {#- pre_hook for incremental aggregates whose rows span many days (lifetime
+      totals, months). Rows overlapping the invalidated window are deleted so
+      the model rebuilds them from scratch; rows whose sessions all vanished
+      in the regenerated window would otherwise never be replaced. -#}
+  {%- set start = var('invalidate_start', none) -%}
+  {%- set end = var('invalidate_end', none) or start -%}
+  {%- if is_incremental() and start is not none -%}
+    delete from {{ this }}
+    where ({{ start_column }})::date <= '{{ end }}'::date
+      and ({{ end_column or start_column }})::date >= '{{ start }}'::date
+  {%- endif -%}
+{% endmacro %}
@@ -0,0 +1,5 @@
+{% macro key_type() %}
+  {#- Column type of player/session/team keys: BIGINT surrogate keys when the
+      generators ran with --surrogate-keys, otherwise the original VARCHAR ids. -#}
+  {%- if var('surrogate_keys', false) -%}bigint{%- else -%}varchar{%- endif -%}
+{% endmacro %}
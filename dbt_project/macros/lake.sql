@@ -0,0 +1,29 @@
+{% macro event_source(source_name, table_name) %}
+  {#- Event tables come from DuckDB by default, or from the hive-partitioned
+      Parquet lake (`sprint_lake` sources) when run with --vars '{lake: true}'
+      after generating with `main.py --lake`. -#}
+  {%- if var('lake', false) -%}
+    {{ source('sprint_lake', table_name) }}
+  {%- else -%}
+    {{ source(source_name, table_name) }}
+  {%- endif -%}
+{% endmacro %}
+
+{% macro partition_pruning(this_column) %}
+  {#- Extra predicate on the lake's `date` partition column mirroring
+      incremental_window, so incremental runs only open new (or invalidated)
+      partitions. The high-water mark is looked up at compile time and
+      inlined as a literal, letting DuckDB prune files before scanning.
+      Renders nothing outside lake mode. -#}
+  {%- if var('lake', false) and execute -%}
+    {%- set start = var('invalidate_start', none) -%}
+    {%- set end = var('invalidate_end', none) or start -%}
+    {%- set watermark = run_query("select max(" ~ this_column ~ ")::date from " ~ this).columns[0].values()[0] -%}
+    {%- if watermark is not none %}
+    and (date >= '{{ watermark }}'::date
+    {%- if start is not none %}
+         or date between '{{ start }}'::date and '{{ end }}'::date
+    {%- endif %})
+    {%- endif %}
+  {%- endif -%}
+{% endmacro %}
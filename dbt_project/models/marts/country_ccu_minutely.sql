@@ -0,0 +1,97 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['minute', 'country'],
+    contract={"enforced": true},
+    on_schema_change='fail',
+    tags=['summary', 'ccu']
+) }}
+
+{#- Every session of a day starts together and fact_session.eventDateTime is
+    its scheduled end, SESSION_MAX_DURATION_SECONDS later (generate_session_times);
+    each player then plays eventLengthSeconds from the start. -#}
+{%- set max_duration = var('session_max_duration_seconds', 1800) -%}
+
+with
+
+{% if is_incremental() %}
+new_sessions as (
+    select eventDateTime
+    from {{ event_source('sprint_stage', 'fact_session') }}
+    where {{ incremental_window('eventDateTime', 'minute') }}
+    {{ partition_pruning('minute') }}
+),
+
+-- Minutes from the earliest new start on are recomputed from every session
+-- still running then; everything before it is unchanged
+sweep_start as (
+    select date_trunc('minute', min(eventDateTime) - to_seconds({{ max_duration }})) as minute
+    from new_sessions
+),
+{% endif %}
+
+sessions as (
+    select
+        country::varchar as country,
+        eventDateTime - to_seconds({{ max_duration }}) as started_at,
+        eventDateTime - to_seconds({{ max_duration }}) + to_seconds(eventLengthSeconds) as ended_at
+    from {{ event_source('sprint_stage', 'fact_session') }}
+    {% if is_incremental() %}
+      where eventDateTime > (select minute from sweep_start)
+    {% endif %}
+),
+
+-- Sweep line: +1 at every start, -1 at every end, netted per instant
+changes as (
+    select country, changed_at, sum(delta) as delta
+    from (
+        select country, started_at as changed_at, 1 as delta from sessions
+        union all
+        select country, ended_at as changed_at, -1 as delta from sessions
+    )
+    group by country, changed_at
+),
+
+-- One sort per country: concurrency holds from each change to the next
+levels as (
+    select
+        country,
+        changed_at,
+        lead(changed_at) over sweep as next_at,
+        sum(delta) over (sweep rows unbounded preceding) as level
+    from changes
+    window sweep as (partition by country order by changed_at)
+),
+
+-- Every minute each non-empty level overlaps
+minute_levels as (
+    select
+        country,
+        changed_at,
+        level,
+        unnest(generate_series(
+            date_trunc('minute', changed_at), next_at - interval 1 microsecond, interval 1 minute
+        )) as minute
+    from levels
+    where level > 0
+),
+
+minutes as (
+    select
+        minute,
+        country,
+        -- The level covering the minute's first instant, if any
+        coalesce(max(level) filter (where changed_at <= minute), 0) as ccu,
+        max(level) as peak_ccu
+    from minute_levels
+    {% if is_incremental() %}
+      where minute >= (select minute from sweep_start)
+    {% endif %}
+    group by minute, country
+)
+
+select
+    minute::timestamp as minute,
+    country,
+    ccu::integer as ccu,
+    peak_ccu::integer as peak_ccu
+from minutes
@@ -1,20 +1,11 @@
 {{ config(materialized='table') }}
 
-with sessions as (
-    select
-        p.country,
-        date_trunc('month', s.eventDateTime::timestamp) as year_month,
-        eventLengthSeconds as session_seconds
-    from {{ source('sprint_stage', 'fact_session') }} s
-    join {{ source('sprint_dim', 'dim_players') }} p on s.playerId = p.playerId
-),
-
-monthly_agg as (
+with monthly_agg as (
     select
         country,
-        year_month,
-        sum(session_seconds) as total_play_time_seconds
-    from sessions
+        date_trunc('month', calendar_date) as year_month,
+        sum(total_play_time_seconds) as total_play_time_seconds
+    from {{ ref('stage_player_day') }}
     group by country, year_month
 )
 
@@ -1,13 +1,38 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key=['country', 'year_week'],
+    pre_hook="{{ delete_invalidated('year_week', 'year_week + interval 6 day') }}"
+) }}
 
-with transactions as (
-    select
-        p.country,
-        date_trunc('week', t.eventDateTime::timestamp) as year_week,
-        round(sum(t.purchasePrice), 2) as total_revenue
-    from {{ source('sprint_raw', 'event_transaction') }} t
-    join {{ source('sprint_dim', 'dim_players') }} p on t.playerId = p.playerId
+{%- set start = var('invalidate_start', none) -%}
+{%- set end = var('invalidate_end', none) or start -%}
+
+with
+{% if is_incremental() %}
+touched_weeks as (
+    -- Weeks with new transactions, plus every week the pre_hook cleared
+    select distinct date_trunc('week', event_datetime) as year_week
+    from {{ ref('fact_transaction') }}
+    where {{ incremental_window('event_datetime', 'last_transaction_at') }}
+    {%- if start is not none %}
+       or date_trunc('week', event_datetime)
+          between date_trunc('week', '{{ start }}'::date) and date_trunc('week', '{{ end }}'::date)
+    {%- endif %}
+),
+{% endif %}
 
-    group by p.country, year_week
+transactions as (
+    select
+        country,
+        date_trunc('week', event_datetime) as year_week,
+        round(sum(purchase_price_usd), 2) as total_revenue,
+        max(event_datetime) as last_transaction_at
+    from {{ ref('fact_transaction') }}
+    {% if is_incremental() %}
+    where event_datetime >= (select min(year_week) from touched_weeks)
+      and date_trunc('week', event_datetime) in (select year_week from touched_weeks)
+    {% endif %}
+    group by country, year_week
 )
+
 select * from transactions
@@ -1,6 +1,6 @@
 {{ config(
     materialized='table',
-    unique_key='session_id || team_1_id || team_2_id || calendar_day',
+    unique_key=['session_id', 'team_1_id', 'team_2_id', 'calendar_day'],
     tags=['summary', 'encounter']
 ) }}
 
@@ -0,0 +1,78 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['calendar_date', 'voxel_x', 'voxel_y', 'voxel_z'],
+    contract={"enforced": true},
+    on_schema_change='fail',
+    tags=['summary', 'heatmap']
+) }}
+
+{%- set start = var('invalidate_start', none) -%}
+{%- set end = var('invalidate_end', none) or start -%}
+{%- set grid_min = var('grid_min', -100) -%}
+{%- set voxel_size = var('heatmap_voxel_size', 10) -%}
+{#- Cells per axis; positions clamped onto the upper face land in the last cell -#}
+{%- set last_voxel = ((var('grid_max', 100) - grid_min) / voxel_size) | round(0, 'ceil') | int - 1 -%}
+
+with beats as (
+    select
+        event_datetime,
+        position_x,
+        position_y,
+        position_z,
+        -- A held beat stands for itself plus hold_beats ticks at the same position
+        1 + hold_beats as beats
+    from {{ ref('event_heartbeat') }}
+
+    {% if is_incremental() %}
+      where {{ incremental_window('event_datetime', 'last_beat') }}
+    {% endif %}
+),
+
+new_voxels as (
+    select
+        event_datetime::date as calendar_date,
+        least(floor((position_x - {{ grid_min }}) / {{ voxel_size }}), {{ last_voxel }}) as voxel_x,
+        least(floor((position_y - {{ grid_min }}) / {{ voxel_size }}), {{ last_voxel }}) as voxel_y,
+        least(floor((position_z - {{ grid_min }}) / {{ voxel_size }}), {{ last_voxel }}) as voxel_z,
+        sum(beats) as beats,
+        max(event_datetime) as last_beat
+    from beats
+    group by all
+),
+
+{% if is_incremental() %}
+merged_voxels as (
+    -- New beats are added to the stored voxel counts; days inside an
+    -- invalidated window were re-read in full and replace the stored row
+    select
+        n.calendar_date,
+        n.voxel_x,
+        n.voxel_y,
+        n.voxel_z,
+        coalesce(t.beats, 0) + n.beats as beats,
+        greatest(coalesce(t.last_beat, n.last_beat), n.last_beat) as last_beat
+    from new_voxels n
+    left join {{ this }} t
+        on t.calendar_date = n.calendar_date
+       and t.voxel_x = n.voxel_x
+       and t.voxel_y = n.voxel_y
+       and t.voxel_z = n.voxel_z
+      {%- if start is not none %}
+       and t.calendar_date not between '{{ start }}'::date and '{{ end }}'::date
+      {%- endif %}
+),
+{% endif %}
+
+typed as (
+    select
+        calendar_date,
+        voxel_x::smallint as voxel_x,
+        voxel_y::smallint as voxel_y,
+        voxel_z::smallint as voxel_z,
+        beats::bigint as beats,
+        (beats * {{ var('heartbeat_interval_seconds', 30) }})::bigint as occupancy_seconds,
+        last_beat::timestamp as last_beat
+    from {{ 'merged_voxels' if is_incremental() else 'new_voxels' }}
+)
+
+select * from typed
@@ -1,21 +1,14 @@
 {{ config(
     materialized='incremental', 
-    unique_key='player_id || calendar_date'
+    unique_key=['player_id', 'calendar_date']
 ) }}
 
-with sessions as (
-    select
-        playerId as player_id,
-        date_trunc('day'::varchar, eventDateTime::timestamp) as calendar_date,
-        eventLengthSeconds,
-        kills,
-        deaths
-    from {{ source('sprint_stage', 'fact_session') }}
+with player_days as (
+    select *
+    from {{ ref('stage_player_day') }}
 
     {% if is_incremental() %}
-      where date_trunc('day'::varchar, eventDateTime::timestamp) > (
-        select max(calendar_date) from {{ this }}
-      )
+      where {{ incremental_window('last_played') }}
     {% endif %}
 ),
 
@@ -23,16 +16,16 @@ daily_agg as (
     select
         player_id,
         calendar_date,
-        sum(eventLengthSeconds) as total_play_time_seconds,
-        count(*) as sessions_count,
-        sum(kills) as total_kills,
-        sum(deaths) as total_deaths,
+        total_play_time_seconds,
+        sessions_count,
+        total_kills,
+        total_deaths,
         case 
-          when sum(deaths) = 0 then null
-          else round(cast(sum(kills) as float) / sum(deaths), 2)
-        end as kill_death_ratio
-    from sessions
-    group by player_id, calendar_date
+          when total_deaths = 0 then null
+          else round(cast(total_kills as float) / total_deaths, 2)
+        end as kill_death_ratio,
+        last_played
+    from player_days
 )
 
 select * from daily_agg
@@ -1,12 +1,43 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key=['player_id', 'year_month', 'country'],
+    pre_hook="{{ delete_invalidated('year_month', 'last_day(year_month)') }}"
+) }}
 
-with player_days as (
+{%- set start = var('invalidate_start', none) -%}
+{%- set end = var('invalidate_end', none) or start -%}
+
+with
+{% if is_incremental() %}
+touched_months as (
+    -- Streaks only change for player-months with new days, plus every
+    -- month the pre_hook cleared for an invalidated window
     select distinct
-        playerId as player_id,
-        date_trunc('day', eventDateTime::timestamp) as play_date,
-        date_trunc('month', eventDateTime::timestamp) as year_month,
-        country
-    from {{ source('sprint_stage', 'fact_session') }}
+        player_id,
+        date_trunc('month', calendar_date) as year_month
+    from {{ ref('stage_player_day') }}
+    where {{ incremental_window('last_played') }}
+    {%- if start is not none %}
+       or date_trunc('month', calendar_date)
+          between date_trunc('month', '{{ start }}'::date) and date_trunc('month', '{{ end }}'::date)
+    {%- endif %}
+),
+{% endif %}
+
+player_days as (
+    -- Touched player-months are recomputed from all of their days
+    select
+        d.player_id,
+        d.calendar_date as play_date,
+        date_trunc('month', d.calendar_date) as year_month,
+        d.country,
+        d.last_played
+    from {{ ref('stage_player_day') }} d
+    {% if is_incremental() %}
+    semi join touched_months t
+        on d.player_id = t.player_id
+       and date_trunc('month', d.calendar_date) = t.year_month
+    {% endif %}
 ),
 
 ranked_days as (
@@ -15,6 +46,7 @@ ranked_days as (
         year_month,
         play_date,
         country,
+        last_played,
         row_number() over (partition by player_id, year_month order by play_date) as rn
     from player_days
 ),
@@ -25,6 +57,7 @@ groups as (
         year_month,
         play_date,
         country,
+        last_played,
         rn,
         date_diff('day', date '1970-01-01', play_date) - rn as grp
     from ranked_days
@@ -36,7 +69,8 @@ streaks as (
         year_month,
         country,
         grp,
-        count(*) as consecutive_days
+        count(*) as consecutive_days,
+        max(last_played) as last_played
     from groups
     group by player_id, year_month, country, grp
 ),
@@ -46,7 +80,8 @@ max_streaks as (
         player_id,
         year_month,
         country,
-        max(consecutive_days) as max_consecutive_days_played
+        max(consecutive_days) as max_consecutive_days_played,
+        max(last_played) as last_played
     from streaks
     group by player_id, year_month, country
 )
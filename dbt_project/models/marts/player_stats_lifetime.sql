@@ -1,14 +1,36 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key=['country', 'player_id'],
+    pre_hook="{{ delete_invalidated('first_played', 'last_played') }}"
+) }}
 
-with player_stats as (
+with player_days as (
+    select *
+    from {{ ref('stage_player_day') }}
+
+    {% if is_incremental() %}
+      -- Players with new or updated days (or whose rows the pre_hook
+      -- invalidated) are re-summed over their day rows
+      where player_id in (
+          select player_id
+          from {{ ref('stage_player_day') }}
+          where {{ incremental_window('last_played') }}
+      )
+      {%- if var('invalidate_start', none) is not none %}
+      or player_id not in (select player_id from {{ this }})
+      {%- endif %}
+    {% endif %}
+),
+
+player_stats as (
     select
         country,
-        playerId as player_id,
-        sum(kills) as total_kills,
-        sum(deaths) as total_deaths,
-        min(eventDateTime) as first_played,
-        max(eventDateTime) as last_played
-    from {{ source('sprint_stage', 'fact_session') }}
+        player_id,
+        sum(total_kills) as total_kills,
+        sum(total_deaths) as total_deaths,
+        min(first_played) as first_played,
+        max(last_played) as last_played
+    from player_days
     group by country, player_id
 ),
 
@@ -0,0 +1,32 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['calendar_date', 'product_id']
+) }}
+
+with
+{% if is_incremental() %}
+touched_days as (
+    select distinct event_datetime::date as calendar_date
+    from {{ ref('fact_transaction') }}
+    where {{ incremental_window('event_datetime', 'last_transaction_at') }}
+),
+{% endif %}
+
+daily_agg as (
+    select
+        event_datetime::date as calendar_date,
+        product_id,
+        any_value(transaction_type) as transaction_type,
+        count(*) as transactions_count,
+        round(sum(purchase_price_usd), 2) as total_revenue_usd,
+        max(event_datetime) as last_transaction_at
+    from {{ ref('fact_transaction') }}
+    {% if is_incremental() %}
+    -- Days with new transactions are re-aggregated in full
+    where event_datetime >= (select min(calendar_date) from touched_days)
+      and event_datetime::date in (select calendar_date from touched_days)
+    {% endif %}
+    group by calendar_date, product_id
+)
+
+select * from daily_agg
@@ -0,0 +1,72 @@
+{{ config(
+    materialized='incremental',
+    unique_key='calendar_date',
+    pre_hook="{{ delete_invalidated('calendar_date') }}"
+) }}
+
+{#- Active subscriptions and MRR are running totals of each day's changes.
+    Incremental runs recompute from the first day with new events, starting
+    from the last stored day before it. -#}
+{%- set start = var('invalidate_start', none) -%}
+
+with events as (
+    select
+        s.eventDateTime::timestamp as event_datetime,
+        s.eventType as event_type,
+        -- Monthly-normalized recurring revenue of the subscription, in USD.
+        -- Decimals keep the running totals exact across incremental runs.
+        round(s.purchasePrice * fx.usdRate / case s.cycle when 'Y' then 12 else 1 end, 4)::decimal(18, 4) as monthly_usd,
+        round(s.purchasePrice * fx.usdRate, 2)::decimal(18, 2) as amount_usd
+    from {{ event_source('sprint_raw', 'event_subscription') }} s
+    left join {{ ref('fx_rates') }} fx on s.currency = fx.currency
+),
+
+{% if is_incremental() %}
+first_day as (
+    select
+        {% if start is not none %}least(min(event_datetime::date), '{{ start }}'::date){% else %}min(event_datetime::date){% endif %} as calendar_date
+    from events
+    where {{ incremental_window('event_datetime', 'last_event_at') }}
+),
+
+opening as (
+    select active_subscriptions, mrr_usd
+    from {{ this }}
+    where calendar_date < (select calendar_date from first_day)
+    order by calendar_date desc
+    limit 1
+),
+{% endif %}
+
+daily as (
+    select
+        event_datetime::date as calendar_date,
+        count(*) filter (where event_type = 'start') as new_subscriptions,
+        count(*) filter (where event_type = 'renewal') as renewals,
+        count(*) filter (where event_type = 'churn') as churned_subscriptions,
+        sum(case event_type when 'start' then monthly_usd when 'churn' then -monthly_usd else 0 end) as mrr_change_usd,
+        sum(case when event_type in ('start', 'renewal') then amount_usd else 0 end) as recurring_revenue_usd,
+        max(event_datetime) as last_event_at
+    from events
+    {% if is_incremental() %}
+    where event_datetime >= (select calendar_date from first_day)
+    {% endif %}
+    group by calendar_date
+),
+
+running as (
+    select
+        calendar_date,
+        new_subscriptions,
+        renewals,
+        churned_subscriptions,
+        {% if is_incremental() %}coalesce((select active_subscriptions from opening), 0) + {% endif %}
+            sum(new_subscriptions - churned_subscriptions) over (order by calendar_date) as active_subscriptions,
+        {% if is_incremental() %}coalesce((select mrr_usd from opening), 0) + {% endif %}
+            sum(mrr_change_usd) over (order by calendar_date) as mrr_usd,
+        recurring_revenue_usd,
+        last_event_at
+    from daily
+)
+
+select * from running
@@ -1,29 +1,32 @@
 {{ config(
     materialized='incremental',
-    unique_key='session_id || event_datetime',
+    unique_key=['session_id', 'player_id', 'event_datetime'],
     contract={"enforced": true},
     on_schema_change='fail'
 ) }}
 
 with source as (
     select rawResponse
-    from {{ source('sprint_raw', 'event_session')}}
+    from {{ event_source('sprint_raw', 'event_session') }}
     {% if is_incremental() %}
-      -- Only get sessions newer than what we've already processed
-      where (rawResponse->>'$.endTime')::timestamp
-            > (select max(event_datetime) from {{ this }})
+      -- Only get sessions newer than what we've already processed,
+      -- plus any invalidated window being regenerated
+      where {{ incremental_window("(rawResponse->>'$.endTime')::timestamp", 'event_datetime') }}
+      {{ partition_pruning('event_datetime') }}
     {% endif %}
 ),
 
 expanded as (
     select 
-        (hb.value->>'$.sessionId')::varchar       as session_id,
+        (hb.value->>'$.sessionId')::{{ key_type() }}  as session_id,
         (hb.value->>'$.timestamp')::timestamp       as event_datetime,
-        (hb.value->>'$.playerId')::varchar          as player_id,
-        (hb.value->>'$.teamId')::varchar            as team_id,
+        (hb.value->>'$.playerId')::{{ key_type() }}   as player_id,
+        (hb.value->>'$.teamId')::{{ key_type() }}     as team_id,
         (hb.value->>'$.positionX')::float           as position_x,
         (hb.value->>'$.positionY')::float           as position_y,
-        (hb.value->>'$.positionZ')::float           as position_z
+        (hb.value->>'$.positionZ')::float           as position_z,
+        -- Adaptive sampling: following ticks that repeat this position (0 for fixed-rate sessions)
+        coalesce((hb.value->>'$.holdBeats')::integer, 0) as hold_beats
     from source,
          json_each(rawResponse->'$.heartbeats') as hb
 )
@@ -0,0 +1,38 @@
+{{ config(
+    materialized='incremental',
+    unique_key='transaction_id',
+    contract={"enforced": true},
+    on_schema_change='fail'
+) }}
+
+with transactions as (
+    select *
+    from {{ event_source('sprint_raw', 'event_transaction') }}
+
+    {% if is_incremental() %}
+      where {{ incremental_window('eventDateTime::timestamp', 'event_datetime') }}
+      {{ partition_pruning('event_datetime') }}
+    {% endif %}
+),
+
+typed as (
+    select
+        t.transactionId::{{ key_type() }} as transaction_id,
+        t.playerId::{{ key_type() }} as player_id,
+        p.country::varchar as country,
+        t.eventDateTime::timestamp as event_datetime,
+        d.productId::integer as product_id,
+        t.transactionType::varchar as transaction_type,
+        t.isRecurring::boolean as is_recurring,
+        nullif(t.cycle, '')::varchar as cycle,
+        t.currency::varchar as currency,
+        t.purchasePrice::decimal(12, 2) as purchase_price,
+        fx.usdRate::decimal(12, 6) as usd_rate,
+        round(t.purchasePrice * fx.usdRate, 2)::decimal(12, 2) as purchase_price_usd
+    from transactions t
+    left join {{ source('sprint_dim', 'dim_players') }} p on t.playerId = p.playerId
+    left join {{ ref('dim_products') }} d on t.purchaseItem = d.productSku
+    left join {{ ref('fx_rates') }} fx on t.currency = fx.currency
+)
+
+select * from typed
@@ -1,6 +1,6 @@
 {{ config(
     materialized='incremental',
-    unique_key='session_id || team_id || event_datetime',
+    unique_key=['session_id', 'team_id', 'event_datetime'],
     contract={"enforced": true},
     on_schema_change='fail'
 ) }}
@@ -13,15 +13,34 @@ with source as (
         event_datetime,
         position_x,
         position_y,
-        position_z
+        position_z,
+        hold_beats
     from {{ ref('event_heartbeat') }}
 
     {% if is_incremental() %}
-      where event_datetime > (select max(event_datetime) from {{ this }})
+      where {{ incremental_window('event_datetime') }}
     {% endif %}
 
 ),
 
+-- Forward-fill adaptively sampled heartbeats: a row holding k beats stands
+-- for itself plus the next k ticks, so teams line up on every tick again
+ticks as (
+
+    select
+        session_id,
+        team_id,
+        event_datetime + to_seconds(tick * {{ var('heartbeat_interval_seconds', 30) }}) as event_datetime,
+        position_x,
+        position_y,
+        position_z
+    from (
+        select *, unnest(generate_series(0, hold_beats)) as tick
+        from source
+    )
+
+),
+
 centroids as (
 
     select
@@ -31,14 +50,14 @@ centroids as (
         avg(position_x) as centroid_x,
         avg(position_y) as centroid_y,
         avg(position_z) as centroid_z
-    from source
+    from ticks
     group by session_id, team_id, event_datetime
 
 )
 
 select
-    session_id::string      as session_id,
-    team_id::string         as team_id,
+    session_id::{{ key_type() }} as session_id,
+    team_id::{{ key_type() }}    as team_id,
     event_datetime::timestamp as event_datetime,
     centroid_x::float       as centroid_x,
     centroid_y::float       as centroid_y,
@@ -1,12 +1,25 @@
 {{ config(
     materialized='incremental',
-    unique_key='session_id || team_1_id || team_2_id || encounter_start',
+    unique_key=['session_id', 'team_1_id', 'team_2_id', 'encounter_start'],
     contract={"enforced": true},
     on_schema_change='fail'
 ) }}
 
+{% set centroids %}
+(
+    select * from {{ ref('stage_centroids') }}
+    {% if is_incremental() %}
+    -- Only sessions with new or invalidated centroids; encounters are per session
+    where session_id in (
+        select session_id from {{ ref('stage_centroids') }}
+        where {{ incremental_window('event_datetime', 'encounter_start') }}
+    )
+    {% endif %}
+)
+{% endset %}
+
 {{ compute_encounters(
-    centroids_table=ref('stage_centroids'),
+    centroids_table=centroids,
     distance_threshold=50,
     cooldown_seconds=180
 ) }}
@@ -0,0 +1,80 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['player_id', 'calendar_date'],
+    contract={"enforced": true},
+    on_schema_change='fail'
+) }}
+
+{%- set start = var('invalidate_start', none) -%}
+{%- set end = var('invalidate_end', none) or start -%}
+
+with sessions as (
+    select
+        playerId::{{ key_type() }} as player_id,
+        country,
+        eventDateTime as event_datetime,
+        eventLengthSeconds,
+        kills,
+        deaths
+    from {{ event_source('sprint_stage', 'fact_session') }}
+
+    {% if is_incremental() %}
+      where {{ incremental_window('eventDateTime', 'last_played') }}
+      {{ partition_pruning('last_played') }}
+    {% endif %}
+),
+
+new_days as (
+    select
+        player_id,
+        country,
+        event_datetime::date as calendar_date,
+        sum(eventLengthSeconds) as total_play_time_seconds,
+        count(*) as sessions_count,
+        sum(kills) as total_kills,
+        sum(deaths) as total_deaths,
+        min(event_datetime) as first_played,
+        max(event_datetime) as last_played
+    from sessions
+    group by player_id, country, calendar_date
+),
+
+{% if is_incremental() %}
+merged_days as (
+    -- New sessions are added to the stored day totals; days inside an
+    -- invalidated window were re-read in full and replace the stored row
+    select
+        n.player_id,
+        n.country,
+        n.calendar_date,
+        coalesce(t.total_play_time_seconds, 0) + n.total_play_time_seconds as total_play_time_seconds,
+        coalesce(t.sessions_count, 0) + n.sessions_count as sessions_count,
+        coalesce(t.total_kills, 0) + n.total_kills as total_kills,
+        coalesce(t.total_deaths, 0) + n.total_deaths as total_deaths,
+        least(coalesce(t.first_played, n.first_played), n.first_played) as first_played,
+        greatest(coalesce(t.last_played, n.last_played), n.last_played) as last_played
+    from new_days n
+    left join {{ this }} t
+        on t.player_id = n.player_id
+       and t.calendar_date = n.calendar_date
+      {%- if start is not none %}
+       and t.calendar_date not between '{{ start }}'::date and '{{ end }}'::date
+      {%- endif %}
+),
+{% endif %}
+
+typed as (
+    select
+        player_id,
+        country::varchar as country,
+        calendar_date,
+        total_play_time_seconds::bigint as total_play_time_seconds,
+        sessions_count::integer as sessions_count,
+        total_kills::integer as total_kills,
+        total_deaths::integer as total_deaths,
+        first_played,
+        last_played
+    from {{ 'merged_days' if is_incremental() else 'new_days' }}
+)
+
+select * from typed
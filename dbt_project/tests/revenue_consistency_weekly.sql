@@ -6,10 +6,12 @@ with mart as (
 ),
 raw as (
     select p.country, date_trunc('week', t.eventDateTime::timestamp) as year_week,
-    round(sum(t.purchasePrice), 2) as raw_revenue
-    from {{ source('sprint_raw', 'event_transaction') }} t
+    round(sum(round(t.purchasePrice * fx.usdRate, 2)), 2) as raw_revenue
+    from {{ event_source('sprint_raw', 'event_transaction') }} t
     left join {{ source('sprint_dim', 'dim_players') }} p
     on t.playerId = p.playerId
+    left join {{ ref('fx_rates') }} fx
+    on t.currency = fx.currency
     group by country, year_week
 )
 select mart.country, mart.year_week, mart_revenue, raw_revenue
@@ -1,22 +1,34 @@
 import argparse
+import asyncio
+import sys
 import uuid
+import duckdb
 import numpy as np
 import pandas as pd
 
 from utils import (
     generate_player_ids,
-    model_sign_ons,
+    sign_on_days,
     assign_countries,
     DIM_PRODUCTS_CSV,
     DEFAULT_STARTING_PLAYERS,
 )
 from session_generator import generate_sessions
+from archive import SessionArchive
+from lake import ParquetLake
+from pipeline import run_day_loop
+from live import emit_live
+from replay import index_archive, index_session_files, replay_sessions
+from ingest import DEFAULT_INGEST_BATCH_SIZE, DEFAULT_INGEST_FLUSH_SECONDS, ingest_events
 from loader import (
+    announce_invalidation,
     connect_to_duckdb,
-    load_table_to_df,
+    iter_signons_by_day,
+    query_table,
     write_dataframe_to_table,
     clear_old_data,
 )
+from keys import KeyAllocator
 from product_generator import generate_products, write_products_to_csv, OUTPUT_PATH
 from transaction_generator import generate_transactions
 
@@ -42,16 +54,54 @@ def generate_new_player_ids(n, existing_ids_set):
     return new_ids
 
 
-def run_players(conn, days=365, initial_players=1000, daily_growth_rate=0.001, daily_decay_rate=0.0007):
+def load_player_ids(conn):
+    """playerId column of dim_players (projection only), or None if there are no players."""
+    try:
+        player_ids = query_table(conn, "sprint_dim", "dim_players", columns=["playerId"]).fetchnumpy()["playerId"]
+    except duckdb.CatalogException:
+        return None
+    return player_ids.tolist() if len(player_ids) else None
+
+
+def load_country_map(conn):
+    players = query_table(conn, "sprint_dim", "dim_players", columns=["playerId", "country"]).fetchnumpy()
+    return dict(zip(players["playerId"].tolist(), players["country"].tolist()))
+
+
+def count_signons(conn, lake=None):
+    try:
+        if lake is not None:
+            return lake.scan(conn, "event_signons").count("*").fetchone()[0]
+        return query_table(conn, "sprint_raw", "event_signons", columns=["count(*)"]).fetchone()[0]
+    except (duckdb.CatalogException, duckdb.IOException):
+        return 0
+
+
+def write_players(conn, player_ids, keys, countries_map=None):
+    """
+    Save players to dim_players, swapping in surrogate keys when enabled.
+    Returns the player keys as written.
+    """
+    player_keys = keys.player_keys(player_ids)
+    df_players = pd.DataFrame({"playerId": player_keys})
+    if countries_map is not None:
+        df_players["country"] = [countries_map.get(pid, "Unknown") for pid in player_ids]
+
+    write_dataframe_to_table(conn, "sprint_dim", "dim_players", df_players, primary_key="playerId", replace=True)
+    keys.save(conn)
+    return player_keys
+
+
+def run_players(conn, keys, days=365, initial_players=1000, daily_growth_rate=0.001, daily_decay_rate=0.0007):
     """
     Generate players modeling conservative growth and decay over a period,
     assigning countries and saving to dim_players.
     """
-    existing_players_df = load_table_to_df(conn, "sprint_dim", "dim_players")
-    if existing_players_df is not None and not existing_players_df.empty:
-        print(f"⚠️ Found {len(existing_players_df)} existing players in DuckDB.")
+    existing_player_ids = load_player_ids(conn)
+    if existing_player_ids is not None:
+        print(f"⚠️ Found {len(existing_player_ids)} existing players in DuckDB.")
         if prompt_yes_no("Do you want to reuse the existing players instead of regenerating?"):
-            return existing_players_df[["playerId", "country"]]
+            return existing_player_ids
 
         else:
             print("❗ Clearing players and downstream data...")
@@ -84,16 +134,10 @@ def run_players(conn, days=365, initial_players=1000, daily_growth_rate=0.001, d
     all_player_ids_list = list(all_player_ids)
     countries_map = assign_countries(all_player_ids_list)  # assume returns dict {playerId: country}
 
-    # Create DataFrame with playerId and country
-    df_players = pd.DataFrame({
-        "playerId": all_player_ids_list,
-        "country": [countries_map.get(pid, "Unknown") for pid in all_player_ids_list]
-    })
-
-    write_dataframe_to_table(conn, "sprint_dim", "dim_players", df_players, primary_key="playerId", replace=True)
+    player_keys = write_players(conn, all_player_ids_list, keys, countries_map)
 
     print(f"✅ Generated {len(all_player_ids)} total players with countries assigned over {days} days.")
-    return all_player_ids_list
+    return player_keys
 
 
 def run_products():
@@ -113,115 +157,277 @@ def run_products():
     print(f"✅ {n_products} products generated and saved to seeds in {OUTPUT_PATH}.")
 
 
-def run_signons(conn, player_ids):
-    signons_df = load_table_to_df(conn, "sprint_raw", "event_signons")
-    players_df = load_table_to_df(conn, "sprint_dim", "dim_players")
-    country_map = dict(zip(players_df["playerId"], players_df["country"]))
+def run_signons(conn, player_ids, lake=None):
+    """
+    Pick the sign-on source for the day loop.
 
-    if signons_df is not None:
-        print(f"⚠️ Found existing sign-ons data with {len(signons_df)} records in DuckDB.")
+    Returns:
+        (days, fresh): an iterable of (date, playerIds) and whether those days
+        are newly modeled (and still need writing to event_signons).
+    """
+    existing = count_signons(conn, lake)
+    if existing:
+        print(f"⚠️ Found existing sign-ons data with {existing} records in DuckDB.")
         if prompt_yes_no("Do you want to use the existing sign-ons instead of regenerating?"):
-            return signons_df, country_map
+            return iter_signons_by_day(conn, lake=lake), False
 
     print("📅 Modeling player sign-ons...")
-    signons_df = model_sign_ons(player_ids, n_days=365)
-    write_dataframe_to_table(conn, "sprint_raw", "event_signons", signons_df, replace=True)
-    return signons_df, country_map
+    return sign_on_days(player_ids, n_days=365), True
 
 
-def run_sessions(conn, signons_df, country_map):
+def ensure_signons(conn, keys, lake=None):
+    """
+    Make sure event_signons is populated, regenerating players/sign-ons if needed.
+    Sign-ons are then streamed day by day from DuckDB by the generators.
+    """
+    if count_signons(conn, lake):
+        return
+    print("⚠️ No sign-ons found in DB, regenerating.")
+    player_ids = load_player_ids(conn)
+    if player_ids is None:
+        # If there are no players at all, generate default ones
+        default_ids = generate_player_ids(DEFAULT_STARTING_PLAYERS)
+        player_ids = write_players(conn, default_ids, keys, assign_countries(default_ids))
+
+    run_day_loop(
+        sign_on_days(player_ids, n_days=365), conn, None,
+        keys=keys, write_signons=True, sessions=False, transactions=False, lake=lake,
+    )
+
+
+def run_sessions(
+    conn, country_map, keys, pool_by="country", workers=1, archive=None, start_date=None, end_date=None, lake=None,
+    heartbeat_epsilon=None,
+):
     print("🎮 Generating sessions and inserting into DuckDB...")
-    generate_sessions(signons_df, country_map, conn)
+    generate_sessions(
+        iter_signons_by_day(conn, start_date, end_date, lake=lake), country_map, conn,
+        keys=keys, pool_by=pool_by, workers=workers, archive=archive,
+        start_date=start_date, end_date=end_date, lake=lake, heartbeat_epsilon=heartbeat_epsilon,
+    )
 
 
-def run_transactions(conn, signons_df):
+def run_transactions(conn, keys, start_date=None, end_date=None, lake=None):
     print("💸 Generating transactions and inserting into DuckDB...")
+    window = None
+    if start_date is not None:
+        window = clear_old_data(conn, level="transactions", start_date=start_date, end_date=end_date, announce=False)
+        if lake is not None:
+            lake.clear(("event_transaction", "event_subscription"), start_date, end_date)
     products_df = pd.read_csv(DIM_PRODUCTS_CSV)
-    generate_transactions(signons_df, products_df, conn)
+    replayed = generate_transactions(
+        iter_signons_by_day(conn, start_date, end_date, lake=lake), products_df, conn, keys=keys, lake=lake,
+        country_map=load_country_map(conn), start_date=start_date, end_date=end_date,
+    )
+    if window is not None:
+        # Replayed subscriptions extend the days dbt has to reprocess
+        announce_invalidation({**window, "end": replayed["end"]} if replayed else window)
+
+
+def run_live(conn, keys, target="-", speed=60.0, pool_by="country", start_date=None, end_date=None, lake=None):
+    """
+    Emit sessions and transactions for the stored sign-ons in (accelerated)
+    wall-clock time instead of writing them to DuckDB.
+    """
+    print(f"📡 Emitting live events to {target} at {'max' if speed is None else f'{speed:g}x'} speed...")
+    asyncio.run(emit_live(
+        iter_signons_by_day(conn, start_date, end_date, lake=lake), load_country_map(conn), target,
+        speed=speed, products_df=pd.read_csv(DIM_PRODUCTS_CSV), keys=keys, pool_by=pool_by,
+    ))
+
+
+def run_replay(source="files", target="-", speed=60.0, start_date=None, end_date=None):
+    """
+    Re-emit stored sessions' heartbeats in timestamp order from data/sessions
+    (or the packed archive); DuckDB is not touched, so an ingest can hold it.
+    """
+    if source == "archive":
+        sessions = index_archive(SessionArchive(), start_date, end_date)
+    else:
+        sessions = index_session_files(start_date=start_date, end_date=end_date)
+    print(f"⏪ Replaying to {target} at {'max' if speed is None else f'{speed:g}x'} speed...")
+    asyncio.run(replay_sessions(sessions, target, speed=speed))
 
 
 def main():
     parser = argparse.ArgumentParser(description="Data generation entrypoint control.")
     parser.add_argument(
         "--entrypoint",
-        choices=["players", "products", "signons", "sessions", "transactions", "all"],
+        choices=["players", "products", "signons", "sessions", "transactions", "all", "live", "ingest", "replay"],
         default="all",
         help="Where to start in the data generation process."
     )
+    parser.add_argument(
+        "--surrogate-keys",
+        action="store_true",
+        help="Emit BIGINT player/session/team/transaction keys with uuid mapping tables "
+             "(run dbt with --vars '{surrogate_keys: true}').",
+    )
+    parser.add_argument(
+        "--pool-by",
+        choices=["country", "region", "none"],
+        default="country",
+        help="Matchmaking pool granularity; lobbies never mix pools.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes used to simulate matchmaking pools in parallel.",
+    )
+    parser.add_argument(
+        "--start-date",
+        help="With --entrypoint sessions/transactions: only regenerate days from this date "
+             "(YYYY-MM-DD), deleting just their rows instead of dropping tables. "
+             "With --entrypoint live/replay: only emit days from this date.",
+    )
+    parser.add_argument(
+        "--end-date",
+        help="Last day of the --start-date window (defaults to --start-date).",
+    )
+    parser.add_argument(
+        "--lake",
+        action="store_true",
+        help="Write sign-ons, sessions, session summaries and transactions as date-partitioned "
+             "Parquet under data/lake instead of DuckDB tables (run dbt with --vars '{lake: true}').",
+    )
+    parser.add_argument(
+        "--archive",
+        action="store_true",
+        help="Also append sessions to the packed heartbeat archive in data/archive.",
+    )
+    parser.add_argument(
+        "--adaptive-heartbeats",
+        type=float,
+        nargs="?",
+        const=0.0,
+        metavar="EPSILON",
+        help="Write session heartbeats only when a player moved more than EPSILON units since their last "
+             "written beat (default 0: drop exact repeats only) or 5 minutes passed; skipped beats are "
+             "recorded as holdBeats and forward-filled by dbt.",
+    )
+    parser.add_argument(
+        "--live-target",
+        default="-",
+        help="With --entrypoint live/replay: '-' (stdout JSON lines), 'unix:<path>', 'tcp:<host>:<port>', "
+             "'fifo:<path>' or a file path.",
+    )
+    parser.add_argument(
+        "--live-speed",
+        type=float,
+        default=60.0,
+        help="With --entrypoint live/replay: simulated seconds per wall-clock second (0 = as fast as possible).",
+    )
+    parser.add_argument(
+        "--replay-source",
+        choices=["files", "archive"],
+        default="files",
+        help="With --entrypoint replay: read data/sessions/*.json or the packed archive in data/archive.",
+    )
+    parser.add_argument(
+        "--ingest-listen",
+        default="-",
+        help="With --entrypoint ingest: read JSON-lines or Arrow IPC events from '-' (stdin), "
+             "'unix:<path>' or 'tcp:<host>:<port>'.",
+    )
+    parser.add_argument(
+        "--ingest-batch-size",
+        type=int,
+        default=DEFAULT_INGEST_BATCH_SIZE,
+        help="With --entrypoint ingest: events per DuckDB append.",
+    )
+    parser.add_argument(
+        "--ingest-flush-interval",
+        type=float,
+        default=DEFAULT_INGEST_FLUSH_SECONDS,
+        help="With --entrypoint ingest: max seconds an event waits before its batch is appended.",
+    )
+    parser.add_argument(
+        "--ingest-connections",
+        type=int,
+        help="With --entrypoint ingest on a socket: stop after this many connections (default: serve until Ctrl+C).",
+    )
     args = parser.parse_args()
 
+    if args.entrypoint in ("live", "replay"):
+        # stdout may be the event stream; progress messages go to stderr
+        sys.stdout = sys.stderr
+
+    if args.entrypoint == "replay":
+        run_replay(
+            args.replay_source, args.live_target, speed=args.live_speed or None,
+            start_date=args.start_date, end_date=args.end_date or args.start_date,
+        )
+        print("✅ Done!")
+        return
+
     print("📦 Connecting to DuckDB...")
     conn = connect_to_duckdb()
+    lake = ParquetLake() if args.lake else None
+    keys = KeyAllocator(surrogate=args.surrogate_keys, duck_conn=conn, lake=lake)
 
     player_ids = None
-    signons_df = None
-    country_map = None
 
     if args.entrypoint in ("players", "all"):
-        player_ids = run_players(conn)
+        player_ids = run_players(conn, keys)
 
     if args.entrypoint in ("products", "all"):
         run_products()
 
+    pool_by = None if args.pool_by == "none" else args.pool_by
+    end_date = args.end_date or args.start_date
+    archive = SessionArchive() if args.archive else None
+
     if args.entrypoint in ("signons", "all"):
         if player_ids is None:
-            players_df = load_table_to_df(conn, "sprint_dim", "dim_players")
-            if players_df is None or players_df.empty:
+            player_ids = load_player_ids(conn)
+            if player_ids is None:
                 print("⚠️ No players found in DB, generating default players.")
-                player_ids = generate_player_ids(DEFAULT_STARTING_PLAYERS)
-                df_players = pd.DataFrame({"playerId": player_ids})
-                write_dataframe_to_table(conn, "sprint_dim", "dim_players", df_players, primary_key="playerId", replace=True)
-            else:
-                player_ids = players_df["playerId"].tolist()
-        signons_df, country_map = run_signons(conn, player_ids)
-
-    if args.entrypoint in ("sessions", "all"):
-        if signons_df is None:
-            signons_df = load_table_to_df(conn, "sprint_raw", "event_signons")
-            if signons_df is None or signons_df.empty:
-                print("⚠️ No sign-ons found in DB, regenerating.")
-                players_df = load_table_to_df(conn, "sprint_dim", "dim_players")
-
-                if players_df is None or players_df.empty:
-                    # If there are no players at all, generate default ones
-                    player_ids = generate_player_ids(DEFAULT_STARTING_PLAYERS)
-                    df_players = pd.DataFrame({"playerId": player_ids, "country": assign_countries(player_ids)})
-                    write_dataframe_to_table(
-                        conn, "sprint_dim", "dim_players", df_players,
-                        primary_key="playerId", replace=True
-                    )
-                else:
-                    player_ids = players_df["playerId"].tolist()
-
-                signons_df = model_sign_ons(player_ids, n_days=365)
-                write_dataframe_to_table(conn, "sprint_raw", "event_signons", signons_df, replace=True)
-
-                # Build country map directly from dim_players table
-                players_df = load_table_to_df(conn, "sprint_dim", "dim_players")
-                country_map = dict(zip(players_df["playerId"], players_df["country"]))
-            else:
-                # Build country map from existing players table, not from assign_countries
-                players_df = load_table_to_df(conn, "sprint_dim", "dim_players")
-                country_map = dict(zip(players_df["playerId"], players_df["country"]))
-
-        run_sessions(conn, signons_df, country_map)
-
-
-    if args.entrypoint in ("transactions", "all"):
-        if signons_df is None:
-            signons_df = load_table_to_df(conn, "sprint_raw", "event_signons")
-            if signons_df is None:
-                print("⚠️ No sign-ons found in DB, regenerating.")
-                players_df = load_table_to_df(conn, "sprint_dim", "dim_players")
-                if players_df is None or players_df.empty:
-                    player_ids = generate_player_ids(DEFAULT_STARTING_PLAYERS)
-                    df_players = pd.DataFrame({"playerId": player_ids})
-                    write_dataframe_to_table(conn, "sprint_dim", "dim_players", df_players, primary_key="playerId", replace=True)
-                else:
-                    player_ids = players_df["playerId"].tolist()
-                signons_df = model_sign_ons(player_ids, n_days=365)
-                write_dataframe_to_table(conn, "sprint_raw", "event_signons", signons_df, replace=True)
-        run_transactions(conn, signons_df)
+                player_ids = write_players(conn, generate_player_ids(DEFAULT_STARTING_PLAYERS), keys)
+        days, fresh = run_signons(conn, player_ids, lake)
+
+        if args.entrypoint == "signons":
+            if fresh:
+                run_day_loop(
+                    days, conn, None, keys=keys, write_signons=True, sessions=False, transactions=False, lake=lake
+                )
+        else:
+            # One pass over the calendar: sign-ons, sessions and transactions per day
+            print("🎮💸 Generating sessions and transactions day by day...")
+            run_day_loop(
+                days, conn, load_country_map(conn),
+                products_df=pd.read_csv(DIM_PRODUCTS_CSV),
+                keys=keys, write_signons=fresh,
+                workers=args.workers, archive=archive, lake=lake, pool_by=pool_by,
+                heartbeat_epsilon=args.adaptive_heartbeats,
+            )
+
+    if args.entrypoint == "sessions":
+        ensure_signons(conn, keys, lake)
+        # Build country map from existing players table, not from assign_countries
+        country_map = load_country_map(conn)
+        run_sessions(
+            conn, country_map, keys, pool_by=pool_by, workers=args.workers, archive=archive,
+            start_date=args.start_date, end_date=end_date, lake=lake,
+            heartbeat_epsilon=args.adaptive_heartbeats,
+        )
+
+    if args.entrypoint == "transactions":
+        ensure_signons(conn, keys, lake)
+        run_transactions(conn, keys, start_date=args.start_date, end_date=end_date, lake=lake)
+
+    if args.entrypoint == "live":
+        ensure_signons(conn, keys, lake)
+        run_live(
+            conn, keys, args.live_target, speed=args.live_speed or None, pool_by=pool_by,
+            start_date=args.start_date, end_date=end_date, lake=lake,
+        )
+
+    if args.entrypoint == "ingest":
+        asyncio.run(ingest_events(
+            conn, args.ingest_listen, max_connections=args.ingest_connections,
+            batch_size=args.ingest_batch_size, flush_interval=args.ingest_flush_interval,
+        ))
 
     print("✅ Done!")
 
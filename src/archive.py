@@ -0,0 +1,278 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from loader import write_dataframe_to_table
+from records import HEARTBEAT_COLUMNS, HeartbeatBatch, _key_column, expand_held_beats
+from utils import ARCHIVE_PATH, SESSION_PATH
+
+# One packed 28-byte record per heartbeat, same layout as a HeartbeatBatch row
+ARCHIVE_DTYPE = np.dtype(list(HEARTBEAT_COLUMNS.items()))
+
+DATA_FILE = "heartbeats.bin"
+INDEX_FILE = "index.jsonl"
+
+
+class SessionArchive:
+    """
+    Append-only packed archive of session heartbeats.
+
+    `heartbeats.bin` holds every beat as a fixed-size ARCHIVE_DTYPE record,
+    session after session. `index.jsonl` holds one line per session with its
+    record offset/count, date, start/end time and the player/team lookup
+    tables. Data is written before its index line, so a crash never leaves
+    the index pointing past the end of the data file.
+
+    Reads memory-map the data file: `read()` returns a HeartbeatBatch whose
+    arrays are views into the map, so opening a session copies nothing.
+
+    Args:
+        path: Archive directory (created on first append).
+    """
+
+    def __init__(self, path: Path = ARCHIVE_PATH):
+        self.path = Path(path)
+        self._entries = {}
+        self._by_date = {}
+        self._records = 0
+        self._mmap = None
+
+        index_path = self.path / INDEX_FILE
+        if index_path.exists():
+            with open(index_path) as f:
+                for line in f:
+                    if line.strip():
+                        self._add_entry(json.loads(line))
+
+    def _add_entry(self, entry):
+        self._entries[entry["sessionId"]] = entry
+        self._by_date.setdefault(entry["date"], []).append(entry["sessionId"])
+        self._records = max(self._records, entry["offset"] + entry["count"])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, session_id):
+        return session_id in self._entries
+
+    def dates(self) -> list[str]:
+        return sorted(self._by_date)
+
+    def session_ids(self, date=None) -> list:
+        """All archived session ids, or those of one date (YYYY-MM-DD)."""
+        if date is None:
+            return list(self._entries)
+        return list(self._by_date.get(str(pd.Timestamp(date).date()), []))
+
+    def entry(self, session_id) -> dict:
+        return self._entries[session_id]
+
+    def append(self, session_id, session_start: datetime, session_end: datetime, batch: HeartbeatBatch):
+        """Append one session's heartbeats and index entry."""
+        if session_id in self._entries:
+            raise ValueError(f"Session {session_id} is already archived")
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        records = np.empty(len(batch), dtype=ARCHIVE_DTYPE)
+        for col in HEARTBEAT_COLUMNS:
+            records[col] = getattr(batch, col)
+
+        with open(self.path / DATA_FILE, "ab") as f:
+            offset = f.tell() // ARCHIVE_DTYPE.itemsize
+            f.write(records.tobytes())
+
+        entry = {
+            "sessionId": session_id,
+            "date": session_start.date().isoformat(),
+            "startTime": session_start.isoformat(),
+            "endTime": session_end.isoformat(),
+            "offset": offset,
+            "count": len(batch),
+            "playerIds": list(batch.player_ids),
+            "teamIds": list(batch.team_ids),
+        }
+        with open(self.path / INDEX_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self._add_entry(entry)
+
+    def clear(self, start_date=None, end_date=None) -> int:
+        """
+        Remove every session, or only those dated in [start_date, end_date].
+
+        Kept sessions are copied into a compacted data file with new offsets,
+        then the data file and the index are swapped in. Call this before
+        regenerating sessions, so the archive never holds two versions of a
+        day.
+
+        Returns:
+            Number of sessions removed.
+        """
+        if start_date is None:
+            removed = len(self._entries)
+            for name in (INDEX_FILE, DATA_FILE):
+                (self.path / name).unlink(missing_ok=True)
+            kept = []
+        else:
+            first = pd.Timestamp(start_date).date().isoformat()
+            last = pd.Timestamp(end_date if end_date is not None else start_date).date().isoformat()
+            kept = [e for e in self._entries.values() if not first <= e["date"] <= last]
+            removed = len(self._entries) - len(kept)
+            if not removed:
+                return 0
+
+            records = self._records_view()
+            moved, offset = [], 0
+            with open(self.path / f"{DATA_FILE}.tmp", "wb") as data, open(self.path / f"{INDEX_FILE}.tmp", "w") as index:
+                for entry in kept:
+                    data.write(records[entry["offset"]:entry["offset"] + entry["count"]].tobytes())
+                    moved.append({**entry, "offset": offset})
+                    offset += entry["count"]
+                    index.write(json.dumps(moved[-1]) + "\n")
+            self._mmap = None
+            os.replace(self.path / f"{DATA_FILE}.tmp", self.path / DATA_FILE)
+            os.replace(self.path / f"{INDEX_FILE}.tmp", self.path / INDEX_FILE)
+            kept = moved
+
+        self._entries, self._by_date, self._records, self._mmap = {}, {}, 0, None
+        for entry in kept:
+            self._add_entry(entry)
+        print(f"🗑️ Removed {removed} sessions from {self.path}")
+        return removed
+
+    def _records_view(self):
+        # Re-map only when the file has grown past the current map
+        if self._mmap is None or len(self._mmap) < self._records:
+            if self._records == 0:
+                return np.empty(0, dtype=ARCHIVE_DTYPE)
+            self._mmap = np.memmap(self.path / DATA_FILE, dtype=ARCHIVE_DTYPE, mode="r")
+        return self._mmap
+
+    def read(self, session_id) -> HeartbeatBatch:
+        """
+        Random access to one session as a HeartbeatBatch of memory-mapped views.
+
+        The arrays are read-only; copy them before modifying.
+        """
+        entry = self._entries[session_id]
+        records = self._records_view()[entry["offset"]:entry["offset"] + entry["count"]]
+        return HeartbeatBatch(
+            session_id=session_id,
+            player_ids=entry["playerIds"],
+            team_ids=entry["teamIds"],
+            **{col: records[col] for col in HEARTBEAT_COLUMNS},
+        )
+
+    def iter_sessions(self, date=None):
+        """Yield (index entry, HeartbeatBatch) in archive order."""
+        for session_id in self.session_ids(date):
+            yield self._entries[session_id], self.read(session_id)
+
+    def to_frame(self, session_ids) -> pd.DataFrame:
+        """
+        Flat heartbeat rows for many sessions in one pass.
+
+        Per-session lookup tables are merged into one global table, and each
+        session's indices are remapped with a single gather, so no per-beat
+        Python objects are created.
+        """
+        records = self._records_view()
+        player_lookup, team_lookup, session_lookup = {}, {}, {}
+        parts = {col: [] for col in ("player", "team", "session", "rows")}
+        for session_id in session_ids:
+            entry = self._entries[session_id]
+            rows = records[entry["offset"]:entry["offset"] + entry["count"]]
+            player_map = np.array([player_lookup.setdefault(p, len(player_lookup)) for p in entry["playerIds"]], dtype=np.int32)
+            team_map = np.array([team_lookup.setdefault(t, len(team_lookup)) for t in entry["teamIds"]], dtype=np.int32)
+            session_code = session_lookup.setdefault(session_id, len(session_lookup))
+
+            parts["player"].append(player_map[rows["player_idx"]] if len(rows) else np.empty(0, dtype=np.int32))
+            parts["team"].append(team_map[rows["team_idx"]] if len(rows) else np.empty(0, dtype=np.int32))
+            parts["session"].append(np.full(len(rows), session_code, dtype=np.int32))
+            parts["rows"].append(rows)
+
+        rows = np.concatenate(parts["rows"]) if parts["rows"] else np.empty(0, dtype=ARCHIVE_DTYPE)
+        codes = {
+            col: np.concatenate(parts[col]) if parts[col] else np.empty(0, dtype=np.int32)
+            for col in ("player", "team", "session")
+        }
+        return pd.DataFrame({
+            "timestamp": rows["timestamp"].view("datetime64[s]"),
+            "playerId": _key_column(list(player_lookup), codes["player"]),
+            "sessionId": _key_column(list(session_lookup), codes["session"]),
+            "teamId": _key_column(list(team_lookup), codes["team"]),
+            "positionX": rows["position_x"],
+            "positionY": rows["position_y"],
+            "positionZ": rows["position_z"],
+        })
+
+    def to_duckdb(
+        self,
+        duck_conn,
+        schema: str = "sprint_raw",
+        table: str = "archive_heartbeat",
+        dates=None,
+        sessions_per_chunk: int = 5000,
+    ):
+        """
+        Bulk-load archived heartbeats into a flat, typed DuckDB table.
+
+        Sessions are loaded in chunks of `sessions_per_chunk` to bound memory.
+        """
+        if dates is None:
+            session_ids = self.session_ids()
+        else:
+            session_ids = [sid for date in dates for sid in self.session_ids(date)]
+
+        for start in range(0, len(session_ids), sessions_per_chunk):
+            frame = self.to_frame(session_ids[start:start + sessions_per_chunk])
+            write_dataframe_to_table(duck_conn, schema, table, frame, replace=False)
+
+
+def batch_from_session_json(session: dict) -> HeartbeatBatch:
+    """Parse one session file's JSON (held beats expanded) into a HeartbeatBatch."""
+    beats = expand_held_beats(pd.DataFrame(session["heartbeats"]))
+    if beats.empty:
+        beats = pd.DataFrame(columns=["timestamp", "playerId", "teamId", "positionX", "positionY", "positionZ"])
+    player_idx, player_ids = pd.factorize(beats["playerId"])
+    team_idx, team_ids = pd.factorize(beats["teamId"])
+    return HeartbeatBatch(
+        session_id=session["sessionId"],
+        player_ids=player_ids.tolist(),
+        team_ids=team_ids.tolist(),
+        player_idx=player_idx,
+        team_idx=team_idx,
+        timestamp=pd.to_datetime(beats["timestamp"]).to_numpy().astype("datetime64[s]").astype(np.int64),
+        position_x=beats["positionX"].to_numpy(dtype=np.float32),
+        position_y=beats["positionY"].to_numpy(dtype=np.float32),
+        position_z=beats["positionZ"].to_numpy(dtype=np.float32),
+    )
+
+
+def pack_session_files(archive: SessionArchive, session_dir: Path = SESSION_PATH) -> int:
+    """
+    Pack existing `data/sessions/*.json` files into the archive.
+
+    Sessions already in the archive are skipped, so this can be re-run as new
+    files arrive. Returns the number of sessions added.
+    """
+    added = 0
+    for json_path in sorted(Path(session_dir).glob("*.json")):
+        session = json.loads(json_path.read_text())
+        session_id = session["sessionId"]
+        if session_id in archive:
+            continue
+
+        archive.append(
+            session_id,
+            datetime.fromisoformat(session["startTime"]),
+            datetime.fromisoformat(session["endTime"]),
+            batch_from_session_json(session),
+        )
+        added += 1
+
+    print(f"📦 Packed {added} session files into {archive.path}")
+    return added
@@ -0,0 +1,263 @@
+import json
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from archive import batch_from_session_json
+from records import POSITION_DECIMALS, HeartbeatBatch, _key_column
+from utils import HEARTBEAT_INTERVAL, SESSION_PATH, iso_format
+
+# Integer position steps per grid unit: millimetres, the precision positions are written at
+POSITION_SCALE = 10 ** POSITION_DECIMALS
+
+# Same codec for every Parquet size in the report, so only the layout differs
+PARQUET_COMPRESSION = "zstd"
+
+AXES = ("x", "y", "z")
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """int16 when every value fits, else int32."""
+    info = np.iinfo(np.int16)
+    if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+        return values.astype(np.int16)
+    return values.astype(np.int32)
+
+
+class EncodedHeartbeats:
+    """
+    Quantized, delta-encoded heartbeats of one session.
+
+    Beats are grouped into paths (one per player and team, in time order)
+    that store the player, team and length once. Positions are integer
+    millimetres (POSITION_SCALE per grid unit); a path's first beat holds its
+    absolute position and every later beat the change since the previous
+    one, so a smooth path becomes small integers, stored as int16 whenever
+    the session's steps fit (int32 otherwise). Timestamps are `start` plus a
+    beat index `tick` on the HEARTBEAT_INTERVAL grid: 8-14 bytes per beat
+    against HeartbeatBatch's 28.
+
+    Decoding is exact at the written precision: `decode().to_records()`
+    equals the original batch's `to_records()` after sorting by player and time.
+
+    Args:
+        session_id: Session identifier.
+        player_ids / team_ids: Lookup tables, as in HeartbeatBatch.
+        start: Session start as int epoch seconds (tick 0).
+        path_player / path_team: int32 lookup indices per path.
+        path_length: int32 beats per path.
+        tick: uint16 beat index since `start`, per beat.
+        dx / dy / dz: int16 or int32 millimetre deltas per beat.
+    """
+
+    __slots__ = (
+        "session_id", "player_ids", "team_ids", "start",
+        "path_player", "path_team", "path_length", "tick", "dx", "dy", "dz",
+    )
+
+    def __init__(
+        self, session_id, player_ids, team_ids, start, path_player, path_team, path_length, tick, dx, dy, dz
+    ):
+        self.session_id = session_id
+        self.player_ids = list(player_ids)
+        self.team_ids = list(team_ids)
+        self.start = int(start)
+        self.path_player = np.asarray(path_player, dtype=np.int32)
+        self.path_team = np.asarray(path_team, dtype=np.int32)
+        self.path_length = np.asarray(path_length, dtype=np.int32)
+        self.tick = np.asarray(tick)
+        self.dx = np.asarray(dx)
+        self.dy = np.asarray(dy)
+        self.dz = np.asarray(dz)
+
+    def __len__(self):
+        return len(self.tick)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the per-beat arrays (lookup tables excluded)."""
+        return sum(
+            getattr(self, col).nbytes
+            for col in ("path_player", "path_team", "path_length", "tick", "dx", "dy", "dz")
+        )
+
+    def _path_starts(self) -> np.ndarray:
+        return np.cumsum(self.path_length) - self.path_length
+
+    @classmethod
+    def encode(cls, batch: HeartbeatBatch, start=None) -> "EncodedHeartbeats":
+        """
+        Encode a HeartbeatBatch; `start` defaults to its first beat.
+
+        `hold_beats` from adaptive sampling is not carried: encode full batches.
+
+        Raises:
+            ValueError: If a timestamp is before `start` or off the heartbeat grid.
+        """
+        order = np.lexsort((batch.timestamp, batch.team_idx, batch.player_idx))
+        timestamp = batch.timestamp[order]
+        if start is None:
+            start = int(timestamp.min()) if len(timestamp) else 0
+        offset = timestamp - start
+        if np.any(offset < 0) or np.any(offset % HEARTBEAT_INTERVAL):
+            raise ValueError(f"Session {batch.session_id} has beats off the {HEARTBEAT_INTERVAL}s grid from {start}")
+        ticks = offset // HEARTBEAT_INTERVAL
+        tick_dtype = np.uint16 if not len(ticks) or ticks.max() <= np.iinfo(np.uint16).max else np.uint32
+
+        player_idx, team_idx = batch.player_idx[order], batch.team_idx[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (player_idx[1:] != player_idx[:-1]) | (team_idx[1:] != team_idx[:-1])
+        starts = np.flatnonzero(first)
+        deltas = {}
+        for axis in AXES:
+            # Same rounding as the JSON writer, so decoding reproduces it exactly
+            quantized = np.rint(
+                getattr(batch, f"position_{axis}")[order].astype(np.float64) * POSITION_SCALE
+            ).astype(np.int64)
+            delta = quantized.copy()
+            delta[1:] -= quantized[:-1]
+            delta[first] = quantized[first]
+            deltas[f"d{axis}"] = _narrow(delta)
+
+        return cls(
+            batch.session_id, batch.player_ids, batch.team_ids, start,
+            path_player=player_idx[starts],
+            path_team=team_idx[starts],
+            path_length=np.diff(np.append(starts, len(order))),
+            tick=ticks.astype(tick_dtype),
+            **deltas,
+        )
+
+    def decode(self) -> HeartbeatBatch:
+        """Rebuild the HeartbeatBatch (path order, millimetre positions)."""
+        starts, lengths = self._path_starts(), self.path_length
+        positions = {}
+        for axis in AXES:
+            delta = getattr(self, f"d{axis}").astype(np.int64)
+            running = np.cumsum(delta)
+            # Restart the running sum at every path's absolute first beat
+            quantized = running - np.repeat(running[starts] - delta[starts], lengths)
+            positions[f"position_{axis}"] = (quantized / POSITION_SCALE).astype(np.float32)
+
+        return HeartbeatBatch(
+            self.session_id, self.player_ids, self.team_ids,
+            player_idx=np.repeat(self.path_player, self.path_length),
+            team_idx=np.repeat(self.path_team, self.path_length),
+            timestamp=self.start + self.tick.astype(np.int64) * HEARTBEAT_INTERVAL,
+            **positions,
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Flat rows in the DuckDB-readable encoded layout (see `decode_sql`).
+
+        `startTime` repeats per row; Parquet run-length encodes it away.
+        """
+        n = len(self)
+        return pd.DataFrame({
+            "sessionId": _key_column([self.session_id], np.zeros(n, dtype=np.int8)),
+            "playerId": _key_column(self.player_ids, np.repeat(self.path_player, self.path_length)),
+            "teamId": _key_column(self.team_ids, np.repeat(self.path_team, self.path_length)),
+            "startTime": np.full(n, self.start, dtype=np.int64).view("datetime64[s]"),
+            "tick": self.tick,
+            "dX": self.dx,
+            "dY": self.dy,
+            "dZ": self.dz,
+        })
+
+
+def write_encoded_parquet(encoded: list[EncodedHeartbeats], path) -> Path:
+    """Write encoded sessions to one Parquet file in the `to_frame` layout."""
+    frame = pd.concat([e.to_frame() for e in encoded], ignore_index=True)
+    duckdb.from_df(frame).write_parquet(str(path), compression=PARQUET_COMPRESSION)
+    return Path(path)
+
+
+def decode_sql(source: str) -> str:
+    """
+    SQL decoding the encoded layout back to heartbeat rows in DuckDB.
+
+    Positions are a running sum of the deltas along each player's path,
+    timestamps are `startTime + tick * HEARTBEAT_INTERVAL`.
+
+    Args:
+        source: Any relation in the encoded layout, e.g.
+            `read_parquet('data/encoded/*.parquet')`.
+    """
+    positions = ",\n    ".join(
+        f"sum(d{axis.upper()}) OVER path / {POSITION_SCALE}.0 AS position{axis.upper()}" for axis in AXES
+    )
+    return f"""
+SELECT
+    startTime + to_seconds(tick * {HEARTBEAT_INTERVAL}) AS timestamp,
+    playerId,
+    sessionId,
+    teamId,
+    {positions}
+FROM {source}
+WINDOW path AS (PARTITION BY sessionId, playerId, teamId ORDER BY tick ROWS UNBOUNDED PRECEDING)
+"""
+
+
+def _session_json(batch: HeartbeatBatch) -> str:
+    # Same layout and indentation as session_generator.write_session_to_disk
+    start, end = iso_format(np.array([batch.timestamp.min(), batch.timestamp.max()])).tolist()
+    return json.dumps(
+        {"sessionId": batch.session_id, "startTime": start, "endTime": end, "heartbeats": batch.to_records()},
+        indent=2,
+    )
+
+
+def compression_report(batches: list[HeartbeatBatch]) -> dict:
+    """
+    Measure the encoded layout against the session JSON and plain Parquet.
+
+    Sizes are bytes for all `batches`: `json` (session files),
+    `parquet` (`HeartbeatBatch.to_frame` rows: float32 positions and
+    timestamps), `encoded_parquet` and the in-memory `arrays` /
+    `encoded_arrays`. Both Parquet files use PARQUET_COMPRESSION.
+
+    Returns:
+        Dict with `beats`, the sizes, `<size>_per_beat` and the ratios
+        `vs_json` / `vs_parquet` / `vs_arrays` (how many times smaller the
+        encoded form is).
+    """
+    batches = [b for b in batches if len(b)]
+    encoded = [EncodedHeartbeats.encode(b) for b in batches]
+    sizes = {
+        "json": sum(len(_session_json(b).encode()) for b in batches),
+        "arrays": sum(b.nbytes for b in batches),
+        "encoded_arrays": sum(e.nbytes for e in encoded),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Path(tmp) / "plain.parquet"
+        duckdb.from_df(pd.concat([b.to_frame() for b in batches], ignore_index=True)).write_parquet(
+            str(plain), compression=PARQUET_COMPRESSION
+        )
+        sizes["parquet"] = plain.stat().st_size
+        sizes["encoded_parquet"] = write_encoded_parquet(encoded, Path(tmp) / "encoded.parquet").stat().st_size
+
+    beats = sum(len(b) for b in batches)
+    report = {"beats": beats, **sizes}
+    report.update({f"{name}_per_beat": size / max(beats, 1) for name, size in sizes.items()})
+    report["vs_json"] = sizes["json"] / sizes["encoded_parquet"]
+    report["vs_parquet"] = sizes["parquet"] / sizes["encoded_parquet"]
+    report["vs_arrays"] = sizes["arrays"] / sizes["encoded_arrays"]
+    return report
+
+
+if __name__ == "__main__":
+    started = datetime.now()
+    batches = [batch_from_session_json(json.loads(p.read_text())) for p in sorted(SESSION_PATH.glob("*.json"))]
+    report = compression_report(batches)
+    print(f"🗜️ {report['beats']:,} heartbeats from {len(batches)} session files ({datetime.now() - started})")
+    for name in ("json", "parquet", "encoded_parquet", "arrays", "encoded_arrays"):
+        print(f"   {name:<16} {report[name]:>12,} bytes  {report[name + '_per_beat']:6.2f} B/beat")
+    print(
+        f"✅ Encoded Parquet is {report['vs_json']:.1f}x smaller than JSON, "
+        f"{report['vs_parquet']:.1f}x smaller than plain Parquet"
+    )
@@ -1,7 +1,9 @@
-from datetime import datetime, timedelta
+import zlib
+from datetime import datetime
 import numpy as np
 
-from utils import HEARTBEAT_INTERVAL, GRID_BOUNDS
+from records import HeartbeatBatch
+from utils import HEARTBEAT_INTERVAL, GRID_BOUNDS, to_epoch_seconds
 from movement.step import lorentzian, bezier, lissajous, perlin
 
 STEP_FUNCTIONS = {
@@ -11,6 +13,12 @@ STEP_FUNCTIONS = {
     "perlin": perlin.step,
 }
 
+# Movements whose displacements do not depend on position: a player's whole
+# path of deltas is drawn in one call, `(speed, timesteps, seed) -> (n, 3)`
+DELTA_FUNCTIONS = {
+    "perlin": perlin.deltas,
+}
+
 def clamp_to_bounds(x, y, z):
     lower, upper = GRID_BOUNDS
     x = max(min(x, upper), lower)
@@ -18,6 +26,115 @@ def clamp_to_bounds(x, y, z):
     z = max(min(z, upper), lower)
     return x, y, z
 
+def noise_seed(player_id) -> int:
+    """Stable per-player noise base (0-255), so noise-driven players don't all trace one path."""
+    return zlib.crc32(str(player_id).encode()) & 255
+
+def clamped_walk(start, deltas: np.ndarray) -> np.ndarray:
+    """
+    Accumulate (n, 3) deltas from `start`, clamping to GRID_BOUNDS after every step.
+
+    Same result as stepping and clamping beat by beat: runs between boundary
+    hits are one cumulative sum, and the walk restarts from each clamped beat.
+    """
+    lower, upper = GRID_BOUNDS
+    path = np.empty((len(deltas), 3))
+    pos = np.asarray(start, dtype=np.float64)
+    i = 0
+    while i < len(deltas):
+        # Summing from the current position keeps the beat-by-beat addition order
+        walk = np.cumsum(np.vstack([pos, deltas[i:]]), axis=0)[1:]
+        hits = np.flatnonzero(((walk < lower) | (walk > upper)).any(axis=1))
+        if not len(hits):
+            path[i:] = walk
+            break
+        stop = i + hits[0]
+        path[i:stop] = walk[:hits[0]]
+        pos = path[stop] = np.clip(walk[hits[0]], lower, upper)
+        i = stop + 1
+    return path
+
+def assign_start_positions(player_ids: list[str], rng=None) -> dict[str, tuple]:
+    """
+    Assign unique random starting positions avoiding collisions (min 1 unit apart).
+    """
+    rng = rng or np.random
+    positions = {}
+    attempts = 0
+    while len(positions) < len(player_ids):
+        candidate_pos = rng.uniform(*GRID_BOUNDS, size=3)
+        collision = any(
+            np.linalg.norm(candidate_pos - np.array(pos)) < 1 for pos in positions.values()
+        )
+        if not collision:
+            pid = player_ids[len(positions)]
+            positions[pid] = tuple(candidate_pos)
+        else:
+            attempts += 1
+            if attempts > 1000:
+                raise RuntimeError("Failed to assign unique start positions without collision.")
+    return positions
+
+def simulate_heartbeat_batch(
+    player_ids: list[str],
+    session_id: str,
+    team_ids: dict[str, str],
+    session_start: "datetime.datetime",
+    speed_map: dict[str, int],
+    durations: dict[str, int],
+    behavior_map: dict[str, str],
+    rng=None,
+) -> HeartbeatBatch:
+    """
+    Simulate heartbeat positions for all players into a compact HeartbeatBatch.
+
+    Same inputs as `simulate_heartbeats`, but beats are written straight into
+    preallocated struct-of-arrays storage instead of one dict per beat.
+    Start positions are drawn from `rng` (a np.random.RandomState; the
+    global np.random by default).
+
+    Returns:
+        HeartbeatBatch with one entry per emitted heartbeat, grouped by player.
+    """
+    positions = assign_start_positions(player_ids, rng)
+
+    team_lookup = list(dict.fromkeys(team_ids[pid] for pid in player_ids))
+    team_index = {tid: i for i, tid in enumerate(team_lookup)}
+
+    beats_per_player = [durations[pid] // HEARTBEAT_INTERVAL for pid in player_ids]
+    batch = HeartbeatBatch.empty(session_id, player_ids, team_lookup, sum(beats_per_player))
+    start_epoch = to_epoch_seconds(session_start)
+
+    # Generate heartbeats per player
+    offset = 0
+    for p_idx, (pid, num_beats) in enumerate(zip(player_ids, beats_per_player)):
+        speed = speed_map[pid]
+        end = offset + num_beats
+
+        batch.player_idx[offset:end] = p_idx
+        batch.team_idx[offset:end] = team_index[team_ids[pid]]
+        batch.timestamp[offset:end] = start_epoch + np.arange(num_beats, dtype=np.int64) * HEARTBEAT_INTERVAL
+
+        behavior = behavior_map[pid]
+        if behavior in DELTA_FUNCTIONS:
+            steps = DELTA_FUNCTIONS[behavior](speed, np.arange(num_beats), noise_seed(pid))
+            path = clamped_walk(positions[pid], steps)
+        else:
+            step_fn = STEP_FUNCTIONS[behavior]
+            path = np.empty((num_beats, 3))
+            x, y, z = positions[pid]
+            for i in range(num_beats):
+                x, y, z = step_fn(x, y, z, speed, i)
+                x, y, z = clamp_to_bounds(x, y, z)
+                path[i] = x, y, z
+
+        batch.position_x[offset:end] = path[:, 0]
+        batch.position_y[offset:end] = path[:, 1]
+        batch.position_z[offset:end] = path[:, 2]
+        offset = end
+
+    return batch
+
 def simulate_heartbeats(
     player_ids: list[str],
     session_id: str,
@@ -45,50 +162,6 @@ def simulate_heartbeats(
     Returns:
         List of heartbeat dicts.
     """
-
-    heartbeats = []
-    positions = {}
-
-    # Assign unique random starting positions avoiding collisions (min 1 unit apart)
-    attempts = 0
-    while len(positions) < len(player_ids):
-        candidate_pos = np.random.uniform(*GRID_BOUNDS, size=3)
-        collision = any(
-            np.linalg.norm(candidate_pos - np.array(pos)) < 1 for pos in positions.values()
-        )
-        if not collision:
-            pid = player_ids[len(positions)]
-            positions[pid] = tuple(candidate_pos)
-        else:
-            attempts += 1
-            if attempts > 1000:
-                raise RuntimeError("Failed to assign unique start positions without collision.")
-
-    # Generate heartbeats per player
-    for pid in player_ids:
-        duration = durations[pid]
-        speed = speed_map[pid]
-        team_id = team_ids[pid]
-        behavior = behavior_map[pid]
-        step_fn = STEP_FUNCTIONS[behavior]
-
-        x, y, z = positions[pid]
-        num_beats = duration // HEARTBEAT_INTERVAL
-
-        for i in range(num_beats):
-            ts = session_start + timedelta(seconds=i * HEARTBEAT_INTERVAL)
-
-            x, y, z = step_fn(x, y, z, speed, i)
-            x, y, z = clamp_to_bounds(x, y, z)
-
-            heartbeats.append({
-                "timestamp": ts.isoformat(),
-                "playerId": pid,
-                "sessionId": session_id,
-                "teamId": team_id,
-                "positionX": round(x, 3),
-                "positionY": round(y, 3),
-                "positionZ": round(z, 3),
-            })
-
-    return heartbeats
+    return simulate_heartbeat_batch(
+        player_ids, session_id, team_ids, session_start, speed_map, durations, behavior_map
+    ).to_records()
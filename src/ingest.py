@@ -0,0 +1,396 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+# Live event type -> table the ingest collector appends it to. Session ends
+# land where the batch generator writes them, so dbt picks them up as usual.
+INGEST_TABLES = {
+    "heartbeat": ("sprint_raw", "live_heartbeat"),
+    "session_end": ("sprint_stage", "fact_session"),
+    "transaction": ("sprint_raw", "event_transaction"),
+}
+INGEST_TIME_COLUMNS = ("timestamp", "eventDateTime")
+
+DEFAULT_INGEST_BATCH_SIZE = 100_000
+DEFAULT_INGEST_FLUSH_SECONDS = 1.0
+DEFAULT_INGEST_QUEUE_SIZE = 256  # chunks between readers and the writer
+READ_CHUNK_BYTES = 1 << 16
+
+ARROW_STREAM_PREFIX = b"\xff\xff\xff\xff"  # IPC continuation marker opening every stream message
+EVENT_TYPE_PREFIX = b'{"eventType":"'       # how live.encode_jsonl starts every line
+
+
+def parse_jsonl(lines: list[bytes]):
+    """
+    Parse JSON lines into a columnar batch.
+
+    Uses pyarrow's multithreaded reader when it is installed (timestamps are
+    typed, ids stay strings) and pandas otherwise.
+    """
+    payload = io.BytesIO(b"\n".join(lines))
+    try:
+        import pyarrow.json as pa_json
+    except ImportError:
+        # dtype=False keeps ids like "0042" as strings; timestamps are cast on insert
+        return pd.read_json(payload, lines=True, dtype=False)
+    return pa_json.read_json(payload)
+
+
+def append_events(duck_conn: duckdb.DuckDBPyConnection, schema: str, table: str, batch) -> int:
+    """
+    Append a parsed event batch (DataFrame or Arrow table) by column name.
+
+    The table is created from the batch's types if missing; the `eventType`
+    routing column is dropped. Returns the number of rows appended.
+    """
+    columns = [c for c in batch.columns if c != "eventType"] if isinstance(batch, pd.DataFrame) else [
+        c for c in batch.column_names if c != "eventType"
+    ]
+    # Arrow timestamps arrive as TIMESTAMP_S; match the batch tables' TIMESTAMP
+    select = ", ".join(f'"{c}"::TIMESTAMP AS "{c}"' if c in INGEST_TIME_COLUMNS else f'"{c}"' for c in columns)
+    duck_conn.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    duck_conn.register("_ingest_batch", batch)
+    try:
+        duck_conn.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{table} AS SELECT {select} FROM _ingest_batch LIMIT 0")
+        duck_conn.execute(f"INSERT INTO {schema}.{table} BY NAME SELECT {select} FROM _ingest_batch")
+    finally:
+        duck_conn.unregister("_ingest_batch")
+    return len(batch)
+
+
+def _split_arrow_batch(batch):
+    """Split a record batch by its `eventType` column into (type, batch) parts."""
+    import pyarrow.compute as pc
+
+    if "eventType" not in batch.schema.names:
+        raise ValueError("Arrow ingest batches need an eventType column")
+    event_types = batch.column("eventType")
+    kinds = pc.unique(event_types).to_pylist()
+    if len(kinds) == 1:
+        yield kinds[0], batch
+        return
+    for kind in kinds:
+        yield kind, batch.filter(pc.equal(event_types, kind))
+
+
+class _FileReader:
+    """`read()`-only stand-in for a StreamReader over a blocking file (stdin redirected from a file)."""
+
+    __slots__ = ("_file",)
+
+    def __init__(self, file):
+        self._file = file
+
+    async def read(self, n):
+        return await asyncio.to_thread(self._file.read, n)
+
+
+class IngestStats:
+    """
+    Running totals for an IngestCollector.
+
+    `elapsed` runs from the first event received to the final flush. Latency
+    is per event, from the moment its bytes were read by the collector to
+    the commit of the batch that holds it.
+    """
+
+    __slots__ = ("events", "dropped", "rows_by_table", "batch_sizes", "flush_seconds", "_latency", "_weights", "elapsed")
+
+    def __init__(self):
+        self.events = 0
+        self.dropped = 0
+        self.rows_by_table = {}
+        self.batch_sizes = []
+        self.flush_seconds = 0.0
+        self._latency = []
+        self._weights = []
+        self.elapsed = 0.0
+
+    def record(self, table, rows, latencies, flush_seconds):
+        """Record one committed batch; `latencies` is a list of (seconds, events)."""
+        self.events += rows
+        self.rows_by_table[table] = self.rows_by_table.get(table, 0) + rows
+        self.batch_sizes.append(rows)
+        self.flush_seconds += flush_seconds
+        for latency, n in latencies:
+            self._latency.append(latency)
+            self._weights.append(n)
+
+    @property
+    def rate(self):
+        """Committed events per wall-clock second."""
+        return self.events / self.elapsed if self.elapsed > 0 else 0.0
+
+    def latency(self, q: float) -> float:
+        """Event-weighted latency quantile in seconds (q in [0, 1])."""
+        if not self._latency:
+            return 0.0
+        order = np.argsort(self._latency)
+        cumulative = np.cumsum(np.asarray(self._weights)[order])
+        i = int(np.searchsorted(cumulative, q * cumulative[-1], side="left"))
+        return float(np.asarray(self._latency)[order][min(i, len(order) - 1)])
+
+    def __repr__(self):
+        sizes = self.batch_sizes or [0]
+        return (
+            f"IngestStats({self.events} events in {len(self.batch_sizes)} batches "
+            f"(mean {np.mean(sizes):,.0f} / max {max(sizes):,} rows), {self.rate:,.0f}/s, "
+            f"latency p50 {self.latency(0.5) * 1000:.0f} ms / p95 {self.latency(0.95) * 1000:.0f} ms / "
+            f"max {self.latency(1.0) * 1000:.0f} ms, {self.dropped} dropped)"
+        )
+
+
+class IngestCollector:
+    """
+    Micro-batching sink that appends live events to DuckDB through one writer.
+
+    Readers (`feed()`, one per stdin/socket stream) split the input by
+    `eventType` and put chunks on a bounded asyncio.Queue. When the queue is
+    full they stop reading, so a fast sender is held back by the socket or
+    pipe instead of growing memory here.
+
+    A single writer task buffers chunks per event type and appends a batch to
+    its INGEST_TABLES table once it holds `batch_size` events or its oldest
+    chunk is `flush_interval` seconds old. Parsing and the INSERT run in a
+    worker thread, one batch at a time, so the connection has exactly one
+    user and readers keep being served during a flush.
+
+    Input is JSON lines (as written by `live.py`) or an Arrow IPC stream with
+    an `eventType` column, detected from each stream's first bytes. Arrow
+    input requires pyarrow. Events of unknown types are counted as dropped.
+
+    Use as an async context manager: leaving it flushes every buffered event.
+
+    Args:
+        duck_conn: The only connection used for writing.
+        batch_size: Events per batch before a flush is forced.
+        flush_interval: Max seconds an event waits in a buffer.
+        queue_size: Chunks buffered between readers and the writer.
+        tables: Event type -> (schema, table).
+    """
+
+    __slots__ = ("duck_conn", "batch_size", "flush_interval", "queue_size", "tables", "stats", "_queue", "_writer", "_started")
+
+    def __init__(
+        self,
+        duck_conn: duckdb.DuckDBPyConnection,
+        batch_size: int = DEFAULT_INGEST_BATCH_SIZE,
+        flush_interval: float = DEFAULT_INGEST_FLUSH_SECONDS,
+        queue_size: int = DEFAULT_INGEST_QUEUE_SIZE,
+        tables: dict = None,
+    ):
+        self.duck_conn = duck_conn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.tables = tables or INGEST_TABLES
+        self.stats = IngestStats()
+        self._queue = None
+        self._writer = None
+        self._started = None
+
+    async def __aenter__(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._writer = asyncio.create_task(self._write_batches())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._writer.done():
+            self._writer.result()
+        else:
+            await self._queue.put(None)
+            await self._writer
+        if self._started is not None:
+            self.stats.elapsed = time.monotonic() - self._started
+
+    async def _put(self, kind, received, n_events, payload):
+        if self._writer.done():
+            # Surface writer failures instead of blocking on a queue nobody drains
+            self._writer.result()
+        if self._started is None:
+            self._started = received
+        await self._queue.put((kind, received, n_events, payload))
+
+    async def feed(self, reader: asyncio.StreamReader):
+        """Consume one input stream (anything with an async `read(n)`) until EOF."""
+        head = b""
+        while len(head) < len(ARROW_STREAM_PREFIX):
+            chunk = await reader.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            head += chunk
+        if head.startswith(ARROW_STREAM_PREFIX):
+            await self._feed_arrow(reader, head)
+        else:
+            await self._feed_jsonl(reader, head)
+
+    async def _feed_jsonl(self, reader, head):
+        tail, chunk = b"", head
+        while chunk:
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            await self._route_lines(lines, time.monotonic())
+            chunk = await reader.read(READ_CHUNK_BYTES)
+        if tail.strip():
+            await self._route_lines([tail], time.monotonic())
+
+    async def _route_lines(self, lines, received):
+        by_kind = {}
+        prefix = len(EVENT_TYPE_PREFIX)
+        for line in lines:
+            if line.startswith(EVENT_TYPE_PREFIX):
+                kind = line[prefix:line.index(b'"', prefix)].decode()
+            elif line.strip():
+                kind = json.loads(line).get("eventType")
+            else:
+                continue
+            by_kind.setdefault(kind, []).append(line)
+        for kind, kind_lines in by_kind.items():
+            await self._put(kind, received, len(kind_lines), kind_lines)
+
+    async def _feed_arrow(self, reader, head):
+        """
+        Decode an Arrow IPC stream with pyarrow's blocking reader in a thread,
+        fed through an OS pipe; a full queue blocks the thread, which fills the
+        pipe and stops this coroutine from reading further.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Arrow IPC ingest requires pyarrow (pip install pyarrow)") from e
+
+        loop = asyncio.get_running_loop()
+        read_fd, write_fd = os.pipe()
+
+        def decode():
+            with os.fdopen(read_fd, "rb") as pipe, pa.ipc.open_stream(pipe) as stream:
+                for batch in stream:
+                    received = time.monotonic()
+                    for kind, part in _split_arrow_batch(batch):
+                        asyncio.run_coroutine_threadsafe(
+                            self._put(kind, received, part.num_rows, part), loop
+                        ).result()
+
+        decoder = asyncio.ensure_future(asyncio.to_thread(decode))
+        try:
+            with os.fdopen(write_fd, "wb", buffering=0) as pipe:
+                chunk = head
+                while chunk and not decoder.done():
+                    await asyncio.to_thread(pipe.write, chunk)
+                    chunk = await reader.read(READ_CHUNK_BYTES)
+        except BrokenPipeError:
+            pass  # the decoder stopped early; its error is raised below
+        await decoder
+
+    async def _write_batches(self):
+        buffers, counts = {}, {}
+        while True:
+            oldest = min((chunks[0][0] for chunks in buffers.values() if chunks), default=None)
+            timeout = None if oldest is None else max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = ()
+            if item is None:
+                for kind in list(buffers):
+                    await self._flush(kind, buffers.pop(kind))
+                return
+            if item:
+                kind, received, n_events, payload = item
+                buffers.setdefault(kind, []).append((received, n_events, payload))
+                counts[kind] = counts.get(kind, 0) + n_events
+
+            now = time.monotonic()
+            for kind in [k for k, chunks in buffers.items() if chunks]:
+                if counts[kind] >= self.batch_size or now - buffers[kind][0][0] >= self.flush_interval:
+                    counts[kind] = 0
+                    await self._flush(kind, buffers.pop(kind))
+
+    async def _flush(self, kind, chunks):
+        n_events = sum(n for _, n, _ in chunks)
+        if kind not in self.tables:
+            self.stats.dropped += n_events
+            return
+        schema, table = self.tables[kind]
+
+        def write():
+            lines = [line for _, _, payload in chunks if isinstance(payload, list) for line in payload]
+            batches = [payload for _, _, payload in chunks if not isinstance(payload, list)]
+            if lines:
+                append_events(self.duck_conn, schema, table, parse_jsonl(lines))
+            if batches:
+                import pyarrow as pa
+
+                append_events(self.duck_conn, schema, table, pa.Table.from_batches(batches))
+
+        started = time.monotonic()
+        await asyncio.to_thread(write)
+        committed = time.monotonic()
+        self.stats.record(
+            f"{schema}.{table}", n_events,
+            [(committed - received, n) for received, n, _ in chunks], committed - started,
+        )
+
+
+async def ingest_events(
+    duck_conn: duckdb.DuckDBPyConnection,
+    listen: str = "-",
+    max_connections: int = None,
+    batch_size: int = DEFAULT_INGEST_BATCH_SIZE,
+    flush_interval: float = DEFAULT_INGEST_FLUSH_SECONDS,
+    queue_size: int = DEFAULT_INGEST_QUEUE_SIZE,
+) -> IngestStats:
+    """
+    Run an IngestCollector on stdin or a local socket.
+
+    Args:
+        listen: "-" for stdin (returns at EOF), "unix:<path>" or
+            "tcp:<host>:<port>" to accept connections.
+        max_connections: For sockets, return once this many connections have
+            closed (serve until cancelled when None).
+        batch_size / flush_interval / queue_size: See IngestCollector.
+    """
+    loop = asyncio.get_running_loop()
+    async with IngestCollector(duck_conn, batch_size, flush_interval, queue_size) as collector:
+        if listen == "-":
+            reader = asyncio.StreamReader(limit=READ_CHUNK_BYTES)
+            try:
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+            except ValueError:
+                # stdin redirected from a regular file
+                reader = _FileReader(sys.stdin.buffer)
+            await collector.feed(reader)
+        else:
+            closed = asyncio.Queue()
+
+            async def handle(reader, writer):
+                try:
+                    await collector.feed(reader)
+                finally:
+                    writer.close()
+                    await closed.put(None)
+
+            if listen.startswith("unix:"):
+                server = await asyncio.start_unix_server(handle, listen[len("unix:"):])
+            elif listen.startswith("tcp:"):
+                host, port = listen[len("tcp:"):].rsplit(":", 1)
+                server = await asyncio.start_server(handle, host, int(port))
+            else:
+                raise ValueError(f"Unknown ingest source '{listen}', expected '-', 'unix:<path>' or 'tcp:<host>:<port>'")
+
+            print(f"📥 Ingesting events on {listen}...")
+            async with server:
+                served = 0
+                while max_connections is None or served < max_connections:
+                    await closed.get()
+                    served += 1
+
+    print(f"📥 {collector.stats}")
+    return collector.stats
@@ -0,0 +1,131 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from loader import write_dataframe_to_table
+
+# Where each entity's surrogate -> external id mapping lives. Kept one table
+# per entity so clear_old_data can drop them alongside the data they describe.
+KEY_MAP_TABLES = {
+    "player": ("sprint_dim", "key_map_player"),
+    "session": ("sprint_raw", "key_map_session"),
+    "team": ("sprint_raw", "key_map_team"),
+}
+
+
+class KeyAllocator:
+    """
+    Hands out player, session, team and transaction identifiers for a generation run.
+
+    In the default uuid mode this reproduces the historical ids (uuid4 strings
+    for sessions/teams, external player ids as-is, formatted transaction ids).
+
+    In surrogate mode every entity gets a dense BIGINT sequence instead, and
+    the external uuid (or original player id) is recorded in a per-entity
+    mapping table so it can be recovered for export. Transactions get BIGINT
+    keys without a mapping; their external id carried no extra information.
+
+    Args:
+        surrogate: Emit BIGINT keys instead of strings.
+        duck_conn: If given, sequences resume after the keys already stored in DuckDB.
+        lake: Optional `lake.ParquetLake`; transaction keys also resume after
+            the ids stored in its `event_transaction` partitions.
+    """
+
+    def __init__(self, surrogate: bool = False, duck_conn=None, lake=None):
+        self.surrogate = surrogate
+        self._next = {entity: 1 for entity in (*KEY_MAP_TABLES, "transaction")}
+        self._pending = {entity: [] for entity in KEY_MAP_TABLES}
+        if surrogate and duck_conn is not None:
+            self._resume(duck_conn, lake)
+
+    def _resume(self, duck_conn, lake=None):
+        tables = dict(KEY_MAP_TABLES, transaction=("sprint_raw", "event_transaction"))
+        key_cols = {"transaction": "transactionId"}
+        for entity, (schema, table) in tables.items():
+            col = key_cols.get(entity, "surrogateKey")
+            try:
+                current = duck_conn.execute(f"SELECT max({col}) FROM {schema}.{table}").fetchone()[0]
+            except Exception:
+                continue
+            self._resume_after(entity, current)
+        if lake is not None:
+            try:
+                current = lake.scan(duck_conn, "event_transaction").aggregate("max(transactionId)").fetchone()[0]
+            except Exception:
+                return  # no partitions written yet
+            self._resume_after("transaction", current)
+
+    def _resume_after(self, entity, current):
+        if isinstance(current, (int, np.integer)):
+            self._next[entity] = max(self._next[entity], int(current) + 1)
+
+    def _allocate(self, entity, n):
+        start = self._next[entity]
+        self._next[entity] = start + n
+        return np.arange(start, start + n, dtype=np.int64)
+
+    def new_ids(self, entity: str, n: int, session_id=None) -> list:
+        """
+        Allocate `n` new session or team ids.
+
+        Teams pass the `session_id` they play in; `key_map_team` records it
+        so invalidating a session also drops its team mappings.
+
+        Returns:
+            List of ints (surrogate mode) or uuid4 strings.
+        """
+        external = [str(uuid.uuid4()) for _ in range(n)]
+        if not self.surrogate:
+            return external
+        keys = self._allocate(entity, n)
+        self._pending[entity].append((keys, external, session_id))
+        return keys.tolist()
+
+    def player_keys(self, player_ids) -> list:
+        """
+        Allocate fresh keys for `player_ids` and queue their mappings.
+
+        Every call registers all the ids it is given; existing
+        `key_map_player` rows are not looked up, so pass only players that
+        are not stored yet (main.write_players runs after the players level
+        is cleared).
+        """
+        player_ids = list(player_ids)
+        if not self.surrogate:
+            return player_ids
+        keys = self._allocate("player", len(player_ids))
+        self._pending["player"].append((keys, [str(pid) for pid in player_ids], None))
+        return keys.tolist()
+
+    def transaction_ids(self, n: int):
+        """BIGINT transaction keys (surrogate mode only)."""
+        return self._allocate("transaction", n)
+
+    def mapping_frame(self, entity: str) -> pd.DataFrame:
+        pending = self._pending[entity]
+        frame = pd.DataFrame({
+            "surrogateKey": np.concatenate([keys for keys, _, _ in pending]) if pending else np.array([], dtype=np.int64),
+            "externalId": [ext for _, externals, _ in pending for ext in externals],
+        })
+        if entity == "team":
+            frame["sessionKey"] = np.concatenate(
+                [np.full(len(keys), session_id, dtype=np.int64) for keys, _, session_id in pending]
+            ) if pending else np.array([], dtype=np.int64)
+        return frame
+
+    def save(self, duck_conn):
+        """
+        Append the mappings allocated since the last save to their key-map tables.
+        """
+        if not self.surrogate:
+            return
+        for entity, (schema, table) in KEY_MAP_TABLES.items():
+            if not self._pending[entity]:
+                continue
+            write_dataframe_to_table(
+                duck_conn, schema, table, self.mapping_frame(entity),
+                primary_key="surrogateKey", replace=False,
+            )
+            self._pending[entity] = []
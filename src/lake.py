@@ -0,0 +1,106 @@
+import shutil
+import uuid
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from utils import LAKE_PATH
+
+# Tables that can live in the lake instead of DuckDB
+LAKE_TABLES = (
+    "event_signons", "event_session", "event_transaction", "event_subscription",
+    "fact_session", "fact_player_session_movement", "event_heartbeat_lod",
+)
+
+
+class ParquetLake:
+    """
+    Hive-partitioned Parquet storage for raw and staged event tables.
+
+    Each table is a directory of `date=YYYY-MM-DD` partitions holding one or
+    more Parquet files. Every write goes to a new uniquely named file, so
+    several processes can write partitions at the same time without sharing
+    a DuckDB connection or taking database locks. The partition column is
+    encoded in the path only; readers get it back as a DATE column via
+    `hive_partitioning`.
+
+    dbt reads the same layout through the `sprint_lake` sources when run with
+    `--vars '{lake: true}'`.
+
+    Args:
+        path: Lake root directory.
+    """
+
+    def __init__(self, path: Path = LAKE_PATH):
+        self.path = Path(path)
+
+    def partition_dir(self, table: str, date) -> Path:
+        return self.path / table / f"date={pd.Timestamp(date).date()}"
+
+    def glob(self, table: str) -> str:
+        return str(self.path / table / "*" / "*.parquet")
+
+    def write(self, table: str, df: pd.DataFrame, date) -> Path:
+        """
+        Write one batch of a day's rows as a new file in its partition.
+
+        Returns the written file, or None if `df` is empty.
+        """
+        if table not in LAKE_TABLES:
+            raise ValueError(f"Unknown lake table '{table}', expected one of {LAKE_TABLES}")
+        if df.empty:
+            return None
+
+        partition = self.partition_dir(table, date)
+        partition.mkdir(parents=True, exist_ok=True)
+        file_path = partition / f"part-{uuid.uuid4().hex}.parquet"
+        # The partition value lives in the directory name only
+        duckdb.from_df(df.drop(columns=["date"], errors="ignore")).write_parquet(str(file_path))
+        return file_path
+
+    def dates(self, table: str) -> list:
+        table_dir = self.path / table
+        if not table_dir.exists():
+            return []
+        return sorted(
+            pd.Timestamp(p.name.split("=", 1)[1]).date()
+            for p in table_dir.iterdir()
+            if p.is_dir() and p.name.startswith("date=")
+        )
+
+    def clear(self, tables=LAKE_TABLES, start_date=None, end_date=None):
+        """
+        Remove whole tables, or only the partitions in [start_date, end_date].
+        """
+        if start_date is not None:
+            start_date = pd.Timestamp(start_date).date()
+            end_date = pd.Timestamp(end_date if end_date is not None else start_date).date()
+
+        for table in tables:
+            if start_date is None:
+                shutil.rmtree(self.path / table, ignore_errors=True)
+                continue
+            for date in self.dates(table):
+                if start_date <= date <= end_date:
+                    shutil.rmtree(self.partition_dir(table, date), ignore_errors=True)
+
+    def scan(self, duck_conn, table: str, start_date=None, end_date=None):
+        """
+        Lazy DuckDB relation over a lake table, pruned to a date range.
+
+        The date filter is on the partition column, so files outside the
+        range are never opened.
+        """
+        clauses, params = [], []
+        if start_date is not None:
+            clauses.append("date >= ?")
+            params.append(pd.Timestamp(start_date).date())
+        if end_date is not None:
+            clauses.append("date <= ?")
+            params.append(pd.Timestamp(end_date).date())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return duck_conn.sql(
+            f"SELECT * FROM read_parquet('{self.glob(table)}', hive_partitioning = true){where}",
+            params=params or None,
+        )
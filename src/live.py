@@ -0,0 +1,508 @@
+import asyncio
+import math
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from keys import KeyAllocator
+from records import summaries_to_frame
+from session_generator import simulate_day_sessions
+from transaction_generator import SubscriptionBook, generate_transactions_for_day
+from utils import players_by_day
+
+# Event types (tie order within a second) and the column holding their event time
+EVENT_TIME_COLUMNS = {
+    "heartbeat": "timestamp",
+    "session_end": "eventDateTime",
+    "transaction": "eventDateTime",
+}
+
+DEFAULT_INTERVAL_SECONDS = 0.05  # wall-clock pacing tick
+DEFAULT_MAX_BATCH = 50_000       # rows encoded per queued chunk
+DEFAULT_QUEUE_SIZE = 64          # chunks buffered between pacer and sink
+
+
+def day_events(
+    date,
+    players_today,
+    country_map,
+    keys: KeyAllocator = None,
+    products_df: pd.DataFrame = None,
+    subscriptions: SubscriptionBook = None,
+    executor=None,
+    **session_options,
+) -> dict[str, pd.DataFrame]:
+    """
+    Simulate one day and return its events by type, without writing anything.
+
+    Sessions come from `session_generator.simulate_day_sessions`, so a live
+    run emits the same sessions as a batch run with the same seeds.
+    Transactions (and, with a SubscriptionBook, the day's renewals) are added
+    when `products_df` is given.
+
+    Returns:
+        dict of event type -> DataFrame with an int64 epoch-seconds `ts`
+        column, sorted by `ts`.
+    """
+    keys = keys or KeyAllocator()
+    heartbeats, summaries = [], []
+    for _, sim, session_summaries in simulate_day_sessions(
+        date, players_today, country_map, keys=keys, executor=executor, **session_options
+    ):
+        heartbeats.append(sim.batch.to_frame())
+        summaries.extend(session_summaries)
+
+    frames = {
+        "heartbeat": pd.concat(heartbeats, ignore_index=True) if heartbeats else pd.DataFrame(),
+        "session_end": summaries_to_frame(summaries),
+    }
+    if products_df is not None:
+        df_tx = generate_transactions_for_day(players_today, date, products_df, keys, country_map)
+        if subscriptions is not None:
+            renewals, _ = subscriptions.advance(date, keys)
+            subscriptions.subscribe(df_tx)
+            parts = [f for f in (renewals, df_tx) if not f.empty]
+            df_tx = pd.concat(parts, ignore_index=True) if parts else df_tx
+        frames["transaction"] = df_tx
+
+    return {kind: _with_event_time(df, EVENT_TIME_COLUMNS[kind]) for kind, df in frames.items()}
+
+
+def _with_event_time(df, time_column):
+    """Add the int64 `ts` column and sort by it (stable, so ties keep generation order)."""
+    if df.empty:
+        return pd.DataFrame({"ts": np.empty(0, dtype=np.int64)})
+    ts = df[time_column].to_numpy().astype("datetime64[s]").astype(np.int64)
+    order = np.argsort(ts, kind="stable")
+    df = df.iloc[order].reset_index(drop=True)
+    df["ts"] = ts[order]
+    return df
+
+
+def _split_at(frames, cutoff):
+    """Split each frame into rows before `cutoff` and the rest."""
+    head, tail = {}, {}
+    for kind, df in frames.items():
+        i = int(np.searchsorted(df["ts"].to_numpy(), cutoff, side="left"))
+        head[kind], tail[kind] = df.iloc[:i], df.iloc[i:]
+    return head, tail
+
+
+def _merge_order(frames):
+    """
+    One event-time order over all event types.
+
+    Returns:
+        (kinds, sorted ts, int8 kind code per position). The sort is stable
+        over frames concatenated in `kinds` order, so each kind's rows keep
+        their own order and same-second ties go heartbeat, session end,
+        transaction.
+    """
+    kinds = list(frames)
+    times = np.concatenate([frames[k]["ts"].to_numpy() for k in kinds]) if kinds else np.empty(0, dtype=np.int64)
+    codes = np.repeat(np.arange(len(kinds), dtype=np.int8), [len(frames[k]) for k in kinds])
+    order = np.argsort(times, kind="stable")
+    return kinds, times[order], codes[order]
+
+
+def _encode_merged(frames, kinds, codes, offsets):
+    """
+    Encode the next `len(codes)` events of a merged order as JSON lines.
+
+    Each kind's rows in the chunk are a contiguous slice of its frame (from
+    `offsets`, which is advanced), so every kind is encoded in one call and
+    the lines are then interleaved by `codes`.
+    """
+    counts = np.bincount(codes, minlength=len(kinds))
+    lines, cursor = [], [0] * len(kinds)
+    for k, kind in enumerate(kinds):
+        start = offsets[kind]
+        offsets[kind] += int(counts[k])
+        if counts[k] == len(codes):
+            return encode_jsonl(frames[kind].iloc[start:start + len(codes)], kind)
+        lines.append(encode_jsonl(frames[kind].iloc[start:start + counts[k]], kind).split(b"\n") if counts[k] else [])
+
+    # Heartbeats come in long runs between sparse summaries/transactions: copy run by run
+    out = []
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    for run_start, run_end in zip([0, *bounds.tolist()], [*bounds.tolist(), len(codes)]):
+        k = codes[run_start]
+        out.extend(lines[k][cursor[k]:cursor[k] + run_end - run_start])
+        cursor[k] += run_end - run_start
+    out.append(b"")
+    return b"\n".join(out)
+
+
+def encode_jsonl(df: pd.DataFrame, event_type: str) -> bytes:
+    """
+    Encode a slice of events as JSON lines in one vectorized call.
+
+    Every line carries `eventType`; timestamps are naive ISO-8601 seconds,
+    as in the batch session files.
+    """
+    out = df.drop(columns="ts")
+    out.insert(0, "eventType", event_type)
+    return out.to_json(orient="records", lines=True, date_format="iso", date_unit="s", double_precision=3).encode()
+
+
+class _FileWriter:
+    """StreamWriter-shaped adapter for regular files, which asyncio pipes do not support."""
+
+    __slots__ = ("_file",)
+
+    def __init__(self, file):
+        self._file = file
+
+    def write(self, data):
+        self._file.write(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self._file.close()
+
+    async def wait_closed(self):
+        pass
+
+
+class _PipeProtocol(asyncio.streams.FlowControlMixin):
+    """Write-pipe protocol with flow control (for `drain()`) and a close waiter."""
+
+    def __init__(self):
+        super().__init__()
+        self._closed = asyncio.get_running_loop().create_future()
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        if not self._closed.done():
+            self._closed.set_result(None)
+
+    def _get_close_waiter(self, stream):
+        return self._closed
+
+
+async def _pipe_writer(file):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.connect_write_pipe(_PipeProtocol, file)
+    return asyncio.StreamWriter(transport, protocol, None, loop)
+
+
+async def open_sink(target: str):
+    """
+    Open an output stream for live events.
+
+    Args:
+        target: "-" for stdout, "unix:<path>" for a unix socket,
+            "tcp:<host>:<port>" for a TCP socket, "fifo:<path>" for a named
+            pipe (blocks until a reader opens it), or a plain file path.
+
+    Returns:
+        An object with StreamWriter's write/drain/close/wait_closed; socket and
+        pipe sinks apply backpressure through `drain()`.
+    """
+    if target == "-":
+        stdout = os.fdopen(os.dup(sys.__stdout__.fileno()), "wb", buffering=0)
+        try:
+            return await _pipe_writer(stdout)
+        except ValueError:
+            # stdout redirected to a regular file
+            return _FileWriter(stdout)
+    if target.startswith("unix:"):
+        _, writer = await asyncio.open_unix_connection(target[len("unix:"):])
+        return writer
+    if target.startswith("tcp:"):
+        host, port = target[len("tcp:"):].rsplit(":", 1)
+        _, writer = await asyncio.open_connection(host, int(port))
+        return writer
+    if target.startswith("fifo:"):
+        pipe = await asyncio.to_thread(open, target[len("fifo:"):], "wb", buffering=0)
+        return await _pipe_writer(pipe)
+    return _FileWriter(open(Path(target), "wb"))
+
+
+class EmitterStats:
+    """
+    Running totals for a live emitter.
+
+    `elapsed` runs from the first emitted tick, so the rate excludes the
+    first day's simulation. Lag is how far behind its scheduled wall-clock
+    time a chunk reached the sink (after `drain()`), so it includes time
+    spent waiting on backpressure.
+    """
+
+    __slots__ = ("events", "bytes", "chunks", "elapsed", "max_lag", "_lag_sum")
+
+    def __init__(self):
+        self.events = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.elapsed = 0.0
+        self.max_lag = 0.0
+        self._lag_sum = 0.0
+
+    def record(self, events, nbytes, lag):
+        self.events += events
+        self.bytes += nbytes
+        self.chunks += 1
+        self.max_lag = max(self.max_lag, lag)
+        self._lag_sum += lag
+
+    @property
+    def rate(self):
+        """Events per wall-clock second."""
+        return self.events / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mean_lag(self):
+        return self._lag_sum / self.chunks if self.chunks else 0.0
+
+    def __repr__(self):
+        return (
+            f"EmitterStats({self.events} events in {self.elapsed:.2f}s = {self.rate:,.0f}/s, "
+            f"{self.bytes / 1e6:.1f} MB, lag mean {self.mean_lag * 1000:.1f} ms / max {self.max_lag * 1000:.1f} ms)"
+        )
+
+
+async def _aiter(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class LiveEmitter:
+    """
+    Replays simulated events against the wall clock over an output stream.
+
+    Events are paced by their simulated time: the first event maps to the
+    start of the run and simulated seconds elapse `speed` times faster than
+    real ones (`speed=None` emits as fast as the sink accepts). Each tick of
+    `interval` wall seconds sends every event due in it as JSON lines, in
+    event-time order across heartbeats, session ends and transactions.
+
+    A pacer task encodes ticks into chunks of at most `max_batch` rows and
+    puts them on a bounded queue; a writer task sends them and awaits
+    `drain()`. A slow sink fills the queue, which blocks the pacer, so memory
+    stays bounded and the delay shows up as lag instead of dropped events.
+
+    Args:
+        writer: Sink from `open_sink` (or any asyncio.StreamWriter).
+        speed: Simulated seconds per wall second, or None for unthrottled.
+        interval: Wall-clock pacing tick in seconds.
+        max_batch: Rows per encoded chunk.
+        queue_size: Chunks buffered between pacer and writer.
+    """
+
+    __slots__ = ("writer", "speed", "interval", "max_batch", "queue_size", "stats", "_queue", "_t0", "_wall0")
+
+    def __init__(
+        self,
+        writer,
+        speed: float = 1.0,
+        interval: float = DEFAULT_INTERVAL_SECONDS,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError(f"speed must be positive or None, got {speed}")
+        self.writer = writer
+        self.speed = speed
+        self.interval = interval
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+        self.stats = EmitterStats()
+        self._queue = None
+        self._t0 = None
+        self._wall0 = None
+
+    async def _write_chunks(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            target, n_events, payload = item
+            self.writer.write(payload)
+            await self.writer.drain()
+            self.stats.record(n_events, len(payload), max(0.0, loop.time() - target))
+
+    def _due_at(self, ts):
+        """Wall-clock (loop) time at which simulated second `ts` is due."""
+        return self._wall0 + (ts - self._t0) / self.speed
+
+    async def _pace(self, frames, cutoff=math.inf):
+        """
+        Queue every event before `cutoff`, tick by tick, in event-time order.
+
+        Returns:
+            The frames' rows at or after `cutoff`, for the next call.
+        """
+        frames, rest = _split_at(frames, cutoff)
+        loop = asyncio.get_running_loop()
+        kinds, times, codes = _merge_order(frames)
+        offsets = dict.fromkeys(kinds, 0)
+
+        i = 0
+        while i < len(times):
+            tick_start = int(times[i])
+            if self._t0 is None:
+                self._t0, self._wall0 = tick_start, loop.time()
+
+            # Skip idle stretches: the tick opens at the next event, not on a fixed grid
+            if self.speed is None:
+                end, target = len(times), loop.time()
+            else:
+                tick_end = tick_start + max(1, math.ceil(self.interval * self.speed))
+                end = int(np.searchsorted(times, tick_end, side="left"))
+                target = self._due_at(min(tick_end, cutoff))
+                delay = target - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            for start in range(i, end, self.max_batch):
+                chunk = codes[start:min(start + self.max_batch, end)]
+                await self._queue.put((target, len(chunk), _encode_merged(frames, kinds, chunk, offsets)))
+            i = end
+        return rest
+
+    async def _pace_days(self, day_frames):
+        carry = None
+        async for frames in _aiter(day_frames):
+            if carry is not None:
+                cutoff = min((int(df["ts"].iloc[0]) for df in frames.values() if len(df)), default=math.inf)
+                carry = await self._pace(carry, cutoff)
+                frames = {
+                    kind: _with_event_time(
+                        pd.concat([carry.get(kind, pd.DataFrame()), df], ignore_index=True), "ts"
+                    ) if len(carry.get(kind, ())) else df
+                    for kind, df in frames.items()
+                }
+            carry = frames
+        if carry is not None:
+            await self._pace(carry)
+        await self._queue.put(None)
+
+    async def run(self, day_frames):
+        """
+        Emit days of events (an iterable or async iterable of `day_events`
+        dicts) in time order.
+
+        Sessions that run past midnight overlap the next day, so each day is
+        only emitted up to the next day's first event; the remainder is merged
+        into that day.
+
+        Returns:
+            EmitterStats for the run.
+        """
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        tasks = {asyncio.create_task(self._pace_days(day_frames)), asyncio.create_task(self._write_chunks())}
+        try:
+            # A failed sink must also stop the pacer, which may be blocked on a full queue
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self._wall0 is not None:
+                self.stats.elapsed = asyncio.get_running_loop().time() - self._wall0
+        return self.stats
+
+
+async def _prefetched(days, country_map, keys, products_df, session_options):
+    """
+    Yield each day's events, simulating the next day in a worker thread while
+    the current one is emitted. Only one day is simulated at a time, so ids
+    and random draws come out in the same order as a serial run.
+    """
+    subscriptions = SubscriptionBook() if products_df is not None else None
+
+    def start(day):
+        date, players_today = day
+        return asyncio.ensure_future(asyncio.to_thread(
+            day_events, date, players_today, country_map, keys=keys, products_df=products_df,
+            subscriptions=subscriptions, **session_options,
+        ))
+
+    remaining = iter(players_by_day(days))
+    day = next(remaining, None)
+    task = start(day) if day is not None else None
+    while task is not None:
+        frames = await task
+        day = next(remaining, None)
+        task = start(day) if day is not None else None
+        yield frames
+
+
+async def emit_live(
+    days,
+    country_map,
+    target: str = "-",
+    speed: float = 1.0,
+    products_df: pd.DataFrame = None,
+    keys: KeyAllocator = None,
+    interval: float = DEFAULT_INTERVAL_SECONDS,
+    max_batch: int = DEFAULT_MAX_BATCH,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    **session_options,
+) -> EmitterStats:
+    """
+    Simulate days of sessions and transactions and emit them live to `target`.
+
+    Simulation of the next day runs in a worker thread while the current day
+    is being emitted. Nothing is written to DuckDB.
+
+    Args:
+        days: Iterable of (date, playerIds), e.g. `loader.iter_signons_by_day`.
+        country_map: playerId -> country.
+        target: Sink spec, see `open_sink`.
+        speed: Simulated seconds per wall second (None = as fast as possible).
+        products_df: dim_products catalog; transactions are skipped without it.
+        keys: KeyAllocator for session/team/transaction ids.
+        interval / max_batch / queue_size: See `LiveEmitter`.
+        **session_options: Passed to `simulate_day_sessions`
+            (min/max_sessions_per_player, lobby_shapes, pool_by).
+    """
+    keys = keys or KeyAllocator()
+    return await emit_frames(
+        _prefetched(days, country_map, keys, products_df, session_options), target,
+        speed=speed, interval=interval, max_batch=max_batch, queue_size=queue_size,
+    )
+
+
+async def emit_frames(
+    day_frames,
+    target: str = "-",
+    speed: float = 1.0,
+    interval: float = DEFAULT_INTERVAL_SECONDS,
+    max_batch: int = DEFAULT_MAX_BATCH,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> EmitterStats:
+    """
+    Open `target`, run a LiveEmitter over `day_frames` and close the sink.
+
+    A reader that disconnects ends the run early instead of failing it; the
+    stats of what was delivered are printed to stderr and returned.
+    """
+    writer = await open_sink(target)
+    emitter = LiveEmitter(writer, speed=speed, interval=interval, max_batch=max_batch, queue_size=queue_size)
+    try:
+        stats = await emitter.run(day_frames)
+    except (BrokenPipeError, ConnectionResetError):
+        # The reader went away; report what was delivered
+        print("⚠️ Live sink closed by the reader, stopping.", file=sys.stderr)
+        stats = emitter.stats
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    print(f"📡 {stats}", file=sys.stderr)
+    return stats
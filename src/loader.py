@@ -44,16 +44,20 @@ def write_dataframe_to_table(
 ):
     """
     Writes a DataFrame to DuckDB table, optionally replacing existing data.
-    Creates the table if missing using df schema inferred as VARCHAR/INTEGER/DOUBLE.
+    Creates the table if missing using df schema inferred as VARCHAR/SMALLINT/INTEGER/BIGINT/DOUBLE/BOOLEAN/TIMESTAMP.
     """
 
     def infer_duckdb_type(dtype):
         if pd.api.types.is_integer_dtype(dtype):
-            return "INTEGER"
+            if dtype.itemsize > 4:
+                return "BIGINT"
+            return "INTEGER" if dtype.itemsize > 2 else "SMALLINT"
         elif pd.api.types.is_float_dtype(dtype):
             return "DOUBLE"
         elif pd.api.types.is_bool_dtype(dtype):
             return "BOOLEAN"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            return "TIMESTAMP"
         else:
             return "VARCHAR"
 
@@ -87,6 +91,10 @@ def write_json_record_to_duckdb(
     with columns: record_id_col (PK), rawResponse (JSON string), created_at_col (timestamp).
 
     If write_to_db=False, only saves JSON file to disk.
+
+    Returns:
+        The row as a dict ({record_id_col, rawResponse, created_at_col}), so
+        callers can route it to another sink.
     """
     directory.mkdir(parents=True, exist_ok=True)
     json_str = json.dumps(json_obj, indent=2)
@@ -100,7 +108,7 @@ def write_json_record_to_duckdb(
 
     if write_to_db:
         columns_def = {
-            record_id_col: "VARCHAR PRIMARY KEY",
+            record_id_col: "BIGINT PRIMARY KEY" if isinstance(record_id, (int, np.integer)) else "VARCHAR PRIMARY KEY",
             "rawResponse": "VARCHAR",
             created_at_col: "TIMESTAMP"
         }
@@ -113,6 +121,8 @@ def write_json_record_to_duckdb(
         except duckdb.ConversionException as e:
             print(f"Error inserting JSON record {record_id} into {schema}.{table}: {e}")
 
+    return {record_id_col: record_id, "rawResponse": json_str, created_at_col: created_at}
+
 def load_table_to_df(duck_conn: duckdb.DuckDBPyConnection, schema: str, table: str):
     try:
         df = duck_conn.execute(f"SELECT * FROM {schema}.{table}").fetchdf()
@@ -122,35 +132,331 @@ def load_table_to_df(duck_conn: duckdb.DuckDBPyConnection, schema: str, table: s
     except Exception:
         return None
 
-def clear_old_data(duck_conn, level="all"):
+_FILTER_OPS = {"=", "!=", "<", "<=", ">", ">="}
+
+def _where_clause(filters):
+    """
+    Build a parameterised WHERE clause from a filters dict.
+
+    Values can be a scalar (equality), a list/set/array (IN) or an
+    `(op, value)` tuple with op one of =, !=, <, <=, >, >=.
+    """
+    clauses, params = [], []
+    for col, value in (filters or {}).items():
+        if isinstance(value, tuple):
+            op, value = value
+            if op not in _FILTER_OPS:
+                raise ValueError(f"Unsupported filter operator '{op}' for column {col}")
+            clauses.append(f"{col} {op} ?")
+            params.append(value)
+        elif isinstance(value, (list, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+            values = list(value)
+            if not values:
+                clauses.append("false")
+                continue
+            clauses.append(f"{col} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        else:
+            clauses.append(f"{col} = ?")
+            params.append(value)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+def query_table(
+    duck_conn: duckdb.DuckDBPyConnection,
+    schema: str,
+    table: str,
+    columns=None,
+    filters: dict = None,
+    order_by=None,
+    chunk_size: int = None,
+):
+    """
+    Lazy, filtered read of a DuckDB table.
+
+    Projection and predicates are part of the query, so DuckDB only scans the
+    requested columns and can skip row groups using its min/max indexes.
+    Nothing is read until the caller fetches from the result.
+
+    Args:
+        columns: Columns to select (default all).
+        filters: Column -> value predicates (see `_where_clause`), ANDed together.
+        order_by: Column name or list of names to sort by.
+        chunk_size: If set, return a pyarrow RecordBatchReader yielding batches
+            of at most this many rows instead of a relation.
+
+    Returns:
+        DuckDBPyRelation (call `.df()`, `.fetchnumpy()`, ... on it), or a
+        RecordBatchReader when `chunk_size` is given.
+    """
+    select = ", ".join(columns) if columns else "*"
+    where, params = _where_clause(filters)
+    order = ""
+    if order_by:
+        order = " ORDER BY " + ", ".join([order_by] if isinstance(order_by, str) else order_by)
+
+    relation = duck_conn.sql(f"SELECT {select} FROM {schema}.{table}{where}{order}", params=params or None)
+    if chunk_size is None:
+        return relation
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("query_table(chunk_size=...) requires pyarrow (pip install pyarrow)") from e
+    # to_arrow_reader replaces fetch_record_batch in newer DuckDB releases
+    reader = getattr(relation, "to_arrow_reader", None) or relation.fetch_record_batch
+    return reader(chunk_size)
+
+def iter_signons_by_day(
+    duck_conn: duckdb.DuckDBPyConnection,
+    start_date=None,
+    end_date=None,
+    chunk_vectors: int = 64,
+    lake=None,
+):
+    """
+    Stream `event_signons` one day at a time (from `lake` if given, pruning
+    partitions outside the date range).
+
+    Rows are read in date order in chunks of `chunk_vectors` DuckDB vectors
+    (2048 rows each); a day split across chunks is stitched back together,
+    so at most one chunk plus one day is held in memory.
+
+    Yields:
+        (date, ndarray of playerIds) for each day in [start_date, end_date].
+    """
+    # `date` may be stored as VARCHAR (ISO strings) or DATE; compare as DATE
+    clauses, params = [], []
+    if start_date is not None:
+        clauses.append("date::DATE >= ?")
+        params.append(pd.Timestamp(start_date).date())
+    if end_date is not None:
+        clauses.append("date::DATE <= ?")
+        params.append(pd.Timestamp(end_date).date())
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    cursor = duck_conn.cursor()
+    source = "sprint_raw.event_signons"
+    if lake is not None:
+        source = f"read_parquet('{lake.glob('event_signons')}', hive_partitioning = true)"
+    cursor.execute(f"SELECT date, playerId FROM {source}{where} ORDER BY date", params)
+
+    pending_date, pending = None, []
+    while True:
+        chunk = cursor.fetch_df_chunk(chunk_vectors)
+        if chunk.empty:
+            break
+        dates = chunk["date"].to_numpy()
+        players = chunk["playerId"].to_numpy()
+        cuts = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+        for part_dates, part_players in zip(np.split(dates, cuts), np.split(players, cuts)):
+            if pending and part_dates[0] != pending_date:
+                yield pending_date, np.concatenate(pending)
+                pending = []
+            pending_date = part_dates[0]
+            pending.append(part_players)
+
+    if pending:
+        yield pending_date, np.concatenate(pending)
+
+# Targeted invalidation scope per table: (date expression, session id column,
+# whether the table is derived from sessions and so follows their dates).
+# Rows spanning many days use a (first date, last date) pair and are
+# invalidated when that span overlaps the window.
+INVALIDATION_SCOPES = {
+    "sprint_raw.event_signons": ("date::DATE", None, False),
+    "sprint_raw.event_session": ("(rawResponse->>'$.startTime')::TIMESTAMP::DATE", "sessionId", True),
+    "sprint_raw.event_transaction": ("eventDateTime::TIMESTAMP::DATE", None, False),
+    "sprint_raw.event_subscription": ("eventDateTime::TIMESTAMP::DATE", None, False),
+    "sprint_raw.key_map_session": (None, "surrogateKey", True),
+    "sprint_raw.key_map_team": (None, "sessionKey", True),
+    "sprint_raw.live_heartbeat": ("timestamp::DATE", "sessionId", True),
+    "sprint_stage.fact_session": ("eventDateTime::TIMESTAMP::DATE", "sessionId", True),
+    "sprint_stage.fact_player_session_movement": ("eventDateTime::DATE", "sessionId", True),
+    "sprint_stage.event_heartbeat": ("event_datetime::DATE", "session_id", True),
+    "sprint_stage.event_heartbeat_lod": ("timestamp::DATE", "sessionId", True),
+    "sprint_stage.stage_centroids": ("event_datetime::DATE", "session_id", True),
+    "sprint_stage.stage_encounters": ("encounter_start::DATE", "session_id", True),
+    "sprint_stage.stage_player_day": ("calendar_date::DATE", None, True),
+    "sprint_stage.fact_transaction": ("event_datetime::DATE", None, False),
+    "sprint_mart.player_activity_daily": ("calendar_date::DATE", None, True),
+    "sprint_mart.player_stats_lifetime": (("first_played::DATE", "last_played::DATE"), None, True),
+    "sprint_mart.player_consecutive_days_monthly": (("year_month::DATE", "last_day(year_month)"), None, True),
+    "sprint_mart.encounter_summary_daily": ("calendar_day::DATE", "session_id", True),
+    "sprint_mart.country_ccu_minutely": ("minute::DATE", None, True),
+    "sprint_mart.heatmap_voxel_daily": ("calendar_date::DATE", None, True),
+    "sprint_mart.country_weekly_revenue": (("year_week::DATE", "year_week::DATE + 6"), None, False),
+    "sprint_mart.revenue_daily": ("calendar_date::DATE", None, False),
+    "sprint_mart.product_revenue_daily": ("calendar_date::DATE", None, False),
+    # Running totals: a regenerated window changes every day from its start on
+    "sprint_mart.subscription_mrr_daily": (("DATE '0001-01-01'", "calendar_date::DATE"), None, False),
+}
+
+def _existing_tables(duck_conn):
+    rows = duck_conn.execute("SELECT table_schema, table_name FROM information_schema.tables").fetchall()
+    return {f"{schema}.{table}" for schema, table in rows}
+
+def _resolve_sessions(duck_conn, existing, start_date, end_date, session_ids):
+    """
+    Session ids to invalidate (explicit ids plus every session dated in the
+    range) and the distinct dates those sessions fall on.
+    """
+    ids = list(session_ids or [])
+    if start_date is not None:
+        for table in ("sprint_raw.event_session", "sprint_stage.fact_session"):
+            if table in existing:
+                date_expr, id_col, _ = INVALIDATION_SCOPES[table]
+                ids.extend(r[0] for r in duck_conn.execute(
+                    f"SELECT DISTINCT {id_col} FROM {table} WHERE {date_expr} BETWEEN ? AND ?",
+                    [start_date, end_date],
+                ).fetchall())
+    ids = list(dict.fromkeys(ids))
+
+    dates = set()
+    if ids and "sprint_stage.fact_session" in existing:
+        date_expr, id_col, _ = INVALIDATION_SCOPES["sprint_stage.fact_session"]
+        duck_conn.register("_invalidated_ids", pd.DataFrame({"id": ids}))
+        dates.update(r[0] for r in duck_conn.execute(
+            f"SELECT DISTINCT {date_expr} FROM sprint_stage.fact_session "
+            f"WHERE {id_col} IN (SELECT id FROM _invalidated_ids)"
+        ).fetchall())
+        duck_conn.unregister("_invalidated_ids")
+    return ids, dates
+
+def announce_invalidation(window):
+    """Print the dbt vars that reprocess an invalidated window."""
+    if window and window["start"] is not None:
+        print(
+            f"🔁 Invalidated {window['start']} → {window['end']}; run dbt with "
+            f"--vars '{{invalidate_start: {window['start']}, invalidate_end: {window['end']}}}'"
+        )
+
+def invalidate_data(duck_conn, tables, start_date=None, end_date=None, session_ids=None, announce=True):
+    """
+    Delete only the rows of `tables` that belong to a date range and/or a set
+    of sessions, instead of dropping the tables.
+
+    Session-derived tables lose every row of the affected sessions (explicit
+    ids plus all sessions dated in the range) and, for date-grained rollups,
+    the days those sessions fall on. Other tables (sign-ons, transactions)
+    are only scoped by the date range. Tables without a scope in
+    INVALIDATION_SCOPES are left untouched.
+
+    Returns:
+        dict with the invalidated `start`/`end` dates (None if nothing is
+        dated) and the number of `sessions`. Pass the dates to dbt as
+        `--vars '{invalidate_start: ..., invalidate_end: ...}'` so the
+        incremental models reprocess exactly that window; they are printed
+        unless `announce` is False (see `announce_invalidation`).
+    """
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date).date()
+        end_date = pd.Timestamp(end_date if end_date is not None else start_date).date()
+
+    existing = _existing_tables(duck_conn)
+    ids, session_dates = _resolve_sessions(duck_conn, existing, start_date, end_date, session_ids)
+    duck_conn.register("_invalidated_sessions", pd.DataFrame({"id": ids}))
+
+    try:
+        for table in sorted(set(tables) & existing & set(INVALIDATION_SCOPES)):
+            date_expr, id_col, follows_sessions = INVALIDATION_SCOPES[table]
+            clauses, params = [], []
+            if id_col and ids:
+                clauses.append(f"{id_col} IN (SELECT id FROM _invalidated_sessions)")
+            if isinstance(date_expr, tuple):
+                first, last = date_expr
+                if start_date is not None:
+                    clauses.append(f"({first} <= ? AND {last} >= ?)")
+                    params.extend([end_date, start_date])
+                if follows_sessions and session_dates:
+                    clauses.extend(f"? BETWEEN {first} AND {last}" for _ in session_dates)
+                    params.extend(sorted(session_dates))
+            else:
+                if date_expr and start_date is not None:
+                    clauses.append(f"{date_expr} BETWEEN ? AND ?")
+                    params.extend([start_date, end_date])
+                if date_expr and follows_sessions and session_dates:
+                    clauses.append(f"{date_expr} IN ({', '.join('?' * len(session_dates))})")
+                    params.extend(sorted(session_dates))
+            if not clauses:
+                continue
+
+            try:
+                deleted = duck_conn.execute(
+                    f"DELETE FROM {table} WHERE {' OR '.join(clauses)}", params
+                ).fetchone()[0]
+                print(f"Deleted {deleted} rows from {table}")
+            except duckdb.Error as e:
+                print(f"Warning: Could not invalidate {table}: {e}")
+    finally:
+        duck_conn.unregister("_invalidated_sessions")
+
+    all_dates = set(session_dates)
+    if start_date is not None:
+        all_dates.update((start_date, end_date))
+    window = {
+        "start": min(all_dates) if all_dates else None,
+        "end": max(all_dates) if all_dates else None,
+        "sessions": len(ids),
+    }
+    if announce:
+        announce_invalidation(window)
+    return window
+
+def clear_old_data(duck_conn, level="all", start_date=None, end_date=None, session_ids=None, announce=True):
+    """
+    Drop the tables of a generation level and everything downstream of it.
+
+    With `start_date`/`end_date` and/or `session_ids`, only the matching
+    rows are deleted instead (see `invalidate_data`) and the invalidated
+    window is returned.
+    """
     # Base level definitions (no overlap)
     base_tables = {
         "players": {
             "sprint_dim.dim_players",
             "sprint_dim.dim_products",
+            "sprint_dim.key_map_player",
             "sprint_raw.event_signons",
             "sprint_raw.event_session",
             "sprint_raw.event_transaction",
+            "sprint_raw.event_subscription",
         },
         "signons": {
             "sprint_raw.event_signons",
             "sprint_raw.event_session",
             "sprint_raw.event_transaction",
+            "sprint_raw.event_subscription",
         },
         "sessions": {
             "sprint_raw.event_session",
-            "sprint_raw.event_transaction",
+            "sprint_raw.key_map_session",
+            "sprint_raw.key_map_team",
+            "sprint_raw.live_heartbeat",
             "sprint_stage.event_heartbeat",
+            "sprint_stage.event_heartbeat_lod",
             "sprint_stage.fact_session",
+            "sprint_stage.fact_player_session_movement",
             "sprint_stage.stage_centroids",
             "sprint_stage.stage_encounters",
+            "sprint_stage.stage_player_day",
         },
         "transactions": {
             "sprint_raw.event_transaction",
+            "sprint_raw.event_subscription",
+            "sprint_stage.fact_transaction",
+            "sprint_mart.country_weekly_revenue",
+            "sprint_mart.revenue_daily",
+            "sprint_mart.product_revenue_daily",
+            "sprint_mart.subscription_mrr_daily",
         },
         "mart": {
+            "sprint_mart.country_ccu_minutely",
             "sprint_mart.encounter_summary_daily",
+            "sprint_mart.heatmap_voxel_daily",
             "sprint_mart.player_activity_daily",
+            "sprint_mart.player_consecutive_days_monthly",
+            "sprint_mart.player_stats_lifetime",
         }
     }
 
@@ -158,7 +464,8 @@ def clear_old_data(duck_conn, level="all"):
     cascades = {
         "players": base_tables["players"],
         "signons": base_tables["signons"],
-        "sessions": base_tables["sessions"],
+        # The session marts are incremental and would keep days that no longer exist
+        "sessions": base_tables["sessions"] | base_tables["mart"],
         "transactions": base_tables["transactions"],
         "mart": base_tables["mart"],
         "all": set().union(
@@ -175,11 +482,16 @@ def clear_old_data(duck_conn, level="all"):
         print(f"No tables configured for level '{level}'")
         return
 
+    if start_date is not None or session_ids is not None:
+        # Incremental marts are never rebuilt from scratch, so scoped
+        # invalidation always reaches them too
+        if level != "transactions":
+            tables_to_drop = tables_to_drop | base_tables["mart"]
+        return invalidate_data(duck_conn, tables_to_drop, start_date, end_date, session_ids, announce)
+
     for table in tables_to_drop:
         try:
             duck_conn.execute(f"DROP TABLE IF EXISTS {table}")
             print(f"Dropped table {table}")
         except Exception as e:
             print(f"Warning: Could not drop table {table}: {e}")
-
-
@@ -0,0 +1,171 @@
+import numpy as np
+
+from utils import (
+    MIN_TEAMS,
+    MAX_TEAMS,
+    MIN_PLAYERS_PER_TEAM,
+    MAX_PLAYERS_PER_TEAM,
+)
+
+# Every (num_teams, players_per_team) combination allowed by the team limits
+DEFAULT_LOBBY_SHAPES = [
+    (teams, per_team)
+    for teams in range(MIN_TEAMS, MAX_TEAMS + 1)
+    for per_team in range(MIN_PLAYERS_PER_TEAM, MAX_PLAYERS_PER_TEAM + 1)
+]
+
+
+class LobbySchedule:
+    """
+    Compact CSR-style description of a day's lobbies.
+
+    Players are stored once in `player_idx`, ordered lobby by lobby and team
+    by team. Team i owns `player_idx[team_offsets[i]:team_offsets[i + 1]]`
+    and lobby j owns teams `lobby_offsets[j]:lobby_offsets[j + 1]`.
+
+    Args:
+        player_idx: int32 indices into the day's player array.
+        team_offsets: int64 team boundaries into `player_idx` (n_teams + 1).
+        lobby_offsets: int64 lobby boundaries into the team list (n_lobbies + 1).
+    """
+
+    __slots__ = ("player_idx", "team_offsets", "lobby_offsets")
+
+    def __init__(self, player_idx, team_offsets, lobby_offsets):
+        self.player_idx = np.asarray(player_idx, dtype=np.int32)
+        self.team_offsets = np.asarray(team_offsets, dtype=np.int64)
+        self.lobby_offsets = np.asarray(lobby_offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.lobby_offsets) - 1
+
+    @property
+    def n_teams(self):
+        return len(self.team_offsets) - 1
+
+    def lobby_players(self, lobby: int) -> np.ndarray:
+        """Player indices of one lobby."""
+        first_team, last_team = self.lobby_offsets[lobby], self.lobby_offsets[lobby + 1]
+        return self.player_idx[self.team_offsets[first_team]:self.team_offsets[last_team]]
+
+    def lobby_teams(self, lobby: int) -> list[np.ndarray]:
+        """Player indices of one lobby, split per team."""
+        first_team, last_team = self.lobby_offsets[lobby], self.lobby_offsets[lobby + 1]
+        bounds = self.team_offsets[first_team:last_team + 1]
+        return [self.player_idx[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def lobby_sizes(self) -> np.ndarray:
+        return np.diff(self.team_offsets[self.lobby_offsets])
+
+
+def split_into_teams(n_players: int, max_per_team: int = MAX_PLAYERS_PER_TEAM) -> np.ndarray:
+    """
+    Team sizes for a lobby that matches no configured shape.
+
+    Uses as few teams as `max_per_team` allows and keeps sizes within one of
+    each other, so every player is placed.
+    """
+    num_teams = -(-n_players // max_per_team)
+    sizes = np.full(num_teams, n_players // num_teams, dtype=np.int64)
+    sizes[: n_players % num_teams] += 1
+    return sizes
+
+
+def pack_segment(n_players: int, shapes=None, rng=None):
+    """
+    Cut a run of `n_players` into lobbies drawn from `shapes`.
+
+    Shapes are drawn at random until the next one would overflow; the
+    remainder becomes one last lobby split with `split_into_teams` (or an
+    exact-size shape if one exists). Runs in O(number of lobbies).
+
+    Returns:
+        (team_sizes, teams_per_lobby) int64 arrays.
+    """
+    shapes = np.asarray(DEFAULT_LOBBY_SHAPES if shapes is None else shapes, dtype=np.int64)
+    rng = rng or np.random
+    if n_players <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    shape_sizes = shapes[:, 0] * shapes[:, 1]
+    draws = rng.randint(0, len(shapes), size=n_players // shape_sizes.min() + 1)
+    filled = np.cumsum(shape_sizes[draws])
+    n_full = int(np.searchsorted(filled, n_players, side="right"))
+    full = shapes[draws[:n_full]]
+
+    team_sizes = [np.repeat(full[:, 1], full[:, 0])]
+    teams_per_lobby = [full[:, 0]]
+
+    remainder = n_players - (int(filled[n_full - 1]) if n_full else 0)
+    if remainder:
+        exact = np.flatnonzero(shape_sizes == remainder)
+        if len(exact):
+            teams, per_team = shapes[exact[rng.randint(0, len(exact))]]
+            sizes = np.full(teams, per_team, dtype=np.int64)
+        else:
+            sizes = split_into_teams(remainder, int(shapes[:, 1].max()))
+        team_sizes.append(sizes)
+        teams_per_lobby.append(np.array([len(sizes)], dtype=np.int64))
+
+    return np.concatenate(team_sizes), np.concatenate(teams_per_lobby)
+
+
+def schedule_lobbies(session_counts, buckets=None, skill=None, shapes=None, rng=None) -> LobbySchedule:
+    """
+    Pack a day's players into lobbies without duplicates or dropped players.
+
+    Players who play k sessions take part in k packing rounds; each round
+    holds every player at most once and lobbies never span rounds, so no
+    lobby contains the same player twice. Within a round, players are
+    shuffled and optionally grouped by `buckets` (e.g. country codes) and
+    ordered by `skill`, so lobbies are filled from contiguous, homogeneous
+    runs. Packing is O(n) per round after the grouping sort.
+
+    Args:
+        session_counts: Sessions per player for the day (int array).
+        buckets: Optional per-player bucket labels; lobbies never mix buckets.
+        skill: Optional per-player skill values; neighbours in skill share lobbies.
+        shapes: (num_teams, players_per_team) options; defaults to DEFAULT_LOBBY_SHAPES.
+        rng: np.random.RandomState (or the np.random module) used for draws.
+
+    Returns:
+        LobbySchedule indexing into the input player order.
+    """
+    rng = rng or np.random
+    session_counts = np.asarray(session_counts, dtype=np.int64)
+    if buckets is not None:
+        _, bucket_codes = np.unique(np.asarray(buckets), return_inverse=True)
+    skill = None if skill is None else np.asarray(skill, dtype=np.float64)
+
+    player_parts, team_parts, lobby_parts = [], [], []
+    for round_no in range(int(session_counts.max(initial=0))):
+        order = rng.permutation(np.flatnonzero(session_counts > round_no))
+        if buckets is None and skill is None:
+            segments = [order]
+        else:
+            sort_keys = [] if skill is None else [skill[order]]
+            if buckets is not None:
+                sort_keys.append(bucket_codes[order])
+            order = order[np.lexsort(sort_keys)]
+            if buckets is None:
+                segments = [order]
+            else:
+                cuts = np.flatnonzero(np.diff(bucket_codes[order])) + 1
+                segments = np.split(order, cuts)
+
+        for segment in segments:
+            team_sizes, teams_per_lobby = pack_segment(len(segment), shapes, rng)
+            player_parts.append(segment)
+            team_parts.append(team_sizes)
+            lobby_parts.append(teams_per_lobby)
+
+    if not player_parts:
+        return LobbySchedule(np.empty(0), np.zeros(1), np.zeros(1))
+
+    team_sizes = np.concatenate(team_parts)
+    teams_per_lobby = np.concatenate(lobby_parts)
+    return LobbySchedule(
+        player_idx=np.concatenate(player_parts),
+        team_offsets=np.concatenate([[0], np.cumsum(team_sizes)]),
+        lobby_offsets=np.concatenate([[0], np.cumsum(teams_per_lobby)]),
+    )
@@ -0,0 +1,66 @@
+import numpy as np
+
+# Ken Perlin's reference permutation, as compiled into the `noise` C extension
+PERMUTATION = np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140, 36, 103, 30, 69, 142,
+    8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203,
+    117, 35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165,
+    71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41,
+    55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89,
+    18, 169, 200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226, 250,
+    124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227, 47, 16, 58, 17, 182, 189,
+    28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9,
+    129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251, 34,
+    242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31,
+    181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114,
+    67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180,
+], dtype=np.int64)
+
+# Doubled so lattice index + base never wraps
+_PERM = np.concatenate([PERMUTATION, PERMUTATION])
+
+# Single-octave amplitude used by `noise.pnoise1`
+AMPLITUDE = 0.4
+
+
+def _gradients(hashes, compat):
+    magnitude = (hashes & 7) + 1.0
+    # The C extension sets g = -1 (not -g) for hashes with bit 3 set
+    negative = -1.0 if compat else -magnitude
+    return np.where(hashes & 8, negative, magnitude)
+
+
+def pnoise1(x, base=0, repeat: int = 1024, compat: bool = True) -> np.ndarray:
+    """
+    1D gradient (Perlin) noise evaluated over a whole array at once.
+
+    With `compat=True` the result equals `noise.pnoise1(x, repeat=repeat,
+    base=base)` (single octave) value for value: float32 arithmetic and the
+    extension's gradient quirk, where every hash with bit 3 set gets gradient
+    -1. `compat=False` uses the reference signed gradients (+-1..8) in
+    float64.
+
+    Args:
+        x: Sample positions (scalar or array-like of any shape).
+        base: Offset into the permutation table (0-255), broadcast against
+            `x`; each base is an independent noise sequence, e.g. one per player.
+        repeat: Period of the noise along x.
+        compat: Reproduce the `noise` C extension (see above).
+
+    Returns:
+        ndarray of noise values with the broadcast shape of `x` and `base`.
+    """
+    dtype = np.float32 if compat else np.float64
+    x = np.asarray(x, dtype=dtype)
+    floor = np.floor(x)
+    # C semantics: truncating modulo, then the low 8 bits
+    cell = np.fmod(floor.astype(np.int64), repeat)
+    base = np.asarray(base, dtype=np.int64) & 255
+    lo = _PERM[(cell & 255) + base]
+    hi = _PERM[(np.fmod(cell + 1, repeat) & 255) + base]
+
+    frac = x - floor
+    fade = frac * frac * frac * (frac * (frac * 6 - 15) + 10)
+    a = (_gradients(lo, compat) * frac).astype(dtype)
+    b = (_gradients(hi, compat) * (frac - dtype(1))).astype(dtype)
+    return ((a + fade * (b - a)) * dtype(AMPLITUDE)).astype(dtype)
@@ -1,6 +1,35 @@
-from noise import pnoise1 # type: ignore
+import numpy as np
 
-def step(x, y, z, speed, t):
+from movement.gradient_noise import pnoise1
+
+# Time offsets decorrelating the x/y/z noise tracks, and samples per timestep
+AXIS_OFFSETS = np.array([0, 100, 200])
+FREQUENCY = 0.1
+
+
+def deltas(speed, t, seed=0, compat=True):
+    """
+    Perlin displacements for many timesteps in one vectorized noise call.
+
+    Movement does not depend on the current position, so a player's whole
+    path of steps can be drawn at once and only accumulated afterwards.
+
+    Args:
+        speed (float): Player movement speed.
+        t (array-like[int]): Timestep indices.
+        seed (int): Noise base (0-255); players with different seeds follow
+            independent tracks. Seed 0 reproduces the original `noise.pnoise1` path.
+        compat (bool): See `gradient_noise.pnoise1`.
+
+    Returns:
+        np.ndarray: (len(t), 3) array of (dx, dy, dz).
+    """
+    t = np.asarray(t)
+    noise = pnoise1((t[:, None] + AXIS_OFFSETS) * FREQUENCY, base=seed, compat=compat)
+    return noise.astype(np.float64) * speed
+
+
+def step(x, y, z, speed, t, seed=0):
     """
     Compute the next position using Perlin noise for smooth pseudo-random movement.
 
@@ -12,11 +41,10 @@ def step(x, y, z, speed, t):
         z (float): Current z-coordinate.
         speed (float): Player movement speed.
         t (int): Timestep index.
+        seed (int): Noise base, see `deltas`.
 
     Returns:
         tuple[float, float, float]: Updated (x, y, z) position.
     """
-    dx = pnoise1(t * 0.1) * speed
-    dy = pnoise1((t + 100) * 0.1) * speed
-    dz = pnoise1((t + 200) * 0.1) * speed
+    dx, dy, dz = deltas(speed, [t], seed)[0].tolist()
     return x + dx, y + dy, z + dz
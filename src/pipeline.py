@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from keys import KeyAllocator
+from loader import clear_old_data, write_dataframe_to_table
+from records import summaries_to_frame
+from session_generator import SESSION_LAKE_TABLES, clear_sessions, generate_sessions_for_day, save_session_summaries
+from transaction_generator import SubscriptionBook, write_transactions_for_day
+from utils import SESSION_PATH, players_by_day
+
+
+def run_day_loop(
+    days,
+    duck_conn,
+    country_map,
+    products_df: pd.DataFrame = None,
+    keys: KeyAllocator = None,
+    write_signons: bool = False,
+    sessions: bool = True,
+    transactions: bool = True,
+    session_dir: Path = SESSION_PATH,
+    workers: int = 1,
+    archive=None,
+    lake=None,
+    **session_options,
+):
+    """
+    Fused calendar traversal: each day's sign-ons feed sessions and
+    transactions before the next day is drawn.
+
+    With `days = utils.sign_on_days(player_ids)` the sign-on table is never
+    materialized; with `write_signons=True` each day is appended to
+    `sprint_raw.event_signons` as it is produced.
+
+    Args:
+        days: Iterable of (date, playerIds), e.g. `utils.sign_on_days` or
+            `loader.iter_signons_by_day`; a sign-on DataFrame also works.
+        country_map: playerId -> country (required when `sessions` is set; sets
+            each transaction's local currency).
+        products_df: dim_products catalog (required when `transactions` is set).
+        keys: KeyAllocator shared by both streams.
+        write_signons: Persist each day's sign-ons (replacing the table).
+        sessions / transactions: Which event streams to generate.
+        workers: Processes used to simulate matchmaking pools.
+        archive: Optional `archive.SessionArchive` to append sessions to
+            (emptied first, like the session tables).
+        lake: Optional `lake.ParquetLake`; sign-ons, sessions, summaries and
+            transactions are written as its date partitions instead of DuckDB.
+        **session_options: Passed to `generate_sessions_for_day`
+            (min/max_sessions_per_player, lobby_shapes, pool_by, heartbeat_epsilon).
+    """
+    keys = keys or KeyAllocator()
+    if sessions:
+        session_dir.mkdir(parents=True, exist_ok=True)
+        clear_sessions(duck_conn)
+        if archive is not None:
+            archive.clear()
+    if transactions:
+        clear_old_data(duck_conn, level="transactions")
+    if lake is not None:
+        lake.clear(
+            (("event_signons",) if write_signons else ())
+            + (SESSION_LAKE_TABLES if sessions else ())
+            + (("event_transaction", "event_subscription") if transactions else ())
+        )
+
+    summaries = []
+    subscriptions = SubscriptionBook() if transactions else None
+    first_day = True
+    executor = ProcessPoolExecutor(max_workers=workers) if sessions and workers > 1 else None
+    try:
+        for date, players_today in players_by_day(days):
+            if write_signons:
+                signons_df = pd.DataFrame({"playerId": players_today, "date": [date] * len(players_today)})
+                if lake is not None:
+                    lake.write("event_signons", signons_df, date)
+                else:
+                    write_dataframe_to_table(duck_conn, "sprint_raw", "event_signons", signons_df, replace=first_day)
+            first_day = False
+
+            if sessions:
+                day_summaries = generate_sessions_for_day(
+                    date, players_today, country_map, duck_conn, session_dir,
+                    keys=keys, executor=executor, archive=archive, lake=lake, **session_options,
+                )
+                # The lake already holds each day's summaries
+                if lake is None:
+                    summaries.extend(day_summaries)
+            if transactions:
+                write_transactions_for_day(
+                    players_today, date, products_df, duck_conn, keys, lake, country_map, subscriptions
+                )
+    finally:
+        if executor:
+            executor.shutdown()
+
+    if sessions and lake is None:
+        save_session_summaries(summaries_to_frame(summaries), duck_conn)
+    keys.save(duck_conn)
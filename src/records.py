@@ -0,0 +1,376 @@
+import numpy as np
+import pandas as pd
+
+from utils import HEARTBEAT_INTERVAL, HEARTBEAT_MAX_HOLD_SECONDS, iso_format
+
+# Positions are written with this many decimals, so smaller moves are invisible downstream
+POSITION_DECIMALS = 3
+
+# Column layout of a heartbeat batch: 2 x int32 + int64 + 3 x float32 = 28 bytes per beat
+HEARTBEAT_COLUMNS = {
+    "player_idx": np.int32,
+    "team_idx": np.int32,
+    "timestamp": np.int64,
+    "position_x": np.float32,
+    "position_y": np.float32,
+    "position_z": np.float32,
+}
+
+
+def _key_column(lookup, idx):
+    """
+    Expand a per-session lookup table by index: BIGINT surrogate keys are
+    gathered into an int64 array, string ids become a pandas categorical.
+    """
+    if lookup and all(isinstance(k, (int, np.integer)) for k in lookup):
+        return np.asarray(lookup, dtype=np.int64)[idx]
+    return pd.Categorical.from_codes(idx, categories=lookup)
+
+
+class Heartbeat:
+    """
+    Single heartbeat row, resolved from a HeartbeatBatch.
+
+    Only used where row-at-a-time access is unavoidable (e.g. iterating a batch
+    in a notebook); bulk paths should stay on the batch arrays.
+    """
+
+    __slots__ = ("timestamp", "player_id", "session_id", "team_id", "position_x", "position_y", "position_z")
+
+    def __init__(self, timestamp, player_id, session_id, team_id, position_x, position_y, position_z):
+        self.timestamp = timestamp
+        self.player_id = player_id
+        self.session_id = session_id
+        self.team_id = team_id
+        self.position_x = position_x
+        self.position_y = position_y
+        self.position_z = position_z
+
+    def __repr__(self):
+        return (
+            f"Heartbeat({self.timestamp}, player={self.player_id}, team={self.team_id}, "
+            f"pos=({self.position_x:.3f}, {self.position_y:.3f}, {self.position_z:.3f}))"
+        )
+
+
+class HeartbeatBatch:
+    """
+    Struct-of-arrays container for all heartbeats of one session.
+
+    Player and team ids are stored once in per-session lookup tables and each
+    beat only carries int32 indices into them. Timestamps are int64 epoch
+    seconds and positions are float32.
+
+    Args:
+        session_id: Session identifier shared by every beat in the batch.
+        player_ids: Lookup table of player ids, indexed by `player_idx`.
+        team_ids: Lookup table of team ids, indexed by `team_idx`.
+        player_idx: int32 index into `player_ids` per beat.
+        team_idx: int32 index into `team_ids` per beat.
+        timestamp: int64 epoch seconds per beat.
+        position_x: float32 X coordinate per beat.
+        position_y: float32 Y coordinate per beat.
+        position_z: float32 Z coordinate per beat.
+        hold_beats: Optional int32 per beat, set by `thin()`: how many
+            following heartbeat ticks repeat this beat's position.
+    """
+
+    __slots__ = ("session_id", "player_ids", "team_ids", "hold_beats") + tuple(HEARTBEAT_COLUMNS)
+
+    def __init__(
+        self,
+        session_id,
+        player_ids,
+        team_ids,
+        player_idx,
+        team_idx,
+        timestamp,
+        position_x,
+        position_y,
+        position_z,
+        hold_beats=None,
+    ):
+        self.session_id = session_id
+        self.player_ids = list(player_ids)
+        self.team_ids = list(team_ids)
+        self.player_idx = np.asarray(player_idx, dtype=np.int32)
+        self.team_idx = np.asarray(team_idx, dtype=np.int32)
+        self.timestamp = np.asarray(timestamp, dtype=np.int64)
+        self.position_x = np.asarray(position_x, dtype=np.float32)
+        self.position_y = np.asarray(position_y, dtype=np.float32)
+        self.position_z = np.asarray(position_z, dtype=np.float32)
+        self.hold_beats = None if hold_beats is None else np.asarray(hold_beats, dtype=np.int32)
+
+    @classmethod
+    def empty(cls, session_id, player_ids, team_ids, size):
+        """Allocate an uninitialised batch with room for `size` beats."""
+        arrays = {col: np.empty(size, dtype=dtype) for col, dtype in HEARTBEAT_COLUMNS.items()}
+        return cls(session_id, player_ids, team_ids, **arrays)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the per-beat arrays (lookup tables excluded)."""
+        return sum(getattr(self, col).nbytes for col in HEARTBEAT_COLUMNS)
+
+    def thin(self, epsilon: float = 0.0, max_interval: int = HEARTBEAT_MAX_HOLD_SECONDS) -> "HeartbeatBatch":
+        """
+        Adaptive sampling: drop beats where the player has not moved.
+
+        A beat is kept when the player is more than `epsilon` away from their
+        last kept position (compared at the POSITION_DECIMALS written
+        downstream) or when `max_interval` seconds have passed since it. Each
+        kept beat's `hold_beats` counts the dropped ticks that follow it, so
+        forward-filling its position restores every beat. `epsilon=0` is
+        lossless: only beats identical at the written precision are dropped.
+
+        Returns:
+            A new HeartbeatBatch with `hold_beats` set.
+        """
+        order = np.lexsort((self.timestamp, self.player_idx))
+        player = self.player_idx[order]
+        ts = self.timestamp[order]
+        pos = np.round(
+            np.column_stack([self.position_x, self.position_y, self.position_z])[order].astype(np.float64),
+            POSITION_DECIMALS,
+        )
+        # Only the next tick of the same player can be folded into a hold
+        follows = np.zeros(len(order), dtype=bool)
+        follows[1:] = (player[1:] == player[:-1]) & (ts[1:] - ts[:-1] == HEARTBEAT_INTERVAL)
+        max_hold = max(max_interval // HEARTBEAT_INTERVAL - 1, 0)
+
+        if epsilon == 0:
+            # Unmoved = identical to the previous beat; every (max_hold + 1)th beat of a run is kept
+            still = follows.copy()
+            still[1:] &= (pos[1:] == pos[:-1]).all(axis=1)
+            index = np.arange(len(order))
+            run_pos = index - np.maximum.accumulate(np.where(still, 0, index))
+            keep = run_pos % (max_hold + 1) == 0
+        else:
+            # For every beat, the offset of the next beat that would be kept if this
+            # one were: the first tick that leaves the run or moves more than epsilon
+            index = np.arange(len(order))
+            run = np.cumsum(~follows)
+            step = np.full(len(order), max_hold + 1)
+            for offset in range(max_hold, 0, -1):
+                ahead = np.minimum(index + offset, len(order) - 1)
+                moved = (run[ahead] != run) | (np.linalg.norm(pos[ahead] - pos, axis=1) > epsilon)
+                step[moved] = offset
+            # Walk the kept chains of all players at once, starting from every run start
+            keep = ~follows
+            frontier = np.flatnonzero(keep)
+            while len(frontier):
+                frontier = frontier + step[frontier]
+                frontier = frontier[frontier < len(order)]
+                frontier = frontier[~keep[frontier]]
+                keep[frontier] = True
+
+        kept = np.flatnonzero(keep)
+        # A player's first beat is always kept, so each gap ends at the player's last tick
+        hold = np.diff(np.append(kept, len(order))) - 1
+        rows = order[kept]
+        return HeartbeatBatch(
+            self.session_id, self.player_ids, self.team_ids,
+            hold_beats=hold,
+            **{col: getattr(self, col)[rows] for col in HEARTBEAT_COLUMNS},
+        )
+
+    def row(self, i):
+        return Heartbeat(
+            timestamp=int(self.timestamp[i]),
+            player_id=self.player_ids[self.player_idx[i]],
+            session_id=self.session_id,
+            team_id=self.team_ids[self.team_idx[i]],
+            position_x=float(self.position_x[i]),
+            position_y=float(self.position_y[i]),
+            position_z=float(self.position_z[i]),
+        )
+
+    def datetimes(self):
+        """Timestamps as a datetime64[s] view."""
+        return self.timestamp.view("datetime64[s]")
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Build a DataFrame straight from the arrays.
+
+        String ids become pandas categoricals over the lookup tables, so no
+        per-beat strings are materialized; surrogate keys stay int64.
+        """
+        n = len(self)
+        return pd.DataFrame({
+            "timestamp": self.datetimes(),
+            "playerId": _key_column(self.player_ids, self.player_idx),
+            "sessionId": _key_column([self.session_id], np.zeros(n, dtype=np.int8)),
+            "teamId": _key_column(self.team_ids, self.team_idx),
+            "positionX": self.position_x,
+            "positionY": self.position_y,
+            "positionZ": self.position_z,
+            **({} if self.hold_beats is None else {"holdBeats": self.hold_beats}),
+        })
+
+    def to_arrow(self):
+        """
+        Build a pyarrow Table with dictionary-encoded id columns.
+
+        Requires the optional `pyarrow` dependency.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("HeartbeatBatch.to_arrow requires pyarrow (pip install pyarrow)") from e
+
+        n = len(self)
+        return pa.table({
+            "timestamp": pa.array(self.timestamp, type=pa.timestamp("s")),
+            "playerId": pa.DictionaryArray.from_arrays(self.player_idx, pa.array(self.player_ids)),
+            "sessionId": pa.DictionaryArray.from_arrays(
+                np.zeros(n, dtype=np.int32), pa.array([self.session_id])
+            ),
+            "teamId": pa.DictionaryArray.from_arrays(self.team_idx, pa.array(self.team_ids)),
+            "positionX": self.position_x,
+            "positionY": self.position_y,
+            "positionZ": self.position_z,
+        })
+
+    def to_parquet(self, path):
+        """Write the batch to a Parquet file via DuckDB (no pyarrow needed)."""
+        import duckdb
+
+        frame = self.to_frame()
+        duckdb.from_df(frame).write_parquet(str(path))
+
+    def to_duckdb(self, duck_conn, schema: str, table: str):
+        """Append the batch to a DuckDB table, creating it if missing."""
+        from loader import write_dataframe_to_table
+
+        write_dataframe_to_table(duck_conn, schema, table, self.to_frame(), replace=False)
+
+    def to_records(self, fast_iso: bool = True) -> list[dict]:
+        """
+        Expand to the legacy list-of-dicts layout used by the session JSON files.
+
+        This is the only place heartbeat timestamps are turned into strings;
+        typed sinks (`to_frame`, `to_arrow`, `to_duckdb`) keep them as epoch values.
+        """
+        timestamps = iso_format(self.timestamp, fast=fast_iso).tolist()
+        player_ids = np.asarray(self.player_ids, dtype=object)[self.player_idx]
+        team_ids = np.asarray(self.team_ids, dtype=object)[self.team_idx]
+        xs = np.round(self.position_x.astype(np.float64), POSITION_DECIMALS).tolist()
+        ys = np.round(self.position_y.astype(np.float64), POSITION_DECIMALS).tolist()
+        zs = np.round(self.position_z.astype(np.float64), POSITION_DECIMALS).tolist()
+        records = [
+            {
+                "timestamp": ts,
+                "playerId": pid,
+                "sessionId": self.session_id,
+                "teamId": tid,
+                "positionX": x,
+                "positionY": y,
+                "positionZ": z,
+            }
+            for ts, pid, tid, x, y, z in zip(timestamps, player_ids, team_ids, xs, ys, zs)
+        ]
+        if self.hold_beats is not None:
+            for record, hold in zip(records, self.hold_beats.tolist()):
+                record["holdBeats"] = hold
+        return records
+
+
+def expand_held_beats(beats: pd.DataFrame) -> pd.DataFrame:
+    """
+    Undo `HeartbeatBatch.thin` on heartbeat rows (e.g. read from a session
+    file): each row is repeated over its held ticks, HEARTBEAT_INTERVAL apart.
+
+    Frames without a `holdBeats` column are returned unchanged.
+    """
+    if "holdBeats" not in beats:
+        return beats
+    repeats = beats["holdBeats"].fillna(0).to_numpy(dtype=np.int64) + 1
+    expanded = beats.loc[beats.index.repeat(repeats)].drop(columns="holdBeats").reset_index(drop=True)
+    tick = np.arange(len(expanded)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    expanded["timestamp"] = (
+        pd.to_datetime(expanded["timestamp"]).to_numpy().astype("datetime64[s]")
+        + (tick * HEARTBEAT_INTERVAL).astype("timedelta64[s]")
+    )
+    return expanded
+
+
+class SimulatedSession:
+    """
+    One lobby's simulated output before ids are assigned.
+
+    Pool workers produce these with placeholder team indices (0..n_teams-1)
+    in `batch.team_ids` and no session id, so the parent process can hand out
+    real (possibly surrogate) keys in a deterministic order.
+
+    Args:
+        session_start: Session start (naive UTC datetime).
+        session_end: Session end (naive UTC datetime).
+        batch: HeartbeatBatch for the lobby; `batch.player_ids` defines player order.
+        durations: int array of per-player session lengths, in player order.
+        kills: int array of per-player kills, in player order.
+        deaths: int array of per-player deaths, in player order.
+        n_teams: Number of teams in the lobby.
+    """
+
+    __slots__ = ("session_start", "session_end", "batch", "durations", "kills", "deaths", "n_teams")
+
+    def __init__(self, session_start, session_end, batch, durations, kills, deaths, n_teams):
+        self.session_start = session_start
+        self.session_end = session_end
+        self.batch = batch
+        self.durations = durations
+        self.kills = kills
+        self.deaths = deaths
+        self.n_teams = n_teams
+
+    def assign_ids(self, session_id, team_ids):
+        """Swap placeholder ids for real session/team ids."""
+        self.batch.session_id = session_id
+        self.batch.team_ids = [team_ids[t] for t in self.batch.team_ids]
+
+
+class SessionSummary:
+    """
+    One player's end-of-session summary row (the `fact_session` grain).
+
+    `event_datetime` is the session end as a naive UTC datetime.
+    """
+
+    __slots__ = ("player_id", "session_id", "event_datetime", "country", "event_length_seconds", "kills", "deaths")
+
+    def __init__(self, player_id, session_id, event_datetime, country, event_length_seconds, kills, deaths):
+        self.player_id = player_id
+        self.session_id = session_id
+        self.event_datetime = event_datetime
+        self.country = country
+        self.event_length_seconds = event_length_seconds
+        self.kills = kills
+        self.deaths = deaths
+
+
+def summaries_to_frame(summaries: list[SessionSummary]) -> pd.DataFrame:
+    """
+    Column-wise conversion of SessionSummary rows to the typed `fact_session` layout.
+
+    `eventDateTime` is datetime64[s] (TIMESTAMP), `eventLengthSeconds` int32
+    (INTEGER), kills/deaths int16 (SMALLINT) and `country` a categorical, so
+    no column reaches DuckDB or Parquet as strings or Python objects.
+    """
+    n = len(summaries)
+    return pd.DataFrame({
+        "playerId": [s.player_id for s in summaries],
+        "sessionId": [s.session_id for s in summaries],
+        "eventDateTime": np.array([s.event_datetime for s in summaries], dtype="datetime64[s]"),
+        "country": pd.Categorical([s.country for s in summaries]),
+        "eventLengthSeconds": np.fromiter((s.event_length_seconds for s in summaries), dtype=np.int32, count=n),
+        "kills": np.fromiter((s.kills for s in summaries), dtype=np.int16, count=n),
+        "deaths": np.fromiter((s.deaths for s in summaries), dtype=np.int16, count=n),
+    })
@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from live import DEFAULT_INTERVAL_SECONDS, DEFAULT_MAX_BATCH, DEFAULT_QUEUE_SIZE, EmitterStats, _with_event_time, emit_frames
+from records import expand_held_beats
+from utils import SESSION_PATH
+
+DEFAULT_WINDOW_SECONDS = 60   # simulated seconds merged per heap step
+DEFAULT_FRAME_ROWS = 50_000    # beats gathered before a frame is handed to the emitter
+
+# Session ids and times sit at the top of every session file (legacy files use snake_case)
+HEAD_BYTES = 512
+_HEAD_FIELD = re.compile(rb'"(sessionId|session_id|startTime|start_time|endTime|end_time)"\s*:\s*"([^"]*)"')
+
+HEARTBEAT_FIELDS = ["timestamp", "playerId", "sessionId", "teamId", "positionX", "positionY", "positionZ"]
+
+
+def _epoch_seconds(value) -> int:
+    """ISO string (naive = UTC) or datetime -> int epoch seconds."""
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return int(ts.value // 1_000_000_000)
+
+
+class ReplaySession:
+    """
+    Index entry for one stored session: its time range and how to load it.
+
+    Only the entries are held for a whole replay; heartbeats are loaded when
+    the replay reaches `start` and released once the session is exhausted.
+
+    Args:
+        session_id: Session identifier.
+        start: Session start as int epoch seconds (no beat precedes it).
+        end: Session end as int epoch seconds.
+        load: Zero-argument callable returning the session's heartbeat
+            DataFrame (HEARTBEAT_FIELDS layout).
+    """
+
+    __slots__ = ("session_id", "start", "end", "load")
+
+    def __init__(self, session_id, start, end, load):
+        self.session_id = session_id
+        self.start = start
+        self.end = end
+        self.load = load
+
+
+def _in_range(start, start_date, end_date):
+    day = pd.Timestamp(start, unit="s").date()
+    return (start_date is None or day >= start_date) and (end_date is None or day <= end_date)
+
+
+def _date_bounds(start_date, end_date):
+    start_date = pd.Timestamp(start_date).date() if start_date is not None else None
+    end_date = pd.Timestamp(end_date).date() if end_date is not None else start_date
+    return start_date, end_date
+
+
+def _load_session_file(path: Path) -> pd.DataFrame:
+    # Adaptively sampled files are expanded back to one beat per tick
+    beats = expand_held_beats(pd.DataFrame(json.loads(path.read_text()).get("heartbeats", [])))
+    beats = beats.reindex(columns=HEARTBEAT_FIELDS)
+    beats["timestamp"] = (
+        pd.to_datetime(beats["timestamp"], utc=True).dt.tz_localize(None).to_numpy().astype("datetime64[s]")
+    )
+    return beats
+
+
+def index_session_files(session_dir: Path = SESSION_PATH, start_date=None, end_date=None) -> list[ReplaySession]:
+    """
+    Index the session JSON files under `session_dir`, ordered by start time.
+
+    Only the first HEAD_BYTES of each file are read, so indexing a large
+    directory stays cheap; files without a readable header are skipped.
+    """
+    start_date, end_date = _date_bounds(start_date, end_date)
+    sessions = []
+    for path in Path(session_dir).glob("*.json"):
+        with open(path, "rb") as f:
+            head = dict((k.decode(), v.decode()) for k, v in _HEAD_FIELD.findall(f.read(HEAD_BYTES)))
+        start = head.get("startTime") or head.get("start_time")
+        if start is None:
+            print(f"⚠️ Skipping {path.name}: no session header")
+            continue
+        start = _epoch_seconds(start)
+        if not _in_range(start, start_date, end_date):
+            continue
+        end = head.get("endTime") or head.get("end_time")
+        sessions.append(ReplaySession(
+            head.get("sessionId") or head.get("session_id"), start,
+            _epoch_seconds(end) if end else start,
+            lambda path=path: _load_session_file(path),
+        ))
+    sessions.sort(key=lambda s: s.start)
+    return sessions
+
+
+def index_archive(archive, start_date=None, end_date=None) -> list[ReplaySession]:
+    """Index an `archive.SessionArchive` (faster loads: memory-mapped, no JSON parsing)."""
+    start_date, end_date = _date_bounds(start_date, end_date)
+    sessions = []
+    for session_id in archive.session_ids():
+        entry = archive.entry(session_id)
+        start = _epoch_seconds(entry["startTime"])
+        if _in_range(start, start_date, end_date):
+            sessions.append(ReplaySession(
+                session_id, start, _epoch_seconds(entry["endTime"]),
+                lambda session_id=session_id: archive.read(session_id).to_frame(),
+            ))
+    sessions.sort(key=lambda s: s.start)
+    return sessions
+
+
+def merge_sessions(
+    sessions: list[ReplaySession],
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+    frame_rows: int = DEFAULT_FRAME_ROWS,
+):
+    """
+    K-way heap merge of stored sessions into one timestamp-ordered stream.
+
+    The heap holds one cursor per open session, keyed by its next beat. Each
+    step pops every session with beats in the next `window_seconds`, slices
+    those beats off with a binary search and pushes the session back at its
+    next beat. Sessions are loaded only when the window reaches their start
+    and dropped when exhausted, so memory is bounded by the sessions live at
+    the same time plus one frame, not by the replay length.
+
+    Args:
+        sessions: ReplaySession entries sorted by `start`.
+        window_seconds: Simulated seconds taken per heap step.
+        frame_rows: Steps are gathered until a frame holds this many beats,
+            so sparse stretches do not produce many tiny frames.
+
+    Yields:
+        `{"heartbeat": DataFrame}` frames (with the int64 `ts` column), in
+        order and non-overlapping, as accepted by `live.LiveEmitter.run`.
+    """
+    pending = iter(sessions)
+    upcoming = next(pending, None)
+    heap = []  # (next beat ts, tie-breaker, ts array, frame, position)
+    order = 0
+    parts, rows = [], 0
+
+    while heap or upcoming is not None:
+        window_start = min(heap[0][0] if heap else np.iinfo(np.int64).max, upcoming.start if upcoming else np.iinfo(np.int64).max)
+        window_end = window_start + window_seconds
+
+        while upcoming is not None and upcoming.start < window_end:
+            frame = upcoming.load()
+            times = frame["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64)
+            if len(times) and np.any(times[1:] < times[:-1]):
+                keep = np.argsort(times, kind="stable")
+                frame, times = frame.iloc[keep].reset_index(drop=True), times[keep]
+            if len(times):
+                heapq.heappush(heap, (int(times[0]), order, times, frame, 0))
+                order += 1
+            upcoming = next(pending, None)
+
+        while heap and heap[0][0] < window_end:
+            _, tie, times, frame, pos = heapq.heappop(heap)
+            stop = pos + int(np.searchsorted(times[pos:], window_end, side="left"))
+            parts.append(frame.iloc[pos:stop])
+            rows += stop - pos
+            if stop < len(times):
+                heapq.heappush(heap, (int(times[stop]), tie, times, frame, stop))
+        if rows >= frame_rows:
+            yield _merged_frame(parts)
+            parts, rows = [], 0
+    if parts:
+        yield _merged_frame(parts)
+
+
+def _merged_frame(parts):
+    # Parts are ordered window by window; the stable sort interleaves sessions within each window
+    return {"heartbeat": _with_event_time(pd.concat(parts, ignore_index=True), "timestamp")}
+
+
+async def _windows_in_thread(windows):
+    """Produce each merged frame in a worker thread so file loads never block the sink."""
+    while True:
+        window = await asyncio.to_thread(next, windows, None)
+        if window is None:
+            return
+        yield window
+
+
+async def replay_sessions(
+    sessions: list[ReplaySession],
+    target: str = "-",
+    speed: float = 60.0,
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+    frame_rows: int = DEFAULT_FRAME_ROWS,
+    interval: float = DEFAULT_INTERVAL_SECONDS,
+    max_batch: int = DEFAULT_MAX_BATCH,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> EmitterStats:
+    """
+    Re-emit stored sessions' heartbeats in timestamp order at `speed`.
+
+    Output, pacing and backpressure are the live emitter's (`live.py`), so a
+    replay can feed `ingest.ingest_events` or any other consumer.
+
+    Args:
+        sessions: From `index_session_files` or `index_archive`.
+        target: Sink spec, see `live.open_sink`.
+        speed: Simulated seconds per wall second (None = as fast as possible).
+        window_seconds / frame_rows: See `merge_sessions`.
+        interval / max_batch / queue_size: See `live.LiveEmitter`.
+    """
+    print(f"⏪ Replaying {len(sessions)} sessions...")
+    return await emit_frames(
+        _windows_in_thread(merge_sessions(sessions, window_seconds, frame_rows)), target,
+        speed=speed, interval=interval, max_batch=max_batch, queue_size=queue_size,
+    )
@@ -1,12 +1,16 @@
-import uuid
-import random
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
 import pandas as pd
 
-from heartbeat_generator import simulate_heartbeats, STEP_FUNCTIONS
+from heartbeat_generator import simulate_heartbeat_batch, STEP_FUNCTIONS
+from keys import KeyAllocator
+from matchmaking import schedule_lobbies
 from loader import write_json_record_to_duckdb, clear_old_data, write_dataframe_to_table
+from records import HeartbeatBatch, SessionSummary, SimulatedSession, summaries_to_frame
+from trajectory import LOD_TABLE, MOVEMENT_TABLE, movement_stats, simplify_levels
 from utils import (
     SESSION_PATH,
     SESSION_MAX_DURATION_SECONDS,
@@ -15,113 +19,75 @@ from utils import (
     MIN_PLAYERS_PER_TEAM,
     MAX_PLAYERS_PER_TEAM,
     MIN_DAILY_SESSIONS,
-    MAX_DAILY_SESSIONS
+    MAX_DAILY_SESSIONS,
+    RANDOM_SEED,
+    REGIONS,
+    players_by_day,
 )
 
-def clear_sessions(duck_conn):
-    clear_old_data(duck_conn, level="sessions")
+# Lake tables rewritten by a sessions run (mirrors the "sessions" clear level)
+SESSION_LAKE_TABLES = ("event_session", "fact_session", "fact_player_session_movement", "event_heartbeat_lod")
 
-def get_players_grouped_by_day(signins_df):
-    return signins_df.groupby("date")["playerId"].apply(list)
+def clear_sessions(duck_conn, start_date=None, end_date=None):
+    return clear_old_data(duck_conn, level="sessions", start_date=start_date, end_date=end_date)
 
-def assign_sessions_per_player(players, min_sessions=MIN_DAILY_SESSIONS, max_sessions=MAX_DAILY_SESSIONS):
+def generate_session_times(date, n_sessions, rng=None):
     """
-    Assign a random number of sessions per player for the day.
-    """
-    return {pid: random.randint(min_sessions, max_sessions) for pid in players}
-
-def create_sessions_schedule(player_sessions_map):
-    """
-    Given a dict player->num_sessions,
-    create a schedule mapping session_id -> list_of_players,
-    so all players appear in exactly their assigned sessions.
-    """
-    # Total sessions needed = max number of sessions any player has to do,
-    # but can be more to accommodate team sizes, we'll dynamically create session buckets.
-    
-    # Build a list of players repeated by their session counts
-    players_needed = []
-    for pid, count in player_sessions_map.items():
-        players_needed.extend([pid] * count)
-    random.shuffle(players_needed)
-
-    sessions = []  # list of player lists
+    Draw start/end times for all of a day's sessions at once.
 
-    # To build sessions, greedily pack players into sessions with max team size constraint:
-    max_session_size = MAX_TEAMS * MAX_PLAYERS_PER_TEAM
-
-    # We'll fill sessions one by one:
-    while players_needed:
-        session_players = players_needed[:max_session_size]
-        players_needed = players_needed[max_session_size:]
-        sessions.append(session_players)
-
-    # sessions is list of lists, each is one session's players
-    return sessions
-
-def generate_team_structure(players):
-    """
-    Given a list of players assigned to a session,
-    create teams randomly with players_per_team.
+    Returns:
+        Two datetime64[s] arrays (starts, ends) of length n_sessions.
     """
-    num_teams = np.random.randint(MIN_TEAMS, MAX_TEAMS + 1)
-    players_per_team = np.random.randint(MIN_PLAYERS_PER_TEAM, MAX_PLAYERS_PER_TEAM + 1)
-    total_players_needed = num_teams * players_per_team
-
-    # If not enough players, adjust team count or players per team:
-    if len(players) < total_players_needed:
-        # Try fewer teams or fewer players per team to fit:
-        # Greedy approach: reduce teams first
-        while num_teams > 1 and num_teams * players_per_team > len(players):
-            num_teams -= 1
-        # If still too many, reduce players per team
-        while players_per_team > 1 and num_teams * players_per_team > len(players):
-            players_per_team -= 1
-
-    total_players = num_teams * players_per_team
-    players_selected = players[:total_players]
-
-    team_ids = [str(uuid.uuid4()) for _ in range(num_teams)]
-    teams = {
-        team_ids[i]: players_selected[i * players_per_team : (i + 1) * players_per_team]
-        for i in range(num_teams)
-    }
-
-    return players_selected, team_ids, teams
-
-def generate_session_times(date):
-    session_start = datetime.combine(pd.to_datetime(date), datetime.min.time()) + timedelta(
-        seconds=random.randint(0, 60 * 60 * 12)
-    )
-    session_end = session_start + timedelta(seconds=SESSION_MAX_DURATION_SECONDS)
-    return session_start, session_end
-
-def assign_behavior_and_speed(players):
+    rng = rng or np.random
+    day_start = np.datetime64(pd.Timestamp(date).date(), "s")
+    session_starts = day_start + rng.randint(0, 60 * 60 * 12 + 1, size=n_sessions).astype("timedelta64[s]")
+    session_ends = session_starts + np.timedelta64(SESSION_MAX_DURATION_SECONDS, "s")
+    return session_starts, session_ends
+
+def assign_behavior_and_speed(players, rng=None):
+    rng = rng or np.random
     behavior_types = list(STEP_FUNCTIONS.keys())
-    behavior_map = {pid: random.choice(behavior_types) for pid in players}
-    speed_map = {pid: np.random.randint(1, 4) for pid in players}
-    durations = {pid: np.random.randint(120, SESSION_MAX_DURATION_SECONDS + 1) for pid in players}
+    behavior_map = {pid: behavior_types[rng.randint(len(behavior_types))] for pid in players}
+    speed_map = {pid: rng.randint(1, 4) for pid in players}
+    durations = {pid: rng.randint(120, SESSION_MAX_DURATION_SECONDS + 1) for pid in players}
     return behavior_map, speed_map, durations
 
-def generate_kill_death_distribution(players):
-    total_kills = np.random.randint(10, 60)
+def generate_kill_death_distribution(players, rng=None):
+    rng = rng or np.random
+    total_kills = rng.randint(10, 60)
     total_deaths = total_kills
-    kill_dist = np.random.multinomial(total_kills, np.random.dirichlet(np.ones(len(players))))
-    death_dist = np.random.multinomial(total_deaths, np.random.dirichlet(np.ones(len(players))))
+    kill_dist = rng.multinomial(total_kills, rng.dirichlet(np.ones(len(players))))
+    death_dist = rng.multinomial(total_deaths, rng.dirichlet(np.ones(len(players))))
     return kill_dist, death_dist
 
 def write_session_to_disk(
     session_id: str,
     session_start: datetime,
     session_end: datetime,
-    heartbeat_data: list,
+    heartbeat_data: "list | HeartbeatBatch",
     duck_conn,
     session_dir: Path,
+    write_to_db: bool = True,
+    heartbeat_epsilon: float = None,
 ):
+    """
+    Write a session's JSON file and (unless write_to_db=False) its
+    `sprint_raw.event_session` row. Returns the event_session row as a dict.
+
+    With `heartbeat_epsilon` set, a HeartbeatBatch is written adaptively
+    sampled (`HeartbeatBatch.thin`): unmoved beats are dropped and the kept
+    ones carry `holdBeats`, which dbt forward-fills in `stage_centroids`.
+    """
     if session_id is None:
         print("⚠️ No session_id provided, skipping write_session_to_disk.")
         return
 
+    # Heartbeat timestamps are only formatted here, at the JSON sink
+    if isinstance(heartbeat_data, HeartbeatBatch):
+        if heartbeat_epsilon is not None:
+            heartbeat_data = heartbeat_data.thin(heartbeat_epsilon)
+        heartbeat_data = heartbeat_data.to_records()
+
     session_json = {
         "sessionId": session_id,
         "startTime": session_start.isoformat(),
@@ -129,7 +95,7 @@ def write_session_to_disk(
         "heartbeats": heartbeat_data,
     }
 
-    write_json_record_to_duckdb(
+    return write_json_record_to_duckdb(
         duck_conn=duck_conn,
         schema="sprint_raw",
         table="event_session",
@@ -138,18 +104,247 @@ def write_session_to_disk(
         json_obj=session_json,
         directory=session_dir,
         created_at_col="createdAt",
-        write_to_db=True,
+        write_to_db=write_to_db,
     )
 
-def save_session_summaries(summary_df, duck_conn):
+def save_session_summaries(summary_df, duck_conn, replace=True):
     write_dataframe_to_table(
         duck_conn=duck_conn,
         schema="sprint_stage",
         table="fact_session",
         df=summary_df,
         primary_key=None,
-        replace=True,
+        replace=replace,
+    )
+
+def partition_player_pools(players, country_map, pool_by="country"):
+    """
+    Split a day's players into independent matchmaking pools.
+
+    Args:
+        players: Array of player ids signed on for the day.
+        country_map: playerId -> country code.
+        pool_by: "country", "region" (see utils.REGIONS) or None for one global pool.
+
+    Returns:
+        dict of pool key -> object array of player ids.
+    """
+    players = np.asarray(players, dtype=object)
+    if pool_by is None:
+        return {"ALL": players}
+
+    labels = np.array([country_map.get(pid, "Unknown") for pid in players], dtype=object)
+    if pool_by == "region":
+        labels = np.array([REGIONS.get(c, "Unknown") for c in labels], dtype=object)
+    elif pool_by != "country":
+        raise ValueError(f"Unknown pool_by '{pool_by}', expected 'country', 'region' or None")
+
+    labels = labels.astype(str)
+    order = np.argsort(labels, kind="stable")
+    keys, starts = np.unique(labels[order], return_index=True)
+    return dict(zip(keys.tolist(), np.split(players[order], starts[1:])))
+
+def pool_seed(date, pool_key, base_seed=RANDOM_SEED) -> int:
+    """
+    Deterministic per-(day, pool) seed, so a pool's output does not depend
+    on which worker runs it or in what order.
+    """
+    day = pd.Timestamp(date).toordinal()
+    key = zlib.crc32(str(pool_key).encode())
+    return int(np.random.SeedSequence([base_seed, day, key]).generate_state(1)[0])
+
+def simulate_pool_sessions(
+    date,
+    players,
+    seed,
+    min_sessions_per_player=MIN_DAILY_SESSIONS,
+    max_sessions_per_player=MAX_DAILY_SESSIONS,
+    lobby_shapes=None,
+) -> list[SimulatedSession]:
+    """
+    Build lobbies within one pool and simulate their heartbeats.
+
+    Pure function of its arguments (no DuckDB, no disk), so pools can run in
+    separate worker processes. Every draw comes from a RandomState seeded
+    with `seed`; the global RNGs are never touched, so a serial run leaves
+    the caller's later draws (e.g. transactions) exactly as a parallel one.
+    Ids are left as placeholders; see SimulatedSession.assign_ids.
+    """
+    rng = np.random.RandomState(seed)
+    players = np.asarray(players, dtype=object)
+
+    # Assign how many sessions each player plays this day
+    session_counts = rng.randint(
+        min_sessions_per_player, max_sessions_per_player + 1, size=len(players)
+    )
+
+    # Pack players into lobbies (compact index arrays into players)
+    schedule = schedule_lobbies(session_counts, shapes=lobby_shapes, rng=rng)
+    session_starts, session_ends = generate_session_times(date, len(schedule), rng)
+
+    sessions = []
+    for session_idx in range(len(schedule)):
+        team_members = schedule.lobby_teams(session_idx)
+        players_selected = players[schedule.lobby_players(session_idx)].tolist()
+        behavior_map, speed_map, durations = assign_behavior_and_speed(players_selected, rng)
+
+        player_to_team = {
+            pid: team for team, members in enumerate(team_members) for pid in players[members]
+        }
+        session_start = session_starts[session_idx].item()
+
+        heartbeat_batch = simulate_heartbeat_batch(
+            player_ids=players_selected,
+            session_id=None,
+            team_ids=player_to_team,
+            session_start=session_start,
+            speed_map=speed_map,
+            durations=durations,
+            behavior_map=behavior_map,
+            rng=rng,
+        )
+
+        kill_dist, death_dist = generate_kill_death_distribution(players_selected, rng)
+
+        sessions.append(
+            SimulatedSession(
+                session_start=session_start,
+                session_end=session_ends[session_idx].item(),
+                batch=heartbeat_batch,
+                durations=np.array([durations[pid] for pid in players_selected]),
+                kills=kill_dist,
+                deaths=death_dist,
+                n_teams=len(team_members),
+            )
+        )
+
+    return sessions
+
+def simulate_day_sessions(
+    date,
+    players_today,
+    country_map,
+    min_sessions_per_player=MIN_DAILY_SESSIONS,
+    max_sessions_per_player=MAX_DAILY_SESSIONS,
+    keys: KeyAllocator = None,
+    lobby_shapes=None,
+    pool_by="country",
+    executor=None,
+):
+    """
+    Simulate one day's pools and hand out session/team ids in pool order.
+
+    Pools are simulated through `executor` (any object with a `map` method,
+    e.g. a ProcessPoolExecutor) or serially when it is None. Nothing is
+    written; batch (`generate_sessions_for_day`) and live (`live.py`) runs
+    share this so both see the same sessions for the same seeds.
+
+    Yields:
+        (session_id, SimulatedSession, list[SessionSummary]) per lobby.
+    """
+    keys = keys or KeyAllocator()
+    pools = partition_player_pools(players_today, country_map, pool_by)
+    print(f"Generating sessions for {date}: {len(players_today)} players in {len(pools)} pools.")
+
+    seeds = [pool_seed(date, pool_key) for pool_key in pools]
+    args = (
+        [date] * len(pools), list(pools.values()), seeds,
+        [min_sessions_per_player] * len(pools), [max_sessions_per_player] * len(pools),
+        [lobby_shapes] * len(pools),
+    )
+    pool_results = executor.map(simulate_pool_sessions, *args) if executor else map(simulate_pool_sessions, *args)
+
+    for pool_sessions in pool_results:
+        for sim in pool_sessions:
+            session_id = keys.new_ids("session", 1)[0]
+            sim.assign_ids(session_id, keys.new_ids("team", sim.n_teams, session_id))
+            summaries = [
+                SessionSummary(
+                    player_id=pid,
+                    session_id=session_id,
+                    event_datetime=sim.session_end,
+                    country=country_map.get(pid, "Unknown"),
+                    event_length_seconds=sim.durations[i],
+                    kills=sim.kills[i],
+                    deaths=sim.deaths[i],
+                )
+                for i, pid in enumerate(sim.batch.player_ids)
+            ]
+            yield session_id, sim, summaries
+
+def generate_sessions_for_day(
+    date,
+    players_today,
+    country_map,
+    duck_conn,
+    session_dir: Path = SESSION_PATH,
+    min_sessions_per_player=MIN_DAILY_SESSIONS,
+    max_sessions_per_player=MAX_DAILY_SESSIONS,
+    keys: KeyAllocator = None,
+    lobby_shapes=None,
+    pool_by="country",
+    executor=None,
+    archive=None,
+    lake=None,
+    heartbeat_epsilon: float = None,
+) -> list[SessionSummary]:
+    """
+    Simulate, id and write one day's sessions.
+
+    Sessions come from `simulate_day_sessions`. Heartbeats are written to
+    disk/DuckDB (and `archive`) here; the day's summary rows are returned for
+    the caller to write once at the end.
+
+    With a `lake.ParquetLake`, the day's event_session, fact_session,
+    movement and level-of-detail rows go to its date partition instead of DuckDB.
+    `heartbeat_epsilon` enables adaptive heartbeat sampling in the session
+    JSON (see `write_session_to_disk`); the archive always receives every beat.
+
+    Per player-session movement statistics (`trajectory.movement_stats`) and
+    path levels of detail (`trajectory.simplify_levels`) are computed from
+    each full-rate batch while it is in memory and appended to
+    `sprint_stage.fact_player_session_movement` / `event_heartbeat_lod` (or
+    the lake) once per day.
+    """
+    summaries, session_rows, movement, lod = [], [], [], []
+    day_sessions = simulate_day_sessions(
+        date, players_today, country_map, min_sessions_per_player, max_sessions_per_player,
+        keys=keys, lobby_shapes=lobby_shapes, pool_by=pool_by, executor=executor,
     )
+    for session_id, sim, session_summaries in day_sessions:
+        summaries.extend(session_summaries)
+        session_rows.append(write_session_to_disk(
+            session_id=session_id,
+            session_start=sim.session_start,
+            session_end=sim.session_end,
+            heartbeat_data=sim.batch,
+            duck_conn=duck_conn,
+            session_dir=session_dir,
+            write_to_db=lake is None,
+            heartbeat_epsilon=heartbeat_epsilon,
+        ))
+        if archive is not None:
+            archive.append(session_id, sim.session_start, sim.session_end, sim.batch)
+        movement.append(movement_stats(sim.batch, sim.session_end))
+        lod.append(simplify_levels(sim.batch))
+
+    movement_df = pd.concat(movement, ignore_index=True) if movement else pd.DataFrame()
+    lod_df = pd.concat(lod, ignore_index=True) if lod else pd.DataFrame()
+    if lake is None:
+        for table, df in ((MOVEMENT_TABLE, movement_df), (LOD_TABLE, lod_df)):
+            if not df.empty:
+                write_dataframe_to_table(duck_conn, *table, df, replace=False)
+
+    if lake is not None:
+        sessions_df = pd.DataFrame(session_rows)
+        if not sessions_df.empty:
+            sessions_df["createdAt"] = pd.to_datetime(sessions_df["createdAt"], utc=True).dt.tz_localize(None)
+        lake.write("event_session", sessions_df, date)
+        lake.write("fact_session", summaries_to_frame(summaries), date)
+        lake.write("fact_player_session_movement", movement_df, date)
+        lake.write("event_heartbeat_lod", lod_df, date)
+
+    return summaries
 
 def generate_sessions(
     signins_df,
@@ -158,69 +353,81 @@ def generate_sessions(
     session_dir: Path = SESSION_PATH,
     min_sessions_per_player=MIN_DAILY_SESSIONS,
     max_sessions_per_player=MAX_DAILY_SESSIONS,
+    keys: KeyAllocator = None,
+    lobby_shapes=None,
+    pool_by="country",
+    workers: int = 1,
+    archive=None,
+    start_date=None,
+    end_date=None,
+    lake=None,
+    heartbeat_epsilon: float = None,
 ):
-    session_dir.mkdir(parents=True, exist_ok=True)
-
-    clear_sessions(duck_conn)
-    summaries = []
-
-    players_by_day = get_players_grouped_by_day(signins_df)
-
-    for date, players_today in players_by_day.items():
-        print(f"Generating sessions for {date}: {len(players_today)} players.")
+    """
+    Generate sessions, heartbeats and session summaries for every sign-on day.
 
-        # Assign how many sessions each player plays this day
-        player_sessions_map = assign_sessions_per_player(
-            players_today, min_sessions_per_player, max_sessions_per_player
-        )
+    `signins_df` is a sign-on DataFrame or an iterable of (date, playerIds)
+    pairs, e.g. `loader.iter_signons_by_day` to stream days from DuckDB.
 
-        # Create sessions schedule (list of player lists)
-        sessions_schedule = create_sessions_schedule(player_sessions_map)
-        print(f"Total sessions to generate: {len(sessions_schedule)}")
+    Each day's players are split into matchmaking pools (`pool_by`: "country",
+    "region" or None) and lobbies are built within each pool by
+    `matchmaking.schedule_lobbies`. Pools are simulated independently with
+    their own seeds; with `workers > 1` they run in a process pool and the
+    results are identical to a serial run. Writing to DuckDB stays in this
+    process.
 
-        for session_players in sessions_schedule:
-            session_start, session_end = generate_session_times(date)
+    Pass a surrogate-mode KeyAllocator to emit BIGINT session/team ids; the
+    uuid mapping is written to the key-map tables once generation finishes.
 
-            players_selected, _, teams = generate_team_structure(session_players)
-            behavior_map, speed_map, durations = assign_behavior_and_speed(players_selected)
+    Pass an `archive.SessionArchive` to also append every session to the
+    packed heartbeat archive; the regenerated days are removed from it first.
 
-            player_to_team = {pid: tid for tid, players in teams.items() for pid in players}
+    With `start_date` (and optionally `end_date`) only that window is
+    regenerated: its existing rows are deleted across raw/stage/mart tables
+    (see `loader.invalidate_data`) instead of dropping every table, and days
+    outside the window are skipped.
 
-            session_id = str(uuid.uuid4())
+    With a `lake.ParquetLake`, event_session, fact_session,
+    fact_player_session_movement and event_heartbeat_lod are written as date
+    partitions of the lake instead of DuckDB tables.
 
-            heartbeat_data = simulate_heartbeats(
-                player_ids=players_selected,
-                session_id=session_id,
-                team_ids=player_to_team,
-                session_start=session_start,
-                speed_map=speed_map,
-                durations=durations,
-                behavior_map=behavior_map,
-            )
+    With `heartbeat_epsilon` set, session heartbeats are adaptively sampled:
+    a player's beat is only written once they moved more than epsilon (0 =
+    only drop exact repeats) or the hold reached its maximum interval.
+    """
+    session_dir.mkdir(parents=True, exist_ok=True)
 
-            kill_dist, death_dist = generate_kill_death_distribution(players_selected)
-
-            for i, pid in enumerate(players_selected):
-                summaries.append(
-                    {
-                        "playerId": pid,
-                        "sessionId": session_id,
-                        "eventDateTime": session_end.isoformat(),
-                        "country": country_map.get(pid, "Unknown"),
-                        "eventLengthSeconds": durations[pid],
-                        "kills": kill_dist[i],
-                        "deaths": death_dist[i],
-                    }
-                )
+    windowed = start_date is not None
+    if windowed:
+        start_date = pd.Timestamp(start_date).date()
+        end_date = pd.Timestamp(end_date if end_date is not None else start_date).date()
+    clear_sessions(duck_conn, start_date, end_date)
+    if lake is not None:
+        lake.clear(SESSION_LAKE_TABLES, start_date, end_date)
+    if archive is not None:
+        archive.clear(start_date, end_date)
+    keys = keys or KeyAllocator()
+    summaries = []
 
-            write_session_to_disk(
-                session_id=session_id,
-                session_start=session_start,
-                session_end=session_end,
-                heartbeat_data=heartbeat_data,
-                duck_conn=duck_conn,
-                session_dir=session_dir,
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for date, players_today in players_by_day(signins_df):
+            if windowed and not start_date <= pd.Timestamp(date).date() <= end_date:
+                continue
+            day_summaries = generate_sessions_for_day(
+                date, players_today, country_map, duck_conn, session_dir,
+                min_sessions_per_player, max_sessions_per_player,
+                keys=keys, lobby_shapes=lobby_shapes, pool_by=pool_by,
+                executor=executor, archive=archive, lake=lake, heartbeat_epsilon=heartbeat_epsilon,
             )
-
-    summary_df = pd.DataFrame(summaries)
-    save_session_summaries(summary_df, duck_conn)
+            # The lake already holds each day's summaries
+            if lake is None:
+                summaries.extend(day_summaries)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    if lake is None:
+        summary_df = summaries_to_frame(summaries)
+        save_session_summaries(summary_df, duck_conn, replace=not windowed)
+    keys.save(duck_conn)
@@ -20,7 +20,7 @@ def summarize_session(player_ids, session_id, session_end, durations, country_ma
         summary_rows.append({
             "playerId": pid,
             "sessionId": session_id,
-            "eventDateTime": session_end.isoformat(),
+            "eventDateTime": session_end,
             "country": country_map[pid],
             "eventLengthSeconds": durations[pid],
             "kills": kill_dist[i],
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+from loader import query_table
+from records import HEARTBEAT_COLUMNS, HeartbeatBatch, _key_column
+from utils import GRID_BOUNDS, HEARTBEAT_INTERVAL
+
+# Beats within this many units of a grid face count as time near the map edge
+EDGE_MARGIN = 5.0
+
+# Douglas-Peucker tolerances (grid units) of the stored levels of detail, coarsest first
+LOD_TOLERANCES = (16.0, 4.0, 1.0)
+
+MOVEMENT_TABLE = ("sprint_stage", "fact_player_session_movement")
+LOD_TABLE = ("sprint_stage", "event_heartbeat_lod")
+
+
+def _player_paths(batch: HeartbeatBatch):
+    """Beat order grouped by player then time, plus each player's first row in that order."""
+    order = np.lexsort((batch.timestamp, batch.player_idx))
+    player = batch.player_idx[order]
+    starts = np.flatnonzero(np.r_[True, player[1:] != player[:-1]][:len(order)])
+    return order, starts
+
+
+def movement_stats(batch: HeartbeatBatch, event_datetime) -> pd.DataFrame:
+    """
+    Per player-session movement aggregates in one vectorized pass over a batch.
+
+    Beats are sorted into per-player paths once; step lengths come from one
+    `np.diff` and every aggregate is a `np.*.reduceat` over the path starts,
+    so the cost is a few array passes per session instead of per-heartbeat
+    work downstream.
+
+    Args:
+        batch: The session's full-rate HeartbeatBatch (ids assigned).
+        event_datetime: Session end (naive UTC), the table's date key.
+
+    Returns:
+        DataFrame in the `fact_player_session_movement` layout, one row per
+        player: beats, distance travelled, average and peak speed (units/s),
+        bounding box, seconds within EDGE_MARGIN of a grid face and beats
+        pinned to a face by `clamp_to_bounds`.
+    """
+    order, starts = _player_paths(batch)
+    positions = np.column_stack([batch.position_x, batch.position_y, batch.position_z])[order].astype(np.float64)
+    timestamps = batch.timestamp[order]
+
+    def per_player(values, reducer=np.add):
+        # reduceat rejects empty index arrays
+        return reducer.reduceat(values, starts) if len(starts) else np.zeros(0, dtype=values.dtype)
+
+    # Step i is the move into beat i; a path's first beat has none
+    steps = np.zeros(len(order))
+    steps[1:] = np.sqrt((np.diff(positions, axis=0) ** 2).sum(axis=1))
+    steps[starts] = 0.0
+    distance = per_player(steps)
+    elapsed = per_player(timestamps, np.maximum) - timestamps[starts]
+
+    lower, upper = GRID_BOUNDS
+    near_edge = ((positions <= lower + EDGE_MARGIN) | (positions >= upper - EDGE_MARGIN)).any(axis=1)
+    pinned = ((positions <= lower) | (positions >= upper)).any(axis=1)
+
+    players = batch.player_idx[order][starts]
+    teams = batch.team_idx[order][starts]
+    bbox = {}
+    for axis, col in zip("XYZ", range(3)):
+        bbox[f"min{axis}"] = per_player(positions[:, col], np.minimum).astype(np.float32)
+        bbox[f"max{axis}"] = per_player(positions[:, col], np.maximum).astype(np.float32)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_speed = np.where(elapsed > 0, distance / elapsed, 0.0)
+
+    return pd.DataFrame({
+        "playerId": _key_column(batch.player_ids, players),
+        "sessionId": _key_column([batch.session_id], np.zeros(len(starts), dtype=np.int8)),
+        "teamId": _key_column(batch.team_ids, teams),
+        "eventDateTime": np.full(len(starts), np.datetime64(pd.Timestamp(event_datetime), "s")),
+        "beats": np.diff(np.append(starts, len(order))).astype(np.int32),
+        "distance": distance,
+        "avgSpeed": avg_speed,
+        "maxSpeed": per_player(steps, np.maximum) / HEARTBEAT_INTERVAL,
+        **bbox,
+        "edgeSeconds": (per_player(near_edge.astype(np.int32)) * HEARTBEAT_INTERVAL).astype(np.int32),
+        "pinnedBeats": per_player(pinned.astype(np.int32)).astype(np.int32),
+    })
+
+
+def _segment_distances(positions, first, last, interior):
+    """Distance of each interior beat to the chord between its segment's end beats."""
+    a, b, p = positions[first], positions[last], positions[interior]
+    chord = b - a
+    length = np.sqrt((chord ** 2).sum(axis=1))
+    offset = p - a
+    cross = np.sqrt((np.cross(offset, chord) ** 2).sum(axis=1))
+    # Degenerate chords (the path returned to its start) measure the distance to that point
+    return np.where(length > 0, cross / np.where(length > 0, length, 1.0), np.sqrt((offset ** 2).sum(axis=1)))
+
+
+def dp_significance(positions: np.ndarray, starts: np.ndarray, min_tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker significance of every point of many 3D paths at once.
+
+    All paths are split breadth-first: each round measures every interior
+    point of every open segment against its chord, splits each segment at
+    its farthest point and records that distance, capped by the parent
+    split's, as the point's significance. The cap makes levels nest, so
+    simplifying at tolerance `eps` keeps exactly the points with
+    significance > `eps`, the same points as recursive Douglas-Peucker.
+    Segments stop splitting once no point deviates by more than
+    `min_tolerance`.
+
+    Args:
+        positions: (n, 3) points, paths stored contiguously.
+        starts: First row of each path.
+        min_tolerance: Finest tolerance of interest.
+
+    Returns:
+        float64 array: inf for path end points, 0 for points never split on.
+    """
+    n = len(positions)
+    significance = np.zeros(n)
+    if not n:
+        return significance
+    ends = np.append(starts[1:], n) - 1
+    significance[starts] = significance[ends] = np.inf
+
+    first, last, cap = starts, ends, np.full(len(starts), np.inf)
+    while True:
+        counts = last - first - 1
+        open_ = counts > 0
+        first, last, cap, counts = first[open_], last[open_], cap[open_], counts[open_]
+        if not len(first):
+            return significance
+        # Interior rows of every open segment, concatenated in segment order
+        offsets = np.cumsum(counts) - counts
+        segment = np.repeat(np.arange(len(first)), counts)
+        interior = first[segment] + 1 + np.arange(counts.sum()) - offsets[segment]
+        distance = _segment_distances(positions, first[segment], last[segment], interior)
+
+        farthest = np.maximum.reduceat(distance, offsets)
+        # First interior row reaching the segment's maximum
+        candidate = np.where(distance == farthest[segment], interior, n)
+        split = np.minimum.reduceat(candidate, offsets)
+
+        keep = farthest > min_tolerance
+        first, last, split = first[keep], last[keep], split[keep]
+        cap = np.minimum(farthest[keep], cap[keep])
+        significance[split] = cap
+        first, last, cap = np.concatenate([first, split]), np.concatenate([split, last]), np.concatenate([cap, cap])
+
+
+def lod_level(tolerance: float, tolerances=LOD_TOLERANCES):
+    """Coarsest stored level whose tolerance is within `tolerance`, or None if all are coarser."""
+    levels = [level for level, eps in enumerate(tolerances) if eps <= tolerance]
+    return levels[0] if levels else None
+
+
+def simplify_levels(batch: HeartbeatBatch, tolerances=LOD_TOLERANCES) -> pd.DataFrame:
+    """
+    Nested Douglas-Peucker levels of detail for every player path of a session.
+
+    Each beat is kept once, tagged with `lodLevel`, the coarsest level
+    containing it: level i holds every beat within `tolerances[i]` of the
+    simplified path, and levels 0..i together are the path at that
+    tolerance. Beats only needed below the finest tolerance are dropped;
+    `event_heartbeat` keeps the full rate.
+
+    Args:
+        batch: The session's full-rate HeartbeatBatch (ids assigned).
+        tolerances: Level tolerances in grid units, coarsest first.
+
+    Returns:
+        DataFrame in the `event_heartbeat_lod` layout (`HeartbeatBatch.to_frame`
+        columns plus int8 `lodLevel`), in path order.
+    """
+    order, starts = _player_paths(batch)
+    positions = np.column_stack([batch.position_x, batch.position_y, batch.position_z])[order].astype(np.float64)
+    significance = dp_significance(positions, starts, min(tolerances))
+
+    # Level = number of tolerances the beat's significance does not exceed
+    ascending = np.sort(np.asarray(tolerances, dtype=np.float64))
+    level = len(ascending) - np.searchsorted(ascending, significance, side="left")
+    stored = level < len(ascending)
+    rows = order[stored]
+
+    frame = HeartbeatBatch(
+        batch.session_id, batch.player_ids, batch.team_ids,
+        **{col: getattr(batch, col)[rows] for col in HEARTBEAT_COLUMNS},
+    ).to_frame()
+    frame["lodLevel"] = level[stored].astype(np.int8)
+    return frame
+
+
+def query_lod(duck_conn, tolerance: float, filters: dict = None, columns=None, tolerances=LOD_TOLERANCES):
+    """
+    Paths at the coarsest stored level of detail within `tolerance`.
+
+    Args:
+        tolerance: Largest acceptable deviation from the full-rate path, in grid units.
+        filters / columns: Passed to `loader.query_table`, e.g.
+            `{"sessionId": ids, "timestamp": (">=", day)}`.
+
+    Returns:
+        DuckDBPyRelation ordered by session, player and time.
+
+    Raises:
+        ValueError: If `tolerance` is finer than every stored level; read
+            `event_heartbeat` for full-rate paths.
+    """
+    level = lod_level(tolerance, tolerances)
+    if level is None:
+        raise ValueError(
+            f"No level of detail within {tolerance} units (finest is {min(tolerances)}); "
+            "use event_heartbeat for full-rate paths"
+        )
+    return query_table(
+        duck_conn, *LOD_TABLE, columns=columns,
+        filters={**(filters or {}), "lodLevel": ("<=", level)},
+        order_by=["sessionId", "playerId", "timestamp"],
+    )
@@ -1,9 +1,14 @@
+import heapq
 import random
-from datetime import datetime
+from datetime import timedelta
+
+import duckdb
+import numpy as np
 import pandas as pd
 
-from loader import write_dataframe_to_table
-from utils import convert_numpy_types
+from keys import KeyAllocator
+from loader import invalidate_data, query_table, write_dataframe_to_table
+from utils import CURRENCIES, iso_format, compact_timestamp, load_fx_rates, players_by_day
 
 # Behavior buckets config
 BEHAVIOR_BUCKETS = {
@@ -12,6 +17,24 @@ BEHAVIOR_BUCKETS = {
     "whale": {"prob": 0.05, "min_purchases": 2, "max_purchases": 5, "min_amount": 10, "max_amount": 50},
 }
 
+# Billing cycle length in months, and the chance a subscription cancels at each due renewal
+CYCLE_MONTHS = {"M": 1, "Y": 12}
+CHURN_RATES = {"M": 0.08, "Y": 0.2}
+
+# dbt tables built from the raw transactions and subscription events
+TRANSACTION_MODEL_TABLES = (
+    "sprint_stage.fact_transaction",
+    "sprint_mart.revenue_daily",
+    "sprint_mart.product_revenue_daily",
+    "sprint_mart.country_weekly_revenue",
+    "sprint_mart.subscription_mrr_daily",
+)
+
+# Column layout of sprint_raw.event_subscription
+SUBSCRIPTION_EVENT_COLUMNS = [
+    "subscriptionId", "playerId", "eventDateTime", "eventType", "purchaseItem", "cycle", "purchasePrice", "currency",
+]
+
 def assign_behavior():
     """Randomly assign purchase behavior bucket based on defined probabilities."""
     r = random.random()
@@ -32,68 +55,445 @@ def normalize_cycle_and_recurring(product):
     else:
         return False, ''
 
-def generate_transactions_for_player_day(player_id, date, products_df):
-    """Generate transactions list for a player on a specific day."""
+def purchase_times(date, n):
+    """Draw n purchase timestamps within the given day as int64 epoch seconds."""
+    day_start = np.datetime64(pd.Timestamp(date).date(), "s").astype(np.int64)
+    return day_start + np.random.randint(0, 86400, size=n).astype(np.int64)
+
+def generate_transactions_for_player_day(player_id, date, products_df, country=None):
+    """
+    Generate transactions list for a player on a specific day.
+
+    Prices are charged in the currency of `country` (utils.CURRENCIES, USD
+    without one), like `generate_transactions_for_day`.
+    """
+    currency = CURRENCIES.get(country, "USD")
+    usd_rate = load_fx_rates()[currency]
     bucket = assign_behavior()
     if bucket == "no_purchase":
         return []
 
     cfg = BEHAVIOR_BUCKETS[bucket]
     num_purchases = random.randint(cfg["min_purchases"], cfg["max_purchases"])
+    epochs = purchase_times(date, num_purchases)
+    timestamps = iso_format(epochs)
+    id_stamps = compact_timestamp(epochs)
     transactions = []
 
-    for _ in range(num_purchases):
+    for i in range(num_purchases):
         product = products_df.sample(1).iloc[0]
         amount = round(random.uniform(cfg["min_amount"], cfg["max_amount"]), 2)
-        ts = pd.to_datetime(date) + pd.to_timedelta(random.randint(0, 86399), unit="s")
 
         is_recurring, cycle = normalize_cycle_and_recurring(product)
 
         transactions.append({
-            "transactionId": f"TX-{player_id[:8]}-{ts.strftime('%Y%m%d%H%M%S')}-{random.randint(1000,9999)}",
+            "transactionId": f"TX-{player_id[:8]}-{id_stamps[i]}-{random.randint(1000,9999)}",
             "playerId": player_id,
-            "eventDateTime": ts.isoformat(),
+            "eventDateTime": str(timestamps[i]),
             "purchaseItem": product["productSku"],
-            "purchasePrice": amount,  # USD
-            "currency": "USD",
+            "purchasePrice": round(amount / usd_rate, 2),
+            "currency": currency,
             "isRecurring": is_recurring,
             "cycle": cycle,
             "transactionType": product["transactionType"]
         })
     return transactions
 
-def generate_transactions(signins_df, products_df, duck_conn):
+def _transaction_ids(buyers, epochs, keys: KeyAllocator = None):
     """
-    Generate transactions for all player/day combos and write batch data to DuckDB.
+    Transaction ids for purchases by `buyers` at `epochs`: BIGINT keys in
+    surrogate mode, otherwise "TX-<player prefix>-<stamp>-<random>".
+
+    Returns:
+        (buyers as a Series, transaction ids)
+    """
+    buyers = pd.Series(buyers)
+    if buyers.empty:
+        return buyers, pd.Series([], dtype=object)
+    if keys is not None and keys.surrogate:
+        return buyers.astype(np.int64), keys.transaction_ids(len(buyers))
+    suffix = pd.Series(np.random.randint(1000, 10000, size=len(buyers)).astype(str))
+    return buyers, "TX-" + buyers.str[:8] + "-" + pd.Series(compact_timestamp(epochs)) + "-" + suffix
+
+def add_cycles(epochs, cycles):
+    """Shift epoch seconds forward by one billing cycle (calendar months, day clipped)."""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    cycles = np.asarray(cycles, dtype=object)
+    shifted = np.empty_like(epochs)
+    for cycle, months in CYCLE_MONTHS.items():
+        mask = cycles == cycle
+        if mask.any():
+            moved = pd.DatetimeIndex(epochs[mask].astype("datetime64[s]")) + pd.DateOffset(months=months)
+            shifted[mask] = moved.to_numpy().astype("datetime64[s]").astype(np.int64)
+    return shifted
+
+
+class SubscriptionBook:
+    """
+    Active recurring subscriptions, ordered by their next renewal.
+
+    A heap of (next renewal epoch, subscription slot) pairs is the only
+    ordered structure; the subscription details live in flat per-slot
+    lists. `advance(date)` pops every subscription due that day in one go,
+    decides churn for all of them with a single vectorized draw, emits the
+    renewal transactions and churn events as DataFrames and pushes the
+    survivors back with their next due date. Cost per day is
+    O(due * log(active)), so millions of concurrent subscribers stay cheap.
+
+    Subscriptions start from recurring BattlePass purchases (`subscribe`);
+    the originating transaction id is the subscription id.
+    """
+
+    __slots__ = ("_heap", "subscription_id", "player_id", "sku", "cycle", "price", "currency")
+
+    def __init__(self):
+        self._heap = []
+        self.subscription_id = []
+        self.player_id = []
+        self.sku = []
+        self.cycle = []
+        self.price = []
+        self.currency = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    @classmethod
+    def from_events(cls, events: pd.DataFrame) -> "SubscriptionBook":
+        """
+        Rebuild a book from stored `event_subscription` rows.
+
+        Every subscription whose latest event is a start or renewal is open
+        again, due one cycle after that event; churned ones are gone. Pass
+        the events before a day to resume generation from that day.
+        """
+        book = cls()
+        if events.empty:
+            return book
+        latest = events.sort_values("eventDateTime", kind="stable").groupby("subscriptionId", sort=False).tail(1)
+        active = latest[latest["eventType"] != "churn"]
+
+        epochs = pd.to_datetime(active["eventDateTime"]).to_numpy().astype("datetime64[s]").astype(np.int64)
+        book.subscription_id = active["subscriptionId"].tolist()
+        book.player_id = active["playerId"].tolist()
+        book.sku = active["purchaseItem"].tolist()
+        book.cycle = active["cycle"].tolist()
+        book.price = active["purchasePrice"].tolist()
+        book.currency = active["currency"].tolist()
+        book._heap = list(zip(add_cycles(epochs, active["cycle"].to_numpy()).tolist(), range(len(active))))
+        heapq.heapify(book._heap)
+        return book
+
+    def subscribe(self, df_tx: pd.DataFrame) -> pd.DataFrame:
+        """
+        Open a subscription for each recurring purchase in `df_tx`.
+
+        Returns:
+            `event_subscription` rows with eventType "start".
+        """
+        if df_tx.empty:
+            return pd.DataFrame(columns=SUBSCRIPTION_EVENT_COLUMNS)
+        new = df_tx[df_tx["isRecurring"].astype(bool) & df_tx["cycle"].isin(list(CYCLE_MONTHS))]
+
+        epochs = new["eventDateTime"].to_numpy().astype("datetime64[s]").astype(np.int64)
+        due = add_cycles(epochs, new["cycle"].to_numpy())
+        first = len(self.subscription_id)
+        self.subscription_id.extend(new["transactionId"].tolist())
+        self.player_id.extend(new["playerId"].tolist())
+        self.sku.extend(new["purchaseItem"].tolist())
+        self.cycle.extend(new["cycle"].tolist())
+        self.price.extend(new["purchasePrice"].tolist())
+        self.currency.extend(new["currency"].tolist())
+        for slot, when in zip(range(first, first + len(new)), due.tolist()):
+            heapq.heappush(self._heap, (when, slot))
+        events = new.rename(columns={"transactionId": "subscriptionId"}).assign(eventType="start")
+        return events[SUBSCRIPTION_EVENT_COLUMNS].reset_index(drop=True)
+
+    def advance(self, date, keys: KeyAllocator = None):
+        """
+        Process every renewal due up to the end of `date`.
+
+        Returns:
+            (renewal transactions in the `event_transaction` layout,
+             `event_subscription` rows for the renewals and churns)
+        """
+        day_end = np.datetime64(pd.Timestamp(date).date(), "s").astype(np.int64) + 86400
+        due_at, slots = [], []
+        while self._heap and self._heap[0][0] < day_end:
+            when, slot = heapq.heappop(self._heap)
+            due_at.append(when)
+            slots.append(slot)
+        if not slots:
+            return pd.DataFrame(), pd.DataFrame(columns=SUBSCRIPTION_EVENT_COLUMNS)
+
+        due = pd.DataFrame({
+            "subscriptionId": [self.subscription_id[i] for i in slots],
+            "playerId": [self.player_id[i] for i in slots],
+            "eventDateTime": np.array(due_at, dtype=np.int64).astype("datetime64[s]"),
+            "purchaseItem": [self.sku[i] for i in slots],
+            "cycle": [self.cycle[i] for i in slots],
+            "purchasePrice": np.array([self.price[i] for i in slots], dtype=np.float64),
+            "currency": [self.currency[i] for i in slots],
+        })
+        churn_rate = np.array([CHURN_RATES[c] for c in due["cycle"]], dtype=np.float64)
+        churned = np.random.random(len(due)) < churn_rate
+
+        renewed = due[~churned]
+        renewed_epochs = renewed["eventDateTime"].to_numpy().astype(np.int64)
+        for slot, when in zip(np.asarray(slots)[~churned].tolist(), add_cycles(renewed_epochs, renewed["cycle"]).tolist()):
+            heapq.heappush(self._heap, (when, slot))
+
+        buyers, transaction_ids = _transaction_ids(renewed["playerId"].to_numpy(), renewed_epochs, keys)
+        renewals = pd.DataFrame({
+            "transactionId": transaction_ids,
+            "playerId": buyers,
+            "eventDateTime": renewed["eventDateTime"].to_numpy(),
+            "purchaseItem": renewed["purchaseItem"].to_numpy(),
+            "purchasePrice": renewed["purchasePrice"].to_numpy(),
+            "currency": renewed["currency"].to_numpy(),
+            "isRecurring": True,
+            "cycle": renewed["cycle"].to_numpy(),
+            "transactionType": "BattlePass",
+        })
+        events = pd.concat([
+            renewed.assign(eventType="renewal"),
+            due[churned].assign(eventType="churn"),
+        ], ignore_index=True)
+        return renewals, events[SUBSCRIPTION_EVENT_COLUMNS]
+
+
+def generate_transactions_for_day(player_ids, date, products_df, keys: KeyAllocator = None, country_map=None):
+    """
+    Vectorized transaction generation for every signed-on player of one day.
+
+    Behavior buckets, purchase counts, products, amounts and timestamps are all
+    drawn as arrays. `eventDateTime` stays a datetime64 column so typed sinks
+    (DuckDB) never format it; only the transaction id embeds a compact stamp.
+
+    Amounts are drawn in USD and charged in the buyer's local currency
+    (utils.CURRENCIES) at the fx_rates seed rate; dbt converts them back.
 
     Args:
-        signins_df (pd.DataFrame): must have columns ['playerId', 'date']
+        player_ids: Array-like of player ids active on `date`.
+        date: Calendar day of the sign-ons.
         products_df (pd.DataFrame): dim_products catalog
-        duck_conn (duckdb.DuckDBPyConnection)
+        keys (KeyAllocator): surrogate-mode allocator for BIGINT transaction ids
+        country_map (dict): playerId -> country; without it every purchase is in USD
+
+    Returns:
+        pd.DataFrame in the `event_transaction` layout (empty if nobody bought).
     """
-    grouped = signins_df.groupby("date")
-    for date, day_df in grouped:
-        all_transactions = []
-        for _, row in day_df.iterrows():
-            player_id = row["playerId"]
-            txs = generate_transactions_for_player_day(player_id, date, products_df)
-            all_transactions.extend(txs)
+    player_ids = np.asarray(player_ids, dtype=object)
+    buckets = list(BEHAVIOR_BUCKETS)
+    cumulative = np.cumsum([BEHAVIOR_BUCKETS[b]["prob"] for b in buckets])
+    bucket_idx = np.searchsorted(cumulative, np.random.random(len(player_ids)))
 
-        if not all_transactions:
+    counts = np.zeros(len(player_ids), dtype=np.int64)
+    min_amount = np.zeros(len(player_ids))
+    max_amount = np.zeros(len(player_ids))
+    for i, bucket in enumerate(buckets):
+        cfg = BEHAVIOR_BUCKETS[bucket]
+        mask = bucket_idx == i
+        if bucket == "no_purchase" or not mask.any():
             continue
+        counts[mask] = np.random.randint(cfg["min_purchases"], cfg["max_purchases"] + 1, size=mask.sum())
+        min_amount[mask] = cfg["min_amount"]
+        max_amount[mask] = cfg["max_amount"]
+
+    n = int(counts.sum())
+    if n == 0:
+        return pd.DataFrame()
+
+    buyer = np.repeat(np.arange(len(player_ids)), counts)
+    product_idx = np.random.randint(0, len(products_df), size=n)
+    amounts = np.round(np.random.uniform(min_amount[buyer], max_amount[buyer]), 2)
+    epochs = purchase_times(date, n)
+
+    transaction_types = products_df["transactionType"].to_numpy()[product_idx]
+    is_battlepass = np.char.lower(transaction_types.astype(str)) == "battlepass"
+    is_recurring = is_battlepass & products_df["isRecurring"].fillna(False).to_numpy(dtype=bool)[product_idx]
+    cycle = np.where(is_battlepass, products_df["cycle"].fillna("").to_numpy(dtype=object)[product_idx], "")
+
+    if country_map is None:
+        currencies = np.full(n, "USD", dtype=object)
+    else:
+        player_currency = np.array([CURRENCIES.get(country_map.get(pid), "USD") for pid in player_ids], dtype=object)
+        currencies = player_currency[buyer]
+    fx_rates = load_fx_rates()
+    amounts = np.round(amounts / np.array([fx_rates[c] for c in currencies]), 2)
+
+    buyers, transaction_ids = _transaction_ids(player_ids[buyer], epochs, keys)
+
+    return pd.DataFrame({
+        "transactionId": transaction_ids,
+        "playerId": buyers,
+        "eventDateTime": epochs.astype("datetime64[s]"),
+        "purchaseItem": products_df["productSku"].to_numpy()[product_idx],
+        "purchasePrice": amounts,
+        "currency": currencies,
+        "isRecurring": is_recurring,
+        "cycle": cycle,
+        "transactionType": transaction_types,
+    })
+
+def write_transactions_for_day(
+    day_players, date, products_df, duck_conn, keys: KeyAllocator = None, lake=None, country_map=None,
+    subscriptions: SubscriptionBook = None,
+) -> int:
+    """
+    Generate one day's transactions and append them to `sprint_raw.event_transaction`
+    (or to the day's partition of `lake`).
+
+    With a SubscriptionBook, the day's due renewals are charged first and new
+    recurring purchases are subscribed; renewal, churn and start events go
+    to `sprint_raw.event_subscription`.
+
+    Returns:
+        Number of transactions written.
+    """
+    df_tx = generate_transactions_for_day(day_players, date, products_df, keys, country_map)
+    events = []
+    if subscriptions is not None:
+        renewals, renewal_events = subscriptions.advance(date, keys)
+        events = [renewal_events, subscriptions.subscribe(df_tx)]
+        frames = [f for f in (renewals, df_tx) if not f.empty]
+        df_tx = pd.concat(frames, ignore_index=True) if frames else df_tx
+
+    events = [e for e in events if not e.empty]
+    if events:
+        _write_table(pd.concat(events, ignore_index=True), "event_subscription", date, duck_conn, lake)
+    if df_tx.empty:
+        return 0
 
-        df_tx = pd.DataFrame(all_transactions)
+    print(f'Writing transactions for {date}')
+    _write_table(df_tx, "event_transaction", date, duck_conn, lake, primary_key="transactionId")
+    return len(df_tx)
 
-        # Convert numpy types to native Python types before write
-        df_tx = df_tx.map(convert_numpy_types)
+def _stored_rows(duck_conn, table, lake=None, start_date=None, end_date=None) -> pd.DataFrame:
+    """A raw table's rows with `eventDateTime` in [start_date, end_date] (either end open)."""
+    try:
+        if lake is not None:
+            return lake.scan(duck_conn, table, start_date, end_date).df().drop(columns=["date"])
+        rows = query_table(duck_conn, "sprint_raw", table)
+        if start_date is not None:
+            rows = rows.filter(f"eventDateTime::DATE >= DATE '{pd.Timestamp(start_date).date()}'")
+        if end_date is not None:
+            rows = rows.filter(f"eventDateTime::DATE <= DATE '{pd.Timestamp(end_date).date()}'")
+        return rows.df()
+    except (duckdb.CatalogException, duckdb.IOException):
+        return pd.DataFrame()
 
-        print(f'Writing transactions for {date}')
+def load_subscription_book(duck_conn, date, lake=None) -> SubscriptionBook:
+    """Subscriptions open at the start of `date`, from the stored `event_subscription` rows before it."""
+    before = pd.Timestamp(date).date() - timedelta(days=1)
+    return SubscriptionBook.from_events(_stored_rows(duck_conn, "event_subscription", lake, end_date=before))
 
-        write_dataframe_to_table(
-            duck_conn=duck_conn,
-            schema="sprint_raw",
-            table="event_transaction",
-            df=df_tx,
-            primary_key="transactionId",
-            replace=False,  # append daily batches
-        )
+def resume_subscriptions(duck_conn, end_date, subscriptions: SubscriptionBook, keys: KeyAllocator = None, lake=None):
+    """
+    Carry a regenerated window's subscription state through the stored days after it.
+
+    The stored renewals, churns and starts after `end_date` follow the old
+    window's subscriptions. They are deleted together with their renewal
+    charges, and `subscriptions` (the book at the end of the window) is
+    advanced day by day through the last stored day, subscribing each day's
+    stored recurring purchases again. The rewritten days are invalidated in
+    TRANSACTION_MODEL_TABLES, so dbt has to reprocess them too.
+
+    Returns:
+        The rewritten window (see `loader.invalidate_data`), or None if no
+        day after `end_date` is stored.
+    """
+    first = pd.Timestamp(end_date).date() + timedelta(days=1)
+    transactions = _stored_rows(duck_conn, "event_transaction", lake, start_date=first)
+    events = _stored_rows(duck_conn, "event_subscription", lake, start_date=first)
+    if transactions.empty and events.empty:
+        return None
+
+    # Renewal charges are the transactions matching a renewal event
+    charge = ["playerId", "eventDateTime", "purchaseItem", "purchasePrice"]
+    is_renewal = np.zeros(len(transactions), dtype=bool)
+    if not transactions.empty and not events.empty:
+        renewal_keys = events.loc[events["eventType"] == "renewal", charge].drop_duplicates()
+        is_renewal = transactions[charge].merge(renewal_keys, how="left", indicator=True)["_merge"].eq("both").to_numpy()
+    purchases = transactions[~is_renewal]
+    purchases_by_day = (
+        dict(tuple(purchases.groupby(pd.to_datetime(purchases["eventDateTime"]).dt.date))) if not purchases.empty else {}
+    )
+
+    days = pd.concat([
+        pd.to_datetime(frame["eventDateTime"]).dt.date for frame in (transactions, events) if not frame.empty
+    ])
+    last = days.max()
+    if lake is not None:
+        lake.clear(("event_transaction", "event_subscription"), first, last)
+        for day, rows in purchases_by_day.items():
+            lake.write("event_transaction", rows, day)
+    else:
+        if not events.empty:
+            duck_conn.execute("DELETE FROM sprint_raw.event_subscription WHERE eventDateTime::DATE >= ?", [first])
+        if is_renewal.any():
+            duck_conn.register("_stale_renewals", transactions.loc[is_renewal, ["transactionId"]])
+            duck_conn.execute(
+                "DELETE FROM sprint_raw.event_transaction WHERE transactionId IN (SELECT transactionId FROM _stale_renewals)"
+            )
+            duck_conn.unregister("_stale_renewals")
+
+    written = 0
+    for day in pd.date_range(first, last).date:
+        renewals, day_events = subscriptions.advance(day, keys)
+        day_events = [day_events, subscriptions.subscribe(purchases_by_day.get(day, pd.DataFrame()))]
+        day_events = [e for e in day_events if not e.empty]
+        if day_events:
+            _write_table(pd.concat(day_events, ignore_index=True), "event_subscription", day, duck_conn, lake)
+        if not renewals.empty:
+            _write_table(renewals, "event_transaction", day, duck_conn, lake, primary_key="transactionId")
+            written += len(renewals)
+    print(f"🔁 Replayed subscriptions {first} → {last}: {written} renewals")
+    return invalidate_data(duck_conn, TRANSACTION_MODEL_TABLES, first, last, announce=False)
+
+def _write_table(df, table, date, duck_conn, lake=None, primary_key=None):
+    """Append a day's rows to `sprint_raw.<table>`, or to its lake partition."""
+    if lake is not None:
+        lake.write(table, df, date)
+        return
+    write_dataframe_to_table(
+        duck_conn=duck_conn,
+        schema="sprint_raw",
+        table=table,
+        df=df,
+        primary_key=primary_key,
+        replace=False,  # append daily batches
+    )
+
+def generate_transactions(
+    signins_df, products_df, duck_conn, keys: KeyAllocator = None, lake=None, country_map=None,
+    subscriptions: SubscriptionBook = None, start_date=None, end_date=None,
+):
+    """
+    Generate transactions for all player/day combos and write batch data to DuckDB.
+
+    A regenerated window (`start_date`) resumes the subscriptions stored
+    before it and then replays the subscription timeline of the stored days
+    after `end_date` (see `resume_subscriptions`); the window itself must
+    already be cleared. The replayed window is returned (None otherwise) so
+    the dbt invalidation can be extended to it.
+
+    Args:
+        signins_df: DataFrame with columns ['playerId', 'date'], or an iterable of
+            (date, playerIds) such as loader.iter_signons_by_day
+        products_df (pd.DataFrame): dim_products catalog
+        duck_conn (duckdb.DuckDBPyConnection)
+        keys (KeyAllocator): optional; surrogate mode emits BIGINT transaction ids
+        lake (ParquetLake): optional; write date partitions instead of the DuckDB table
+        country_map (dict): optional playerId -> country, for local-currency prices
+        subscriptions (SubscriptionBook): renewal state; by default a fresh book, or
+            the stored state as of `start_date` for a window
+        start_date / end_date: optional regenerated window
+    """
+    if subscriptions is None:
+        subscriptions = SubscriptionBook() if start_date is None else load_subscription_book(duck_conn, start_date, lake)
+    for date, day_players in players_by_day(signins_df):
+        write_transactions_for_day(day_players, date, products_df, duck_conn, keys, lake, country_map, subscriptions)
+    if start_date is not None:
+        return resume_subscriptions(duck_conn, end_date if end_date is not None else start_date, subscriptions, keys, lake)
+    return None
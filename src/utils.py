@@ -1,4 +1,6 @@
 import random
+from datetime import timezone
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
@@ -7,8 +9,13 @@ import pandas as pd
 # ==== Constants ====
 GRID_BOUNDS = (-100, 100)
 HEARTBEAT_INTERVAL = 30  # seconds
+HEARTBEAT_MAX_HOLD_SECONDS = 300  # adaptive sampling: longest gap between a player's written beats
 SESSION_MAX_DURATION_SECONDS = 1800
 COUNTRIES = ['US', 'BR', 'MX', 'FR', 'ES', 'DE']
+# Matchmaking regions (latency zones) per country
+REGIONS = {'US': 'NA', 'MX': 'NA', 'BR': 'SA', 'FR': 'EU', 'ES': 'EU', 'DE': 'EU'}
+# Local purchase currency per country (rates in the fx_rates seed)
+CURRENCIES = {'US': 'USD', 'MX': 'MXN', 'BR': 'BRL', 'FR': 'EUR', 'ES': 'EUR', 'DE': 'EUR'}
 MIN_DAILY_SESSIONS = 0
 MAX_DAILY_SESSIONS = 1
 DEFAULT_STARTING_PLAYERS = 1000
@@ -26,6 +33,7 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 # Paths to important files
 DB_PATH = Path("data/synthetic.duckdb")
 DIM_PRODUCTS_CSV = PROJECT_ROOT / "dbt_project" / "seeds" / "dim_products.csv"
+FX_RATES_CSV = PROJECT_ROOT / "dbt_project" / "seeds" / "fx_rates.csv"
 
 def ensure_path(path):
     path.mkdir(parents=True, exist_ok=True)
@@ -34,6 +42,8 @@ SESSION_PATH = Path("data/sessions")
 ensure_path(SESSION_PATH)
 TRANSACTION_PATH = Path("data/transactions")
 ensure_path(TRANSACTION_PATH)
+ARCHIVE_PATH = Path("data/archive")
+LAKE_PATH = Path("data/lake")
 
 def generate_player_ids(n_players=DEFAULT_STARTING_PLAYERS, seed=RANDOM_SEED):
     random.seed(seed)
@@ -41,30 +51,59 @@ def generate_player_ids(n_players=DEFAULT_STARTING_PLAYERS, seed=RANDOM_SEED):
     ids = np.random.choice(range(n_players), size=n_players, replace=False)
     return [str(i).zfill(4) for i in ids]
 
+SIGN_ON_PATTERNS = ['daily', 'weekday', 'cyclical']
+
+def iter_sign_ons(n_players, n_days=365, start_date="2025-01-01", seed=RANDOM_SEED):
+    """
+    Lazily model daily sign-ons, one day at a time.
+
+    Each player gets a fixed behavior pattern ('daily', 'weekday' or
+    'cyclical'); every day draws one uniform per player against that
+    pattern's sign-on probability. Uses its own seeded RandomState, so the
+    sequence is reproducible and unaffected by other code using the global RNG
+    between days.
+
+    Args:
+        n_players: Number of players (or the player id list itself).
+
+    Yields:
+        (date, int64 array of indices of the players signed on that day)
+    """
+    if not isinstance(n_players, (int, np.integer)):
+        n_players = len(n_players)
+    rng = np.random.RandomState(seed)
+    behaviors = rng.randint(0, len(SIGN_ON_PATTERNS), size=n_players)
+
+    all_dates = pd.date_range(start=pd.to_datetime(start_date), periods=n_days)
+    for i, date in enumerate(all_dates):
+        weekday = date.weekday()
+        x = i / n_days
+        # Probability per pattern, indexed by SIGN_ON_PATTERNS position
+        p = np.array([
+            0.9,
+            0.8 if weekday < 5 else 0.3,
+            0.5 + 0.4 * np.sin(2 * np.pi * x * 4),
+        ])
+        active = rng.random_sample(n_players) < p[behaviors]
+        yield date.date(), np.flatnonzero(active)
+
+def sign_on_days(player_ids, **kwargs):
+    """`iter_sign_ons`, with indices resolved to (date, playerId array)."""
+    player_ids = np.asarray(player_ids, dtype=object)
+    for date, active in iter_sign_ons(len(player_ids), **kwargs):
+        yield date, player_ids[active]
+
 def model_sign_ons(player_ids, n_days=365, start_date="2025-01-01", seed=RANDOM_SEED):
-    random.seed(seed)
-    np.random.seed(seed)
+    """
+    Full sign-on table as a DataFrame (playerId, date).
 
-    start_dt = pd.to_datetime(start_date)
-    all_dates = pd.date_range(start=start_dt, periods=n_days)
-    # Removed 'decay' pattern
-    patterns = ['daily', 'weekday', 'cyclical']
-    behaviors = {pid: random.choice(patterns) for pid in player_ids}
-
-    records = []
-    for pid in player_ids:
-        behavior = behaviors[pid]
-        for i, date in enumerate(all_dates):
-            day = date.weekday()
-            x = i / n_days
-            p = {
-                'daily': 0.9,
-                'weekday': 0.8 if day < 5 else 0.3,
-                'cyclical': 0.5 + 0.4 * np.sin(2 * np.pi * x * 4),
-            }[behavior]
-            if np.random.rand() < p:
-                records.append({"playerId": pid, "date": date.date()})
-    return pd.DataFrame(records)
+    Materializes `iter_sign_ons`; prefer the iterator for long ranges.
+    """
+    days = list(sign_on_days(player_ids, n_days=n_days, start_date=start_date, seed=seed))
+    return pd.DataFrame({
+        "playerId": np.concatenate([players for _, players in days]) if days else [],
+        "date": np.repeat(np.array([date for date, _ in days], dtype=object), [len(p) for _, p in days]),
+    })
 
 
 def assign_countries(player_ids, seed=RANDOM_SEED):
@@ -72,6 +111,125 @@ def assign_countries(player_ids, seed=RANDOM_SEED):
     countries = np.random.choice(COUNTRIES, size=len(player_ids))
     return dict(zip(player_ids, countries))
 
+@lru_cache(maxsize=1)
+def load_fx_rates(path=FX_RATES_CSV):
+    """currency -> USD value of one unit, from the fx_rates seed."""
+    rates = pd.read_csv(path)
+    return dict(zip(rates["currency"], rates["usdRate"]))
+
+def players_by_day(signins):
+    """
+    Iterate (date, playerId array) per day.
+
+    Accepts a sign-on DataFrame (date, playerId) or an iterable of such pairs,
+    e.g. `loader.iter_signons_by_day` streaming straight from DuckDB.
+    """
+    if isinstance(signins, pd.DataFrame):
+        for date, players in signins.groupby("date")["playerId"]:
+            yield date, players.to_numpy()
+    else:
+        yield from signins
+
+def to_epoch_seconds(dt):
+    """
+    Convert a datetime to int64 epoch seconds.
+
+    Naive datetimes are taken as-is (the generators work in naive UTC);
+    aware datetimes are converted to UTC first. numpy datetime64 values
+    are passed through.
+    """
+    if isinstance(dt, np.datetime64):
+        return dt.astype("datetime64[s]").astype(np.int64)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(dt, "s").astype(np.int64)
+
+def _civil_from_days(days):
+    """
+    Vectorized days-since-epoch -> (year, month, day), proleptic Gregorian.
+    """
+    z = days + 719468
+    era = np.floor_divide(z, 146097)
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+# "00".."99" as UCS-4 code point pairs, indexed by value
+_DIGIT_PAIRS = np.array([[ord(c) for c in f"{i:02d}"] for i in range(100)], dtype=np.uint32)
+_COMPACT_COLUMNS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+
+@lru_cache(maxsize=1)
+def _time_of_day_table():
+    """(86400, 8) code points for every "HH:MM:SS" in a day."""
+    secs = np.arange(86400)
+    table = np.empty((86400, 8), dtype=np.uint32)
+    table[:, 0:2] = _DIGIT_PAIRS[secs // 3600]
+    table[:, 2] = ord(":")
+    table[:, 3:5] = _DIGIT_PAIRS[(secs // 60) % 60]
+    table[:, 5] = ord(":")
+    table[:, 6:8] = _DIGIT_PAIRS[secs % 60]
+    return table
+
+def _date_code_points(days):
+    """(n, 11) code points for "YYYY-MM-DDT" per days-since-epoch value."""
+    year, month, day = _civil_from_days(days)
+    out = np.empty((days.size, 11), dtype=np.uint32)
+    out[:, 0:2] = _DIGIT_PAIRS[year // 100]
+    out[:, 2:4] = _DIGIT_PAIRS[year % 100]
+    out[:, 4] = ord("-")
+    out[:, 5:7] = _DIGIT_PAIRS[month]
+    out[:, 7] = ord("-")
+    out[:, 8:10] = _DIGIT_PAIRS[day]
+    out[:, 10] = ord("T")
+    return out
+
+def _iso_code_points(epoch_seconds):
+    """
+    (n, 19) UCS-4 matrix of ISO timestamps, viewable as a numpy U19 array.
+
+    Dates are built once per distinct day in the span and times come from a
+    cached table, so each beat costs two row gathers and no string formatting.
+    """
+    days, secs = np.divmod(epoch_seconds, 86400)
+    out = np.empty((epoch_seconds.size, 19), dtype=np.uint32)
+    if epoch_seconds.size:
+        first_day = days.min()
+        span = days.max() - first_day + 1
+        if span <= epoch_seconds.size:
+            out[:, 0:11] = _date_code_points(np.arange(first_day, first_day + span))[days - first_day]
+        else:
+            out[:, 0:11] = _date_code_points(days)
+        out[:, 11:19] = _time_of_day_table()[secs]
+    return out
+
+def iso_format(epoch_seconds, fast=True):
+    """
+    Format int64 epoch seconds as naive ISO-8601 strings (YYYY-MM-DDTHH:MM:SS).
+
+    The fast path assembles the strings from lookup tables without any
+    per-value formatting; pass fast=False to use numpy's datetime_as_string.
+
+    Returns:
+        np.ndarray of str, same length as the input.
+    """
+    epoch_seconds = np.asarray(epoch_seconds, dtype=np.int64).ravel()
+    if not fast:
+        return np.datetime_as_string(epoch_seconds.astype("datetime64[s]"))
+    return _iso_code_points(epoch_seconds).view("U19").ravel()
+
+def compact_timestamp(epoch_seconds):
+    """
+    Format int64 epoch seconds as YYYYMMDDHHMMSS strings (used in transaction ids).
+    """
+    epoch_seconds = np.asarray(epoch_seconds, dtype=np.int64).ravel()
+    digits = np.ascontiguousarray(_iso_code_points(epoch_seconds)[:, _COMPACT_COLUMNS])
+    return digits.view("U14").ravel()
+
 def convert_numpy_types(obj):
     if isinstance(obj, dict):
         return {k: convert_numpy_types(v) for k, v in obj.items()}
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from codec import EncodedHeartbeats, compression_report, decode_sql, write_encoded_parquet
+from heartbeat_generator import simulate_heartbeat_batch
+
+
+@pytest.fixture
+def batches():
+    players = [f"p{i}" for i in range(6)]
+    behaviors = ["lorentzian", "bezier", "lissajous", "perlin"]
+    return [
+        simulate_heartbeat_batch(
+            players, f"s{s}", {p: f"t{i % 2}" for i, p in enumerate(players)}, datetime(2025, 1, 1, s),
+            {p: 1 + i for i, p in enumerate(players)},
+            {p: 600 + 300 * i for i, p in enumerate(players)},
+            {p: behaviors[(i + s) % 4] for i, p in enumerate(players)},
+        )
+        for s in range(3)
+    ]
+
+
+def sorted_records(batch):
+    return sorted(batch.to_records(), key=lambda r: (r["playerId"], r["timestamp"]))
+
+
+def test_encode_decode_is_exact_at_written_precision(batches):
+    for batch in batches:
+        encoded = EncodedHeartbeats.encode(batch)
+        assert encoded.tick.dtype == np.uint16
+        assert encoded.dx.dtype in (np.int16, np.int32)
+        assert encoded.nbytes < batch.nbytes
+        assert sorted_records(encoded.decode()) == sorted_records(batch)
+
+
+def test_off_grid_timestamps_are_rejected(batches):
+    batch = batches[0]
+    batch.timestamp[3] += 7
+    with pytest.raises(ValueError):
+        EncodedHeartbeats.encode(batch)
+
+
+def test_duckdb_decodes_parquet_layout(batches, tmp_path):
+    path = write_encoded_parquet([EncodedHeartbeats.encode(b) for b in batches], tmp_path / "encoded.parquet")
+    decoded = duckdb.sql(decode_sql(f"read_parquet('{path}')") + " ORDER BY sessionId, playerId, timestamp").df()
+
+    expected = pd.DataFrame([r for b in batches for r in b.to_records()])
+    expected = expected.sort_values(["sessionId", "playerId", "timestamp"]).reset_index(drop=True)
+    assert len(decoded) == len(expected)
+    assert (decoded["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S") == expected["timestamp"]).all()
+    for col in ("positionX", "positionY", "positionZ"):
+        assert np.array_equal(decoded[col].to_numpy(), expected[col].to_numpy())
+
+
+def test_compression_report(batches):
+    report = compression_report(batches)
+    assert report["beats"] == sum(len(b) for b in batches)
+    assert report["encoded_parquet"] < report["parquet"] < report["json"]
+    assert report["vs_json"] > 10 and report["vs_arrays"] > 1
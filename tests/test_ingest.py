@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import duckdb
+
+from ingest import IngestCollector
+
+
+def heartbeat_line(i):
+    return json.dumps({
+        "eventType": "heartbeat", "timestamp": f"2025-01-01T00:00:{i % 60:02d}", "playerId": f"{i:04d}",
+        "sessionId": "s1", "teamId": "t1", "positionX": 1.5, "positionY": 2.5, "positionZ": 0.0,
+    }).encode() + b"\n"
+
+
+def test_ingest_collector_micro_batches_by_size():
+    conn = duckdb.connect(database=":memory:")
+    payload = b"".join(heartbeat_line(i) for i in range(250)) + b'{"eventType": "unknown"}\n'
+
+    class Pieces:
+        """Returns 1000-byte reads, split mid-line, so partial lines carry over."""
+
+        def __init__(self):
+            self.pos = 0
+
+        async def read(self, n):
+            self.pos += 1000
+            return payload[self.pos - 1000:self.pos]
+
+    async def run():
+        reader = Pieces()
+        async with IngestCollector(conn, batch_size=100, flush_interval=60) as collector:
+            await collector.feed(reader)
+        return collector.stats
+
+    stats = asyncio.run(run())
+    assert stats.events == 250 and stats.dropped == 1
+    assert max(stats.batch_sizes) < 200 and sum(stats.batch_sizes) == 250
+    rows = conn.sql("SELECT count(*), min(playerId), max(timestamp) FROM sprint_raw.live_heartbeat").fetchone()
+    assert rows[0] == 250 and rows[1] == "0000"
+    assert conn.sql("DESCRIBE sprint_raw.live_heartbeat").fetchall()[0][:2] == ("timestamp", "TIMESTAMP")
+
+
+def test_ingest_collector_flushes_on_interval():
+    conn = duckdb.connect(database=":memory:")
+
+    async def run():
+        reader = asyncio.StreamReader()
+        async with IngestCollector(conn, batch_size=10_000, flush_interval=0.05) as collector:
+            feeding = asyncio.create_task(collector.feed(reader))
+            reader.feed_data(b"".join(heartbeat_line(i) for i in range(10)))
+            await asyncio.sleep(0.3)
+            # Still connected, but the small batch was flushed by age
+            flushed = conn.sql("SELECT count(*) FROM sprint_raw.live_heartbeat").fetchone()[0]
+            reader.feed_eof()
+            await feeding
+        return flushed, collector.stats
+
+    flushed, stats = asyncio.run(run())
+    assert flushed == 10
+    assert stats.latency(1.0) < 0.3
@@ -0,0 +1,64 @@
+import duckdb
+import numpy as np
+import pytest
+
+from keys import KeyAllocator
+
+
+def test_uuid_mode_keeps_external_ids():
+    keys = KeyAllocator()
+    assert keys.player_keys(["0001", "0002"]) == ["0001", "0002"]
+    session_id = keys.new_ids("session", 1)[0]
+    assert isinstance(session_id, str) and len(session_id) == 36
+
+
+def test_surrogate_mode_emits_dense_bigints_with_mapping():
+    conn = duckdb.connect(database=":memory:")
+    keys = KeyAllocator(surrogate=True)
+
+    assert keys.player_keys(["0007", "0003"]) == [1, 2]
+    assert keys.new_ids("session", 1) == [1]
+    assert keys.new_ids("team", 3, session_id=1) == [1, 2, 3]
+    assert keys.transaction_ids(2).tolist() == [1, 2]
+
+    keys.save(conn)
+    rows = conn.execute("SELECT surrogateKey, externalId FROM sprint_dim.key_map_player ORDER BY 1").fetchall()
+    assert rows == [(1, "0007"), (2, "0003")]
+    assert conn.execute("SELECT count(*) FROM sprint_raw.key_map_team WHERE sessionKey = 1").fetchone()[0] == 3
+
+    # A new allocator on the same database continues the sequences
+    resumed = KeyAllocator(surrogate=True, duck_conn=conn)
+    assert resumed.new_ids("team", 1) == [4]
+    assert resumed.player_keys(["0009"]) == [3]
+
+    # Invalidating a session drops its team mappings with it
+    from loader import invalidate_data
+    invalidate_data(conn, ["sprint_raw.key_map_session", "sprint_raw.key_map_team"], session_ids=[1])
+    assert conn.execute("SELECT count(*) FROM sprint_raw.key_map_team").fetchone()[0] == 0
+
+
+def test_surrogate_transactions_resume_after_lake(tmp_path):
+    import pandas as pd
+    from lake import ParquetLake
+
+    conn = duckdb.connect(database=":memory:")
+    lake = ParquetLake(tmp_path)
+    assert KeyAllocator(surrogate=True, duck_conn=conn, lake=lake).transaction_ids(1).tolist() == [1]
+
+    lake.write("event_transaction", pd.DataFrame({"transactionId": np.array([40, 41], dtype=np.int64)}), "2025-01-01")
+    resumed = KeyAllocator(surrogate=True, duck_conn=conn, lake=lake)
+    assert resumed.transaction_ids(2).tolist() == [42, 43]
+
+
+def test_surrogate_heartbeat_frame_keeps_int_keys():
+    from datetime import datetime
+    from heartbeat_generator import simulate_heartbeat_batch
+
+    batch = simulate_heartbeat_batch(
+        [1, 2], 10, {1: 100, 2: 101}, datetime(2025, 1, 1),
+        {1: 1, 2: 1}, {1: 60, 2: 60}, {1: "lissajous", 2: "bezier"},
+    )
+    frame = batch.to_frame()
+    for col in ("playerId", "sessionId", "teamId"):
+        assert frame[col].dtype == np.int64
+    assert set(frame["teamId"]) == {100, 101}
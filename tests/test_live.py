@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+
+from live import LiveEmitter, _with_event_time, day_events, open_sink
+from utils import DIM_PRODUCTS_CSV
+
+
+def frame(times, **columns):
+    return pd.DataFrame({"timestamp": pd.to_datetime(times).to_numpy().astype("datetime64[s]"), **columns})
+
+
+def day(heartbeats, session_ends):
+    return {
+        "heartbeat": _with_event_time(heartbeats, "timestamp"),
+        "session_end": _with_event_time(session_ends.rename(columns={"timestamp": "eventDateTime"}), "eventDateTime"),
+    }
+
+
+def emit(tmp_path, days, **options):
+    async def run():
+        writer = await open_sink(str(tmp_path / "events.jsonl"))
+        stats = await LiveEmitter(writer, **options).run(days)
+        writer.close()
+        return stats
+
+    stats = asyncio.run(run())
+    lines = (tmp_path / "events.jsonl").read_text().splitlines()
+    return stats, [json.loads(line) for line in lines]
+
+
+def test_events_are_time_ordered_across_types_and_days(tmp_path):
+    # Day 1's session ends after midnight, past day 2's first heartbeat
+    day1 = day(
+        frame(["2025-01-01 23:59:30", "2025-01-01 23:59:00", "2025-01-02 00:00:20"], playerId=["a", "a", "a"]),
+        frame(["2025-01-02 00:00:25"], playerId=["a"]),
+    )
+    day2 = day(
+        frame(["2025-01-02 00:00:10", "2025-01-02 00:00:30"], playerId=["b", "b"]),
+        frame(["2025-01-02 00:00:30"], playerId=["b"]),
+    )
+
+    stats, events = emit(tmp_path, [day1, day2], speed=None, max_batch=2)
+
+    assert stats.events == len(events) == 7
+    stamps = [e.get("timestamp") or e["eventDateTime"] for e in events]
+    assert stamps == sorted(stamps)
+    # Same-second ties: heartbeat before session end
+    assert [e["eventType"] for e in events][-2:] == ["heartbeat", "session_end"]
+    assert [e["playerId"] for e in events][:4] == ["a", "a", "b", "a"]
+
+
+def test_speed_paces_against_wall_clock(tmp_path):
+    beats = frame(["2025-01-01 00:00:00", "2025-01-01 00:00:10", "2025-01-01 00:00:20"], playerId=["a"] * 3)
+    stats, events = emit(tmp_path, [day(beats, frame([], playerId=[]))], speed=100.0, interval=0.01)
+
+    assert len(events) == 3
+    # 20 simulated seconds at 100x take ~0.2s of wall clock
+    assert 0.15 <= stats.elapsed < 1.0
+
+
+def test_day_events_are_sorted_per_stream():
+    players = [f"p{i}" for i in range(40)]
+    country_map = dict.fromkeys(players, "US")
+    events = day_events("2025-01-01", players, country_map, products_df=pd.read_csv(DIM_PRODUCTS_CSV))
+
+    assert set(events) == {"heartbeat", "session_end", "transaction"}
+    for df in events.values():
+        assert np.all(np.diff(df["ts"].to_numpy()) >= 0)
+    assert set(events["session_end"]["playerId"]) <= set(players)
+    assert events["heartbeat"]["sessionId"].nunique() == events["session_end"]["sessionId"].nunique()
@@ -0,0 +1,131 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from loader import iter_signons_by_day, query_table, write_dataframe_to_table
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect(database=":memory:")
+    dates = np.repeat(pd.date_range("2025-01-01", periods=3).date, [3000, 10, 2500])
+    signons = pd.DataFrame({
+        "playerId": [f"p{i}" for i in range(len(dates))],
+        "date": [str(d) for d in dates],
+    })
+    write_dataframe_to_table(conn, "sprint_raw", "event_signons", signons)
+    return conn
+
+
+def test_query_table_projects_and_filters(conn):
+    rel = query_table(
+        conn, "sprint_raw", "event_signons",
+        columns=["playerId"], filters={"date": "2025-01-02", "playerId": ("!=", "p3000")},
+    )
+    assert rel.columns == ["playerId"]
+    assert len(rel.fetchall()) == 9
+
+    assert query_table(conn, "sprint_raw", "event_signons", filters={"playerId": []}).fetchall() == []
+
+
+def test_query_table_chunks_as_record_batches(conn):
+    pytest.importorskip("pyarrow")
+    reader = query_table(conn, "sprint_raw", "event_signons", columns=["playerId"], chunk_size=2048)
+    sizes = [batch.num_rows for batch in reader]
+    assert max(sizes) <= 2048 and sum(sizes) == 5510
+
+
+def test_iter_signons_by_day_stitches_days_across_chunks(conn):
+    # One vector per chunk forces the 3000-row day to span two chunks
+    days = list(iter_signons_by_day(conn, chunk_vectors=1))
+    assert [str(d) for d, _ in days] == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    assert [len(players) for _, players in days] == [3000, 10, 2500]
+
+    later = list(iter_signons_by_day(conn, start_date="2025-01-02", end_date="2025-01-02"))
+    assert len(later) == 1 and len(later[0][1]) == 10
+
+
+def test_scoped_clear_deletes_only_the_window(conn):
+    from loader import clear_old_data
+
+    sessions = pd.DataFrame({
+        "playerId": ["a", "b", "c"],
+        "sessionId": ["s1", "s2", "s3"],
+        "eventDateTime": ["2025-01-01T10:30:00", "2025-01-02T10:30:00", "2025-01-03T10:30:00"],
+    })
+    write_dataframe_to_table(conn, "sprint_stage", "fact_session", sessions)
+    heartbeats = pd.DataFrame({
+        "session_id": ["s1", "s2", "s2", "s3"],
+        "event_datetime": pd.to_datetime(["2025-01-01 10:00", "2025-01-02 10:00", "2025-01-02 10:01", "2025-01-03 10:00"]),
+    })
+    write_dataframe_to_table(conn, "sprint_stage", "event_heartbeat", heartbeats)
+    transactions = pd.DataFrame({"transactionId": ["t1"], "eventDateTime": pd.to_datetime(["2025-01-02 11:00"])})
+    write_dataframe_to_table(conn, "sprint_raw", "event_transaction", transactions)
+
+    window = clear_old_data(conn, level="sessions", start_date="2025-01-02")
+    assert window == {"start": pd.Timestamp("2025-01-02").date(), "end": pd.Timestamp("2025-01-02").date(), "sessions": 1}
+    assert conn.execute("SELECT list(DISTINCT session_id ORDER BY session_id) FROM sprint_stage.event_heartbeat").fetchone()[0] == ["s1", "s3"]
+    # Sign-ons are upstream of sessions and transactions independent of them: both stay untouched
+    assert conn.execute("SELECT count(*) FROM sprint_raw.event_signons").fetchone()[0] == 5510
+    assert conn.execute("SELECT count(*) FROM sprint_raw.event_transaction").fetchone()[0] == 1
+
+    # Session-id scope follows the session's date into date-grained tables
+    window = clear_old_data(conn, level="sessions", session_ids=["s3"])
+    assert window["start"] == pd.Timestamp("2025-01-03").date()
+    assert conn.execute("SELECT list(sessionId) FROM sprint_stage.fact_session").fetchone()[0] == ["s1"]
+
+
+def test_scoped_clear_deletes_rows_spanning_the_window(conn):
+    from loader import clear_old_data
+
+    lifetime = pd.DataFrame({
+        "player_id": ["a", "b", "c"],
+        "first_played": pd.to_datetime(["2025-01-01 09:00", "2025-01-01 09:00", "2025-01-04 09:00"]),
+        "last_played": pd.to_datetime(["2025-01-01 10:00", "2025-01-05 10:00", "2025-01-05 10:00"]),
+    })
+    write_dataframe_to_table(conn, "sprint_mart", "player_stats_lifetime", lifetime)
+
+    streaks = pd.DataFrame({
+        "player_id": ["a", "a"],
+        "year_month": pd.to_datetime(["2024-12-01", "2025-01-01"]),
+    })
+    write_dataframe_to_table(conn, "sprint_mart", "player_consecutive_days_monthly", streaks)
+
+    clear_old_data(conn, level="sessions", start_date="2025-01-02", end_date="2025-01-03")
+    assert conn.execute("SELECT list(player_id ORDER BY player_id) FROM sprint_mart.player_stats_lifetime").fetchone()[0] == ["a", "c"]
+    # The month containing the window is cleared from its first day
+    assert conn.execute("SELECT list(year_month::DATE::VARCHAR) FROM sprint_mart.player_consecutive_days_monthly").fetchone()[0] == ["2024-12-01"]
+
+
+def test_full_sessions_clear_drops_incremental_marts(conn):
+    from loader import clear_old_data
+
+    write_dataframe_to_table(conn, "sprint_stage", "fact_session", pd.DataFrame({"sessionId": ["s1"]}))
+    for mart in ("player_activity_daily", "heatmap_voxel_daily", "country_ccu_minutely"):
+        write_dataframe_to_table(
+            conn, "sprint_mart", mart, pd.DataFrame({"calendar_date": pd.to_datetime(["2025-01-05"])}),
+        )
+    clear_old_data(conn, level="sessions")
+    tables = conn.execute(
+        "SELECT list(table_schema || '.' || table_name) FROM information_schema.tables WHERE table_schema LIKE 'sprint_%'"
+    ).fetchone()[0]
+    assert tables == ["sprint_raw.event_signons"]
+
+
+def test_parquet_lake_partitions_prune_and_clear(tmp_path):
+    from lake import ParquetLake
+
+    lake = ParquetLake(tmp_path)
+    for day, players in [("2025-01-01", ["a", "b"]), ("2025-01-02", ["c"]), ("2025-01-03", ["d", "e", "f"])]:
+        lake.write("event_signons", pd.DataFrame({"playerId": players, "date": day}), day)
+    # A second writer adds its own file to an existing partition
+    lake.write("event_signons", pd.DataFrame({"playerId": ["g"]}), "2025-01-02")
+
+    conn = duckdb.connect(database=":memory:")
+    assert lake.scan(conn, "event_signons", start_date="2025-01-02").count("*").fetchone()[0] == 5
+    days = [(str(pd.Timestamp(d).date()), sorted(p)) for d, p in iter_signons_by_day(conn, lake=lake)]
+    assert days == [("2025-01-01", ["a", "b"]), ("2025-01-02", ["c", "g"]), ("2025-01-03", ["d", "e", "f"])]
+
+    lake.clear(["event_signons"], start_date="2025-01-02")
+    assert [str(d) for d in lake.dates("event_signons")] == ["2025-01-01", "2025-01-03"]
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from matchmaking import schedule_lobbies, pack_segment, split_into_teams
+from utils import MAX_TEAMS, MAX_PLAYERS_PER_TEAM
+
+
+@pytest.mark.parametrize("n_players", [0, 1, 7, 10, 1001])
+def test_every_player_scheduled_exactly_once(n_players):
+    """
+    With one session per player, each player appears in exactly one lobby and one team.
+    """
+    schedule = schedule_lobbies(np.ones(n_players, dtype=int))
+    assert sorted(schedule.player_idx.tolist()) == list(range(n_players))
+    assert schedule.lobby_sizes().sum() == n_players
+    assert (schedule.lobby_sizes() <= MAX_TEAMS * MAX_PLAYERS_PER_TEAM).all()
+
+
+def test_multiple_sessions_never_duplicate_a_player_in_a_lobby():
+    counts = np.random.randint(0, 4, size=500)
+    schedule = schedule_lobbies(counts)
+
+    assert np.bincount(schedule.player_idx, minlength=len(counts)).tolist() == counts.tolist()
+    for lobby in range(len(schedule)):
+        players = schedule.lobby_players(lobby)
+        assert len(players) == len(set(players.tolist()))
+
+
+def test_team_sizes_respect_limits():
+    schedule = schedule_lobbies(np.ones(333, dtype=int))
+    for lobby in range(len(schedule)):
+        teams = schedule.lobby_teams(lobby)
+        assert 1 <= len(teams) <= MAX_TEAMS
+        assert all(1 <= len(team) <= MAX_PLAYERS_PER_TEAM for team in teams)
+
+
+def test_custom_shapes_and_remainder():
+    team_sizes, teams_per_lobby = pack_segment(23, shapes=[(2, 4)])
+    assert team_sizes.sum() == 23
+    assert teams_per_lobby.sum() == len(team_sizes)
+    assert split_into_teams(7, 4).tolist() == [4, 3]
+
+
+def test_country_buckets_do_not_mix():
+    countries = np.array(["US", "BR", "FR"])[np.random.randint(0, 3, size=300)]
+    schedule = schedule_lobbies(np.ones(300, dtype=int), buckets=countries)
+    for lobby in range(len(schedule)):
+        assert len(set(countries[schedule.lobby_players(lobby)])) == 1
+
+
+def test_player_pools_are_single_country():
+    from session_generator import partition_player_pools
+
+    country_map = {"a": "US", "b": "FR", "c": "US", "d": "MX", "e": "DE"}
+    pools = partition_player_pools(list(country_map), country_map, pool_by="country")
+    assert {k: sorted(v) for k, v in pools.items()} == {
+        "DE": ["e"], "FR": ["b"], "MX": ["d"], "US": ["a", "c"],
+    }
+
+    regions = partition_player_pools(list(country_map), country_map, pool_by="region")
+    assert sorted(regions["NA"]) == ["a", "c", "d"]
+    assert sorted(regions["EU"]) == ["b", "e"]
+
+
+def test_pool_simulation_is_deterministic():
+    import random
+
+    from session_generator import pool_seed, simulate_pool_sessions
+
+    players = [f"p{i}" for i in range(30)]
+    seed = pool_seed("2025-01-01", "US")
+    np.random.seed(0)
+    random.seed(0)
+    runs = [simulate_pool_sessions("2025-01-01", players, seed, 1, 2) for _ in range(2)]
+    # The global RNGs are untouched, so serial and parallel runs draw the same afterwards
+    assert np.random.randint(1 << 30) == np.random.RandomState(0).randint(1 << 30)
+    assert random.random() == random.Random(0).random()
+
+    assert len(runs[0]) == len(runs[1]) > 0
+    for a, b in zip(*runs):
+        assert a.session_start == b.session_start
+        assert a.batch.player_ids == b.batch.player_ids
+        np.testing.assert_array_equal(a.batch.position_x, b.batch.position_x)
+        np.testing.assert_array_equal(a.kills, b.kills)
+    assert pool_seed("2025-01-01", "US") != pool_seed("2025-01-01", "FR")
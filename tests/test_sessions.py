@@ -100,3 +100,235 @@ def test_mixed_behavior_paths(basic_inputs):
     assert len(set(p1_positions)) > 1
     assert len(set(p2_positions)) > 1
     assert p1_positions != p2_positions
+
+
+def test_heartbeat_batch_is_compact(basic_inputs):
+    """
+    The struct-of-arrays batch should hold ~28 bytes per heartbeat and match the dict layout.
+    """
+    from heartbeat_generator import simulate_heartbeat_batch
+
+    batch = simulate_heartbeat_batch(*basic_inputs)
+    assert len(batch) == sum(d // HEARTBEAT_INTERVAL for d in basic_inputs[5].values())
+    assert batch.nbytes / len(batch) <= 32
+
+    records = batch.to_records()
+    assert records[0]["timestamp"] == "2025-01-01T12:00:00"
+    assert {hb["playerId"] for hb in records} == {"p1", "p2"}
+    assert {hb["teamId"] for hb in records} == {"team_red", "team_blue"}
+
+
+def test_heartbeat_batch_to_duckdb(basic_inputs):
+    """
+    Batches load into DuckDB directly from their arrays with typed columns.
+    """
+    import duckdb
+    from heartbeat_generator import simulate_heartbeat_batch
+
+    batch = simulate_heartbeat_batch(*basic_inputs)
+    conn = duckdb.connect(database=":memory:")
+    batch.to_duckdb(conn, "sprint_raw", "heartbeat_batch")
+
+    rows = conn.execute(
+        "SELECT playerId, count(*), min(timestamp) FROM sprint_raw.heartbeat_batch GROUP BY playerId ORDER BY playerId"
+    ).fetchall()
+    assert rows[0][:2] == ("p1", 6)
+    assert rows[1][:2] == ("p2", 2)
+    assert rows[0][2] == datetime(2025, 1, 1, 12, 0, 0)
+
+
+def test_fast_iso_format_matches_numpy():
+    """
+    The table-driven ISO formatter must agree with numpy's datetime_as_string.
+    """
+    import numpy as np
+    from utils import iso_format, compact_timestamp
+
+    epochs = np.concatenate([
+        np.arange(1735689600, 1735689600 + 86400 * 3, 7),       # dense, few days
+        np.random.randint(-2**33, 2**34, size=1000),           # sparse, wide span
+    ])
+    assert (iso_format(epochs) == iso_format(epochs, fast=False)).all()
+    assert compact_timestamp([1735740000])[0] == "20250101140000"
+
+
+def test_session_archive_round_trip(basic_inputs, tmp_path):
+    """
+    Archived sessions read back as memory-mapped views and bulk-load into DuckDB.
+    """
+    import duckdb
+    from archive import SessionArchive
+    from heartbeat_generator import simulate_heartbeat_batch
+
+    player_ids, _, team_ids, session_start, speed_map, durations, behavior_map = basic_inputs
+    archive = SessionArchive(tmp_path)
+    batches = {}
+    for session_id in ("s1", "s2"):
+        batches[session_id] = simulate_heartbeat_batch(
+            player_ids, session_id, team_ids, session_start, speed_map, durations, behavior_map
+        )
+        archive.append(session_id, session_start, session_start, batches[session_id])
+
+    reopened = SessionArchive(tmp_path)
+    assert reopened.session_ids("2025-01-01") == ["s1", "s2"]
+    restored = reopened.read("s2")
+    assert not restored.position_x.flags.writeable  # read-only view into the memory map
+    assert restored.to_records() == batches["s2"].to_records()
+
+    conn = duckdb.connect(database=":memory:")
+    conn.execute("CREATE SCHEMA sprint_raw")
+    reopened.to_duckdb(conn)
+    counts = dict(conn.execute(
+        "SELECT sessionId, count(*) FROM sprint_raw.archive_heartbeat GROUP BY 1"
+    ).fetchall())
+    assert counts == {"s1": len(batches["s1"]), "s2": len(batches["s2"])}
+
+
+def test_session_archive_clear_compacts_window(basic_inputs, tmp_path):
+    from datetime import timedelta
+
+    from archive import SessionArchive
+    from heartbeat_generator import simulate_heartbeat_batch
+
+    player_ids, _, team_ids, session_start, speed_map, durations, behavior_map = basic_inputs
+    archive = SessionArchive(tmp_path)
+    batches = {}
+    for day, session_id in enumerate(("s1", "s2", "s3")):
+        start = session_start + timedelta(days=day)
+        batches[session_id] = simulate_heartbeat_batch(
+            player_ids, session_id, team_ids, start, speed_map, durations, behavior_map
+        )
+        archive.append(session_id, start, start, batches[session_id])
+    archive.read("s3")  # map the data file before it is rewritten
+
+    assert archive.clear("2025-01-02") == 1
+    reopened = SessionArchive(tmp_path)
+    assert reopened.session_ids() == ["s1", "s3"] and reopened.dates() == ["2025-01-01", "2025-01-03"]
+    assert reopened.read("s3").to_records() == batches["s3"].to_records()
+    assert archive.read("s3").to_records() == batches["s3"].to_records()
+    assert (tmp_path / "heartbeats.bin").stat().st_size == (len(batches["s1"]) + len(batches["s3"])) * 28
+
+    assert archive.clear() == 2
+    assert len(SessionArchive(tmp_path)) == 0
+
+
+def test_sign_on_stream_matches_table_and_is_seeded():
+    from utils import iter_sign_ons, model_sign_ons
+
+    player_ids = [f"p{i}" for i in range(50)]
+    days = list(iter_sign_ons(len(player_ids), n_days=10))
+    again = list(iter_sign_ons(len(player_ids), n_days=10))
+    assert all((a == b).all() for (_, a), (_, b) in zip(days, again))
+
+    table = model_sign_ons(player_ids, n_days=10)
+    assert len(table) == sum(len(active) for _, active in days)
+    assert table.groupby("date").size().tolist() == [len(active) for _, active in days if len(active)]
+
+
+def test_fused_day_loop_writes_all_streams(tmp_path):
+    import duckdb
+    import pandas as pd
+    from pipeline import run_day_loop
+    from utils import DIM_PRODUCTS_CSV, assign_countries, sign_on_days
+
+    player_ids = [f"p{i}" for i in range(30)]
+    conn = duckdb.connect(database=":memory:")
+    run_day_loop(
+        sign_on_days(player_ids, n_days=3), conn, assign_countries(player_ids),
+        products_df=pd.read_csv(DIM_PRODUCTS_CSV), write_signons=True, session_dir=tmp_path,
+        min_sessions_per_player=1, max_sessions_per_player=1,
+    )
+
+    signons = conn.execute("SELECT count(*), count(DISTINCT date) FROM sprint_raw.event_signons").fetchone()
+    assert signons[1] == 3
+    # One session per player per day: every sign-on has exactly one summary row
+    assert conn.execute("SELECT count(*) FROM sprint_stage.fact_session").fetchone()[0] == signons[0]
+    types = dict(conn.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'fact_session'"
+    ).fetchall())
+    assert types["eventDateTime"] == "TIMESTAMP"
+    assert types["eventLengthSeconds"] == "INTEGER"
+    assert types["kills"] == types["deaths"] == "SMALLINT"
+
+    # Purchases are charged in the buyer's local currency
+    from utils import CURRENCIES
+    countries = assign_countries(player_ids)
+    charged = conn.execute("SELECT DISTINCT playerId, currency FROM sprint_raw.event_transaction").fetchall()
+    assert charged and all(currency == CURRENCIES[countries[pid]] for pid, currency in charged)
+
+
+def test_summaries_to_frame_is_typed():
+    from datetime import datetime
+    from records import SessionSummary, summaries_to_frame
+
+    frame = summaries_to_frame([
+        SessionSummary("p1", "s1", datetime(2025, 1, 1, 12), "US", 600, 3, 1),
+        SessionSummary("p2", "s1", datetime(2025, 1, 1, 12), "DE", 540, 0, 2),
+    ])
+    assert frame["eventDateTime"].dtype == "datetime64[s]"
+    assert frame["country"].dtype == "category"
+    assert frame["kills"].dtype == "int16"
+    assert frame["eventLengthSeconds"].dtype == "int32"
+
+
+def test_gradient_noise_matches_pnoise1():
+    import numpy as np
+    from movement.gradient_noise import pnoise1
+
+    noise = pytest.importorskip("noise")
+    xs = np.concatenate([np.arange(500) * 0.1, np.random.default_rng(0).uniform(-2000, 2000, 500)])
+    for base in (0, 42):
+        expected = [noise.pnoise1(float(x), base=base) for x in xs]
+        assert np.array_equal(pnoise1(xs, base=base), np.array(expected, dtype=np.float32))
+
+
+def test_perlin_players_follow_own_tracks_within_bounds():
+    import numpy as np
+    from heartbeat_generator import clamp_to_bounds, clamped_walk, simulate_heartbeat_batch
+
+    players = ["p1", "p2", "p3"]
+    batch = simulate_heartbeat_batch(
+        players, "s", dict.fromkeys(players, "t"), datetime(2025, 1, 1),
+        dict.fromkeys(players, 50.0), dict.fromkeys(players, 1800), dict.fromkeys(players, "perlin"),
+    )
+    steps = [np.diff(batch.position_x[batch.player_idx == i])[:10] for i in range(3)]
+    assert not np.allclose(steps[0], steps[1]) and not np.allclose(steps[1], steps[2])
+
+    # Vectorized walk equals stepping and clamping beat by beat
+    deltas = np.random.default_rng(1).normal(0, 40, (200, 3))
+    path = clamped_walk((0.0, 0.0, 0.0), deltas)
+    x, y, z = 0.0, 0.0, 0.0
+    for i, (dx, dy, dz) in enumerate(deltas):
+        x, y, z = clamp_to_bounds(x + dx, y + dy, z + dz)
+        assert (x, y, z) == tuple(path[i])
+
+
+def test_adaptive_heartbeats_round_trip(basic_inputs):
+    import numpy as np
+    import pandas as pd
+    from heartbeat_generator import simulate_heartbeat_batch
+    from records import expand_held_beats
+
+    player_ids, session_id, team_ids, session_start, _, _, _ = basic_inputs
+    batch = simulate_heartbeat_batch(
+        player_ids, session_id, team_ids, session_start,
+        {"p1": 10.0, "p2": 4.0}, {"p1": 1800, "p2": 1800}, {"p1": "bezier", "p2": "lissajous"},
+    )
+    full = pd.DataFrame(batch.to_records())
+    xyz = ["positionX", "positionY", "positionZ"]
+
+    for epsilon in (0.0, 0.5):
+        thinned = batch.thin(epsilon)
+        records = thinned.to_records()
+        # Converged bezier positions repeat; lissajous keeps moving
+        assert len(records) < len(full)
+        assert all(r["holdBeats"] <= 9 for r in records)
+
+        restored = expand_held_beats(pd.DataFrame(records))
+        restored["timestamp"] = restored["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+        key = ["playerId", "timestamp"]
+        a = full.sort_values(key).reset_index(drop=True)
+        b = restored.sort_values(key).reset_index(drop=True)
+        assert a[key].equals(b[key])
+        error = np.abs(a[xyz].to_numpy() - b[xyz].to_numpy()).max()
+        assert error == 0 if epsilon == 0 else error <= epsilon + 1e-9
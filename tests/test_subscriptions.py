@@ -0,0 +1,125 @@
+import duckdb
+import numpy as np
+import pandas as pd
+
+import transaction_generator as tg
+from loader import clear_old_data
+from transaction_generator import SUBSCRIPTION_EVENT_COLUMNS, SubscriptionBook, add_cycles
+
+
+def purchases(rows):
+    return pd.DataFrame({
+        "transactionId": [r[0] for r in rows],
+        "playerId": [r[1] for r in rows],
+        "eventDateTime": pd.to_datetime([r[2] for r in rows]).to_numpy().astype("datetime64[s]"),
+        "purchaseItem": "SKU-1001",
+        "purchasePrice": 9.99,
+        "currency": "EUR",
+        "isRecurring": [r[3] for r in rows],
+        "cycle": [r[4] for r in rows],
+        "transactionType": "BattlePass",
+    })
+
+
+def test_add_cycles_clips_to_month_end():
+    epochs = pd.to_datetime(["2025-01-31 10:00", "2025-03-15 08:30"]).to_numpy().astype("datetime64[s]").astype(np.int64)
+    shifted = add_cycles(epochs, np.array(["M", "Y"], dtype=object)).astype("datetime64[s]")
+    assert list(shifted) == [np.datetime64("2025-02-28T10:00:00"), np.datetime64("2026-03-15T08:30:00")]
+
+
+def test_book_renews_on_due_day(monkeypatch):
+    monkeypatch.setattr(tg, "CHURN_RATES", {"M": 0.0, "Y": 0.0})
+    book = SubscriptionBook()
+    starts = book.subscribe(purchases([
+        ("tx1", "p1", "2025-01-10 12:00", True, "M"),
+        ("tx2", "p2", "2025-01-10 13:00", False, ""),
+        ("tx3", "p3", "2025-01-20 09:00", True, "Y"),
+    ]))
+    assert list(starts.columns) == SUBSCRIPTION_EVENT_COLUMNS
+    assert starts["subscriptionId"].tolist() == ["tx1", "tx3"]
+    assert len(book) == 2
+
+    renewals, events = book.advance("2025-02-09")
+    assert renewals.empty and events.empty
+
+    renewals, events = book.advance("2025-02-10")
+    assert renewals["playerId"].tolist() == ["p1"]
+    assert renewals["eventDateTime"].iloc[0] == pd.Timestamp("2025-02-10 12:00")
+    assert renewals["isRecurring"].all()
+    assert events["eventType"].tolist() == ["renewal"]
+    assert events["subscriptionId"].tolist() == ["tx1"]
+    # Renewed subscriptions go back on the heap for the next cycle
+    assert len(book) == 2
+    renewals, _ = book.advance("2025-03-10")
+    assert renewals["eventDateTime"].iloc[0] == pd.Timestamp("2025-03-10 12:00")
+
+
+def test_book_churns_in_bulk(monkeypatch):
+    monkeypatch.setattr(tg, "CHURN_RATES", {"M": 1.0, "Y": 1.0})
+    book = SubscriptionBook()
+    book.subscribe(purchases([(f"tx{i}", f"p{i}", "2025-01-01 00:00", True, "M") for i in range(500)]))
+
+    renewals, events = book.advance("2025-02-01")
+    assert renewals.empty
+    assert (events["eventType"] == "churn").sum() == 500
+    assert len(book) == 0
+
+
+def stored_timeline(rows, through):
+    # Purchases plus the renewals and events a book derives from them, day by day
+    book, transactions, events = SubscriptionBook(), [purchases(rows)], []
+    for day in pd.date_range("2025-01-01", through).date:
+        renewals, day_events = book.advance(day)
+        bought = transactions[0][transactions[0]["eventDateTime"].dt.date == day]
+        transactions.append(renewals)
+        events.extend([day_events, book.subscribe(bought)])
+    frames = [t for t in transactions if not t.empty]
+    return pd.concat(frames, ignore_index=True), pd.concat([e for e in events if not e.empty], ignore_index=True)
+
+
+def test_book_rebuilt_from_events_resumes_renewals(monkeypatch):
+    monkeypatch.setattr(tg, "CHURN_RATES", {"M": 0.0, "Y": 0.0})
+    rows = [("tx1", "p1", "2025-01-31 12:00", True, "M"), ("tx3", "p3", "2025-01-20 09:00", True, "Y")]
+    _, events = stored_timeline(rows, "2025-02-28")
+
+    book = tg.SubscriptionBook.from_events(events)
+    assert len(book) == 2
+    renewals, _ = book.advance("2025-03-28")
+    # tx1 renewed on Feb 28 (clipped), so it is next due on Mar 28
+    assert renewals["playerId"].tolist() == ["p1"]
+    assert renewals["eventDateTime"].iloc[0] == pd.Timestamp("2025-03-28 12:00")
+
+
+def test_windowed_regeneration_replays_later_subscriptions(monkeypatch):
+    monkeypatch.setattr(tg, "CHURN_RATES", {"M": 0.0, "Y": 0.0})
+    transactions, events = stored_timeline([
+        ("tx1", "p1", "2025-01-10 12:00", True, "M"),
+        ("tx3", "p3", "2025-02-15 09:00", True, "M"),
+    ], "2025-03-31")
+    conn = duckdb.connect()
+    conn.execute("CREATE SCHEMA sprint_raw")
+    conn.execute("CREATE TABLE sprint_raw.event_transaction AS SELECT * FROM transactions")
+    conn.execute("CREATE TABLE sprint_raw.event_subscription AS SELECT * FROM events")
+    conn.execute("CREATE SCHEMA sprint_stage")
+    conn.execute(
+        "CREATE TABLE sprint_stage.fact_transaction AS SELECT transactionId AS transaction_id, "
+        "eventDateTime AS event_datetime FROM transactions"
+    )
+
+    # January regenerated without tx1: its later renewals must go, tx3 stays
+    clear_old_data(conn, level="transactions", start_date="2025-01-01", end_date="2025-01-31")
+    assert len(tg.load_subscription_book(conn, "2025-01-01")) == 0
+    window = tg.resume_subscriptions(conn, "2025-01-31", SubscriptionBook())
+
+    # The replayed days are invalidated downstream, for dbt to rebuild
+    assert (str(window["start"]), str(window["end"])) == ("2025-02-01", "2025-03-15")
+    assert conn.sql("SELECT count(*) FROM sprint_stage.fact_transaction").fetchone()[0] == 0
+
+    stored = conn.sql("SELECT transactionId, playerId FROM sprint_raw.event_transaction ORDER BY eventDateTime").df()
+    assert stored["playerId"].tolist() == ["p3", "p3"]
+    timeline = conn.sql(
+        "SELECT subscriptionId, eventType, eventDateTime FROM sprint_raw.event_subscription ORDER BY eventDateTime"
+    ).df()
+    assert timeline["subscriptionId"].tolist() == ["tx3", "tx3"]
+    assert timeline["eventType"].tolist() == ["start", "renewal"]
+    assert timeline["eventDateTime"].iloc[1] == pd.Timestamp("2025-03-15 09:00")
@@ -0,0 +1,111 @@
+from datetime import date, datetime
+
+import duckdb
+import numpy as np
+import pytest
+
+from heartbeat_generator import simulate_heartbeat_batch
+from keys import KeyAllocator
+from records import summaries_to_frame
+from session_generator import generate_sessions_for_day
+from trajectory import (
+    EDGE_MARGIN, LOD_TOLERANCES, _player_paths, dp_significance, lod_level, movement_stats, query_lod,
+    simplify_levels,
+)
+from utils import GRID_BOUNDS, HEARTBEAT_INTERVAL
+
+
+@pytest.fixture
+def batch():
+    players = [f"p{i}" for i in range(5)]
+    behaviors = ["lorentzian", "bezier", "lissajous", "perlin", "perlin"]
+    return simulate_heartbeat_batch(
+        players, "s1", {p: f"t{i % 2}" for i, p in enumerate(players)}, datetime(2025, 1, 1, 12),
+        {p: 2.0 + 3 * i for i, p in enumerate(players)},
+        {p: 300 + 120 * i for i, p in enumerate(players)},
+        dict(zip(players, behaviors)),
+    )
+
+
+def test_movement_stats_match_per_player_loop(batch):
+    stats = movement_stats(batch, datetime(2025, 1, 1, 13)).set_index("playerId")
+    beats = batch.to_frame().sort_values(["playerId", "timestamp"])
+    lower, upper = GRID_BOUNDS
+
+    assert len(stats) == beats["playerId"].nunique()
+    for player_id, path in beats.groupby("playerId"):
+        row = stats.loc[player_id]
+        xyz = path[["positionX", "positionY", "positionZ"]].to_numpy(np.float64)
+        steps = np.linalg.norm(np.diff(xyz, axis=0), axis=1)
+        elapsed = (path["timestamp"].max() - path["timestamp"].min()).total_seconds()
+
+        assert row["beats"] == len(path)
+        assert row["distance"] == pytest.approx(steps.sum())
+        assert row["avgSpeed"] == pytest.approx(steps.sum() / elapsed)
+        assert row["maxSpeed"] == pytest.approx(steps.max() / HEARTBEAT_INTERVAL)
+        assert row["minX"] == pytest.approx(xyz[:, 0].min()) and row["maxZ"] == pytest.approx(xyz[:, 2].max())
+        near = ((xyz <= lower + EDGE_MARGIN) | (xyz >= upper - EDGE_MARGIN)).any(axis=1)
+        assert row["edgeSeconds"] == near.sum() * HEARTBEAT_INTERVAL
+
+
+def douglas_peucker(points, eps):
+    # Recursive reference: indices kept when simplifying `points` at `eps`
+    if len(points) < 3:
+        return list(range(len(points)))
+    a, chord = points[0], points[-1] - points[0]
+    length = np.linalg.norm(chord)
+    distance = [
+        np.linalg.norm(np.cross(p - a, chord)) / length if length else np.linalg.norm(p - a) for p in points[1:-1]
+    ]
+    i = int(np.argmax(distance)) + 1
+    if distance[i - 1] <= eps:
+        return [0, len(points) - 1]
+    return douglas_peucker(points[:i + 1], eps) + [i + j for j in douglas_peucker(points[i:], eps)[1:]]
+
+
+def test_dp_significance_matches_recursive_douglas_peucker(batch):
+    order, starts = _player_paths(batch)
+    xyz = np.column_stack([batch.position_x, batch.position_y, batch.position_z])[order].astype(np.float64)
+    ends = np.append(starts[1:], len(order))
+    for eps in (0.5, 2.0, 8.0):
+        significance = dp_significance(xyz, starts, eps)
+        for start, end in zip(starts, ends):
+            assert set(np.flatnonzero(significance[start:end] > eps)) == set(douglas_peucker(xyz[start:end], eps))
+
+
+def test_lod_levels_nest_and_query_picks_coarsest(batch):
+    lod = simplify_levels(batch)
+    counts = [int((lod["lodLevel"] <= level).sum()) for level in range(len(LOD_TOLERANCES))]
+    assert 2 * batch.player_idx.max() + 2 <= counts[0] < counts[-1] < len(batch)
+    assert lod_level(5.0) == 1 and lod_level(100) == 0 and lod_level(0.1) is None
+
+    conn = duckdb.connect()
+    conn.execute("CREATE SCHEMA sprint_stage")
+    conn.register("lod", lod)
+    conn.execute("CREATE TABLE sprint_stage.event_heartbeat_lod AS SELECT * FROM lod")
+    assert len(query_lod(conn, 5.0).df()) == counts[1]
+    assert len(query_lod(conn, 5.0, filters={"playerId": "p0"}).df()) == int(
+        ((lod["playerId"] == "p0") & (lod["lodLevel"] <= 1)).sum()
+    )
+    with pytest.raises(ValueError):
+        query_lod(conn, 0.1)
+
+
+def test_day_generation_writes_movement_and_lod_tables(tmp_path):
+    conn = duckdb.connect()
+    players = [f"p{i}" for i in range(12)]
+    summaries = generate_sessions_for_day(
+        date(2025, 1, 1), players, {p: "US" for p in players}, conn, tmp_path,
+        min_sessions_per_player=1, max_sessions_per_player=1, keys=KeyAllocator(),
+    )
+
+    movement = conn.sql("SELECT * FROM sprint_stage.fact_player_session_movement").df()
+    joined = movement.merge(summaries_to_frame(summaries), on=["playerId", "sessionId"], suffixes=("", "_summary"))
+    assert len(joined) == len(movement) == len(summaries)
+    assert (joined["eventDateTime"] == joined["eventDateTime_summary"]).all()
+    assert (movement["beats"] > 0).all() and (movement["maxSpeed"] >= movement["avgSpeed"]).all()
+
+    lod_beats = conn.sql(
+        "SELECT playerId, sessionId, count(*) AS n FROM sprint_stage.event_heartbeat_lod GROUP BY ALL"
+    ).df().merge(movement, on=["playerId", "sessionId"])
+    assert len(lod_beats) == len(movement) and (lod_beats["n"] <= lod_beats["beats"]).all()